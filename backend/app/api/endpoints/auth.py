@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from app.services.supabase.auth import SupabaseAuthService, get_auth_service
+from app.services.supabase.auth import SupabaseAuthService, get_auth_service, is_admin
 from app.models.auth import UserProfile, TokenResponse
 
 router = APIRouter()
@@ -30,3 +30,19 @@ async def exchange_provider_token(provider: str, token: str, auth_service: Supab
         return TokenResponse(access_token=supabase_token, token_type="bearer")
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Failed to authenticate with provider: {str(e)}")
+
+
+@router.get("/cache-stats", response_model=dict)
+async def get_token_cache_stats(credentials: HTTPAuthorizationCredentials = Depends(security), auth_service: SupabaseAuthService = Depends(get_auth_service)):
+    """Get hit/miss counters of the verified-token cache (admins only)."""
+    try:
+        user = await auth_service.get_user(credentials.credentials)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Invalid authentication credentials: {str(e)}",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not is_admin(user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token cache counters are only available to admins")
+    return auth_service.token_cache.stats()
@@ -1,15 +1,54 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import anyio
+import json
 import logging
+import time
+import numpy as np
+from datetime import datetime
 from typing import Optional
 
 from app.services.llm.llm_service import LLMService, get_llm_service
-from app.services.llm.embedding_service import EmbeddingService, get_embedding_service
-from app.models.llm import TextGenerationRequest, TextGenerationResponse, EmbeddingRequest, EmbeddingResponse
-from app.services.supabase.auth import SupabaseAuthService, get_auth_service
+from app.services.llm.embedding_service import ENCODING_DTYPES, encode_embeddings, get_embedding_service
+from app.services.llm.response_cache import get_response_cache
+from app.services.llm.embedding_cache import get_embedding_cache
+from app.services.llm.semantic_cache import get_semantic_cache
+from app.services.llm.single_flight import embedding_flight, generation_flight
+from app.services.llm.micro_batcher import embedding_batcher
+from app.services.llm.rate_scheduler import rate_scheduler
+from app.services.llm.hedging import get_hedged_router
+from app.services.llm.circuit_breaker import CircuitOpenError, circuit_breakers
+from app.services.llm.model_router import model_router
+from app.services.llm.model_stats import model_stats
+from app.services.llm.tokenizer import PreflightResult, PromptTooLongError, preflight
+from app.services.llm.usage_accounting import get_usage_accountant, record_usage, served_provider
+from app.models.llm import (
+    LLMUsage,
+    TextGenerationRequest,
+    TextGenerationResponse,
+    BatchTextGenerationRequest,
+    BatchTextGenerationResult,
+    EmbeddingRequest,
+    EmbeddingResponse,
+    EmbeddingBatchRequest,
+    EmbeddingBatchResponse,
+    Conversation,
+    ConversationCreateRequest,
+    ConversationMessageRequest,
+    ConversationMessageResponse,
+    Job,
+    JobCreateRequest,
+)
+from app.services.llm.batch import generate_batch
+from app.services.llm.conversations import get_conversation_manager
+from app.services.llm.jobs import CallbackURLError, TooManyJobsError, check_callback_url, get_job_pool
+from app.services.supabase.auth import SupabaseAuthService, get_auth_service, is_admin
 from app.core.config import settings
+from app.core.http_clients import http_clients
 from app.core.demo import demo_service
 from app.config.models import get_all_models_info, DEFAULT_MODELS, MODELS
+from app.config.prompts import get_prompt_templates_info, resolve_system_prompt
 
 router = APIRouter()
 security = HTTPBearer()  # Make authentication required
@@ -56,7 +95,8 @@ async def demo_generate(request_data: dict, request: Request):
 @router.post("/generate", response_model=TextGenerationResponse)
 @limiter.limit("30/minute")
 async def generate_text(
-    request: TextGenerationRequest,
+    request: Request,
+    body: TextGenerationRequest,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     auth_service: SupabaseAuthService = Depends(get_auth_service),
     # We will override this service based on the request provider
@@ -65,7 +105,7 @@ async def generate_text(
     """Generate text using the specified LLM model."""
     try:
         # Log request details for debugging
-        logger.info(f"Received text generation request with model: {request.model}, provider: {request.provider}")
+        logger.info(f"Received text generation request with model: {body.model}, provider: {body.provider}")
 
         # Validate user authentication
         try:
@@ -79,31 +119,81 @@ async def generate_text(
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        # Let the latency-aware router pick model and provider within the budget tier
+        if body.budget is not None:
+            try:
+                chosen, decision = model_router.select_model(task=body.task, budget_level=body.budget)
+            except ValueError as routing_error:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(routing_error))
+            body = body.model_copy(update={"model": chosen, "provider": MODELS[chosen].provider})
+            logger.info(f"Model router chose {chosen}: {decision['reason']}")
+
         # Get the right LLM service based on provider
         try:
-            llm_service = get_llm_service(request.provider)
-            logger.info(f"Using LLM provider: {request.provider}")
+            llm_service = get_llm_service(body.provider)
+            logger.info(f"Using LLM provider: {body.provider}")
         except ValueError as provider_error:
             logger.error(f"Provider error: {str(provider_error)}")
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(provider_error))
 
+        # Reject or trim oversized prompts before any provider round trip
+        system_prompt = _resolve_system_prompt(body)
+        body = _apply_preflight(body, system_prompt)
+
         # Generate text with the LLM service
         try:
-            logger.info(f"Generating text with prompt: {request.prompt[:50]}...")
+            logger.info(f"Generating text with prompt: {body.prompt[:50]}...")
 
             # Check if API keys are configured
-            if request.provider == "openai" and not settings.OPENAI_API_KEY:
+            if body.provider == "openai" and not settings.OPENAI_API_KEY:
                 raise ValueError("OpenAI API key not configured. Please set the OPENAI_API_KEY environment variable.")
-            elif request.provider == "anthropic" and not settings.ANTHROPIC_API_KEY:
+            elif body.provider == "anthropic" and not settings.ANTHROPIC_API_KEY:
                 raise ValueError("Anthropic API key not configured. Please set the ANTHROPIC_API_KEY environment variable.")
-            elif request.provider == "gemini" and not settings.GEMINI_API_KEY:
+            elif body.provider == "gemini" and not settings.GEMINI_API_KEY:
                 raise ValueError("Gemini API key not configured. Please set the GEMINI_API_KEY environment variable.")
 
-            response = await llm_service.generate_text(
-                prompt=request.prompt, model=request.model, max_tokens=request.max_tokens, temperature=request.temperature
-            )
+            # Serve near-duplicate prompts from the semantic cache
+            semantic_cache = None
+            prompt_embedding = None
+            if settings.SEMANTIC_CACHE_ENABLED and not body.bypass_cache:
+                semantic_cache = get_semantic_cache()
+                if semantic_cache.applies_to(body.temperature):
+                    cached_response, prompt_embedding = await semantic_cache.lookup(
+                        body.prompt, body.model, user.id, body.max_tokens, system_prompt
+                    )
+                    if cached_response is not None:
+                        logger.info("Serving text generation from semantic cache")
+                        record_usage(user, served_provider(cached_response.model, body.provider), cached_response.model, cached_response.usage, cached=True)
+                        return TextGenerationResponse(text=cached_response.text, model=cached_response.model, usage=cached_response.usage, cached=True)
+                else:
+                    semantic_cache = None
+
+            started = time.perf_counter()
+            if (body.routing or settings.LLM_ROUTING_MODE) == "hedged":
+                # Race/fail over to equivalent models from other providers
+                response = await get_hedged_router().generate_text(
+                    prompt=body.prompt,
+                    model=body.model,
+                    provider=body.provider,
+                    max_tokens=body.max_tokens,
+                    temperature=body.temperature,
+                    system_prompt=system_prompt,
+                )
+            else:
+                response = await llm_service.generate_text(
+                    prompt=body.prompt, model=body.model, max_tokens=body.max_tokens, temperature=body.temperature, system_prompt=system_prompt
+                )
+            if semantic_cache is not None and not response.cached:
+                semantic_cache.record_provider_latency(body.model, time.perf_counter() - started)
+                if prompt_embedding is not None:
+                    semantic_cache.store_in_background(
+                        body.prompt, prompt_embedding, response, body.model, user.id, body.max_tokens, system_prompt
+                    )
             logger.info(f"Text generation successful, response length: {len(response.text)}")
-            return TextGenerationResponse(text=response.text, model=response.model, usage=response.usage)
+            record_usage(user, served_provider(response.model, body.provider), response.model, response.usage, cached=response.cached)
+            return TextGenerationResponse(text=response.text, model=response.model, usage=response.usage, cached=response.cached)
+        except CircuitOpenError as circuit_error:
+            raise _service_unavailable(circuit_error)
         except Exception as generation_error:
             logger.error(f"Text generation error: {str(generation_error)}", exc_info=True)
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Text generation failed: {str(generation_error)}")
@@ -116,14 +206,398 @@ async def generate_text(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error: {str(e)}")
 
 
+async def _authenticate(credentials: HTTPAuthorizationCredentials, auth_service: SupabaseAuthService):
+    """Validate the bearer token and return the user, raising 401 on failure."""
+    try:
+        user = await auth_service.get_user(credentials.credentials)
+        logger.info(f"User authenticated: {user.email if hasattr(user, 'email') else 'Unknown user'}")
+        return user
+    except Exception as auth_error:
+        logger.error(f"Authentication error: {str(auth_error)}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Authentication failed: {str(auth_error)}",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+async def _authenticate_admin(credentials: HTTPAuthorizationCredentials, auth_service: SupabaseAuthService):
+    """Like _authenticate, but also require an admin (or the service role), raising 403 otherwise."""
+    user = await _authenticate(credentials, auth_service)
+    if not is_admin(user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Internal counters are only available to admins")
+    return user
+
+
+def _service_unavailable(circuit_error: CircuitOpenError) -> HTTPException:
+    """503 for a provider whose circuit is open, telling the client when to retry."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(circuit_error),
+        headers={"Retry-After": str(max(1, round(circuit_error.retry_after)))},
+    )
+
+
+def _resolve_system_prompt(request: TextGenerationRequest) -> Optional[str]:
+    """Combine the request's prompt template and system prompt, raising 400 for unknown templates."""
+    try:
+        return resolve_system_prompt(request.prompt_template, request.system_prompt)
+    except ValueError as template_error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(template_error))
+
+
+def _apply_preflight(request: TextGenerationRequest, system_prompt: Optional[str] = None) -> TextGenerationRequest:
+    """Clamp max_tokens and check the prompt fits the model, raising 400 if it doesn't."""
+    try:
+        result = preflight(request.prompt, request.model, request.provider, request.max_tokens, system_prompt=system_prompt, overflow=request.overflow)
+    except PromptTooLongError as length_error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(length_error))
+
+    if result.prompt_trimmed or result.max_tokens_clamped:
+        logger.info(f"Pre-flight adjusted request: prompt_trimmed={result.prompt_trimmed}, max_tokens={result.max_tokens}")
+    return request.model_copy(update={"prompt": result.prompt, "max_tokens": result.max_tokens})
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/generate/stream")
+@limiter.limit("30/minute")
+async def generate_text_stream(
+    request: Request,
+    body: TextGenerationRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """
+    Stream generated text as Server-Sent Events.
+
+    Emits "token" events with {"text": ...} as the model produces output, then a
+    final "usage" event with the LLMUsage. Failures after the stream has started
+    are reported as an "error" event. When the client disconnects, Starlette
+    cancels the response and the provider stream is closed.
+    """
+    user = await _authenticate(credentials, auth_service)
+
+    # Route on observed time-to-first-token when the client asks for a budget tier
+    if body.budget is not None:
+        try:
+            chosen, decision = model_router.select_model(task=body.task, budget_level=body.budget, streaming=True)
+        except ValueError as routing_error:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(routing_error))
+        body = body.model_copy(update={"model": chosen, "provider": MODELS[chosen].provider})
+        logger.info(f"Model router chose {chosen}: {decision['reason']}")
+
+    try:
+        llm_service = get_llm_service(body.provider)
+    except ValueError as provider_error:
+        logger.error(f"Provider error: {str(provider_error)}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(provider_error))
+
+    # Once the stream has started errors can only be SSE events, so reject up front while the provider is down
+    if circuit_breakers.is_open(body.provider):
+        raise _service_unavailable(CircuitOpenError(body.provider, circuit_breakers.get(body.provider).retry_after()))
+
+    system_prompt = _resolve_system_prompt(body)
+    body = _apply_preflight(body, system_prompt)
+
+    async def event_stream():
+        stream = llm_service.stream_text(
+            prompt=body.prompt, model=body.model, max_tokens=body.max_tokens, temperature=body.temperature, system_prompt=system_prompt
+        )
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    record_usage(user, body.provider, chunk.model, chunk.usage)
+                    yield _sse_event("usage", chunk.usage.model_dump())
+                else:
+                    yield _sse_event("token", {"text": chunk.text, "model": chunk.model})
+        except Exception as generation_error:
+            logger.error(f"Streaming generation error: {str(generation_error)}", exc_info=True)
+            yield _sse_event("error", {"detail": f"Text generation failed: {str(generation_error)}"})
+        finally:
+            # Closing the provider stream cancels the upstream request; shielded so it
+            # still runs when we are being cancelled because the client went away
+            with anyio.CancelScope(shield=True):
+                await stream.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering tokens, which would defeat time-to-first-token
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/generate/batch")
+@limiter.limit("5/minute")
+async def generate_text_batch(
+    request: Request,
+    body: BatchTextGenerationRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """
+    Generate text for a batch of prompts, streamed back as NDJSON.
+
+    Authentication runs once for the whole batch. Items are fanned out across
+    providers under per-provider concurrency limits shared with every other
+    batch in this process, and each result is written as soon as it completes,
+    one BatchTextGenerationResult per line. Per-item budget, routing and
+    bypass_cache behave as they do on /generate.
+    """
+    user = await _authenticate(credentials, auth_service)
+    logger.info(f"Received batch text generation request with {len(body.items)} items")
+
+    async def result_lines():
+        async for index, outcome in generate_batch(body.items, user.id):
+            if isinstance(outcome, Exception):
+                line = BatchTextGenerationResult(index=index, error=f"Text generation failed: {str(outcome)}")
+            else:
+                record_usage(user, served_provider(outcome.model, body.items[index].provider), outcome.model, outcome.usage, cached=outcome.cached)
+                line = BatchTextGenerationResult(
+                    index=index,
+                    result=TextGenerationResponse(text=outcome.text, model=outcome.model, usage=outcome.usage, cached=outcome.cached),
+                )
+            yield line.model_dump_json(exclude_none=True) + "\n"
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+
+@router.post("/estimate", response_model=PreflightResult, response_model_exclude={"prompt"})
+@limiter.limit("60/minute")
+async def estimate_generation(
+    request: Request,
+    body: TextGenerationRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """Count prompt tokens locally and estimate the worst-case cost without calling a provider."""
+    await _authenticate(credentials, auth_service)
+    system_prompt = _resolve_system_prompt(body)
+    try:
+        return preflight(body.prompt, body.model, body.provider, body.max_tokens, system_prompt=system_prompt, overflow=body.overflow)
+    except PromptTooLongError as length_error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(length_error))
+
+
+@router.post("/jobs", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+@limiter.limit("30/minute")
+async def create_job(
+    request: Request,
+    body: JobCreateRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """
+    Queue a text generation and return its job at once.
+
+    Use this for slow models instead of /generate. Poll GET /jobs/{id} until
+    the status is succeeded, failed or cancelled, or pass callback_url to have
+    the finished job POSTed to you. The callback host must resolve to a public
+    address, and each user may have at most JOBS_MAX_OUTSTANDING_PER_USER jobs
+    queued or running (429 otherwise).
+    """
+    user = await _authenticate(credentials, auth_service)
+    if not settings.JOBS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Background jobs are disabled")
+    if body.callback_url:
+        try:
+            await check_callback_url(body.callback_url)
+        except CallbackURLError as url_error:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(url_error))
+    try:
+        return await get_job_pool().submit(user.id, body)
+    except TooManyJobsError as limit_error:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(limit_error))
+    except Exception as e:
+        logger.error(f"Failed to queue job: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to queue job: {str(e)}")
+
+
+async def _get_own_job(job_id: str, user) -> Job:
+    """Load a job of the authenticated user, raising 404 otherwise."""
+    try:
+        job = await get_job_pool().backend.get(job_id)
+    except Exception as e:
+        logger.error(f"Failed to load job: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to load job: {str(e)}")
+    if job is None or job.user_id != str(user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/stats", response_model=dict)
+async def get_job_stats(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """Get job worker counters for this instance (admins only)."""
+    await _authenticate_admin(credentials, auth_service)
+    return {"enabled": settings.JOBS_ENABLED, **get_job_pool().stats()}
+
+
+@router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(
+    job_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """Get a job's status, and its result once it has succeeded."""
+    user = await _authenticate(credentials, auth_service)
+    return await _get_own_job(job_id, user)
+
+
+@router.delete("/jobs/{job_id}", response_model=Job)
+async def cancel_job(
+    job_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """Cancel a queued or running job; finished jobs are returned unchanged."""
+    user = await _authenticate(credentials, auth_service)
+    await _get_own_job(job_id, user)
+    return await get_job_pool().cancel(job_id)
+
+
+@router.post("/conversations", response_model=Conversation)
+async def create_conversation(
+    request: ConversationCreateRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """Start a server-side conversation; send messages to it with POST /conversations/{id}/messages."""
+    user = await _authenticate(credentials, auth_service)
+    if request.model not in MODELS or MODELS[request.model].provider != request.provider:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown {request.provider} model: {request.model}")
+    try:
+        system_prompt = resolve_system_prompt(request.prompt_template, request.system_prompt)
+    except ValueError as template_error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(template_error))
+
+    return await get_conversation_manager().create(
+        user.id, request.model, request.provider, system_prompt=system_prompt, max_context_tokens=request.max_context_tokens
+    )
+
+
+async def _get_own_conversation(conversation_id: str, user) -> Conversation:
+    """Load a conversation of the authenticated user, raising 404 otherwise."""
+    try:
+        conversation = await get_conversation_manager().store.get(conversation_id)
+    except Exception as e:
+        logger.error(f"Failed to load conversation: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to load conversation: {str(e)}")
+    if conversation is None or conversation.user_id != str(user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+    return conversation
+
+
+@router.get("/conversations/{conversation_id}", response_model=Conversation)
+async def get_conversation(
+    conversation_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """Get a conversation with its full history."""
+    user = await _authenticate(credentials, auth_service)
+    return await _get_own_conversation(conversation_id, user)
+
+
+@router.post("/conversations/{conversation_id}/messages", response_model=ConversationMessageResponse)
+@limiter.limit("30/minute")
+async def send_conversation_message(
+    request: Request,
+    conversation_id: str,
+    body: ConversationMessageRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """
+    Send a message in a conversation.
+
+    Only the new message is sent by the client; the server adds as much earlier
+    history as fits the conversation's token budget and the model's context window.
+    """
+    user = await _authenticate(credentials, auth_service)
+    conversation = await _get_own_conversation(conversation_id, user)
+
+    try:
+        response, context = await get_conversation_manager().send(conversation, body)
+    except PromptTooLongError as length_error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(length_error))
+    except ValueError as provider_error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(provider_error))
+    except CircuitOpenError as circuit_error:
+        raise _service_unavailable(circuit_error)
+    except Exception as generation_error:
+        logger.error(f"Conversation message error: {str(generation_error)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Text generation failed: {str(generation_error)}")
+
+    record_usage(user, conversation.provider, response.model, response.usage, cached=response.cached)
+    return ConversationMessageResponse(
+        text=response.text, model=response.model, usage=response.usage, cached=response.cached, conversation_id=conversation.id, **context
+    )
+
+
+@router.delete("/conversations/{conversation_id}", response_model=dict)
+async def delete_conversation(
+    conversation_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """Delete a conversation and its history."""
+    user = await _authenticate(credentials, auth_service)
+    conversation = await _get_own_conversation(conversation_id, user)
+    get_conversation_manager().store.delete(conversation.id)
+    return {"deleted": conversation.id}
+
+
+def _encoded_embeddings_response(embeddings, encoding_format: str, model: str, usage: LLMUsage, batch: bool) -> Response:
+    """
+    Serialize embeddings straight from a float array, skipping per-element JSON and validation.
+
+    "binary" returns the raw little-endian float32 matrix (one row per text) with
+    the shape and usage in headers; the other formats return base64 strings in
+    the usual JSON shape.
+    """
+    vectors = np.vstack([embedding.vector() for embedding in embeddings])
+    if encoding_format == "binary":
+        return Response(
+            content=np.ascontiguousarray(vectors, dtype=ENCODING_DTYPES["binary"]).tobytes(),
+            media_type="application/octet-stream",
+            headers={
+                "X-Embedding-Model": model,
+                "X-Embedding-Count": str(vectors.shape[0]),
+                "X-Embedding-Dimensions": str(vectors.shape[1]),
+                "X-Embedding-Dtype": "float32",
+                "X-Embedding-Cached": str(all(embedding.cached for embedding in embeddings)).lower(),
+                "X-Usage-Prompt-Tokens": str(usage.prompt_tokens),
+            },
+        )
+
+    items = [
+        {"embedding": encoded, "model": embedding.model, "usage": embedding.usage.model_dump(), "cached": embedding.cached}
+        for encoded, embedding in zip(encode_embeddings(vectors, encoding_format), embeddings)
+    ]
+    if batch:
+        return JSONResponse({"data": items, "model": model, "usage": usage.model_dump(), "encoding_format": encoding_format})
+    return JSONResponse({**items[0], "encoding_format": encoding_format})
+
+
 @router.post("/embedding", response_model=EmbeddingResponse)
 async def create_embedding(
     request: EmbeddingRequest,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     auth_service: SupabaseAuthService = Depends(get_auth_service),
-    embedding_service: EmbeddingService = Depends(get_embedding_service),
 ):
-    """Create an embedding vector for the provided text."""
+    """
+    Create an embedding vector for the provided text.
+
+    encoding_format "base64" / "float16" return the vector as a base64 string,
+    "binary" as raw float32 bytes; all are far smaller and cheaper to produce than a JSON float list.
+    """
     try:
         # Validate user authentication
         try:
@@ -137,20 +611,145 @@ async def create_embedding(
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        # The body's provider picks the service, as in /embeddings
+        try:
+            embedding_service = get_embedding_service(request.provider)
+        except ValueError as provider_error:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(provider_error))
+
         # Generate embedding with the embedding service
         embedding = await embedding_service.create_embedding(text=request.text, model=request.model)
+        record_usage(user, embedding_service.provider, embedding.model, embedding.usage, kind="embedding", cached=embedding.cached)
 
-        return EmbeddingResponse(embedding=embedding.embedding, model=embedding.model, usage=embedding.usage)
+        if request.encoding_format != "float":
+            return _encoded_embeddings_response([embedding], request.encoding_format, embedding.model, embedding.usage, batch=False)
+        return EmbeddingResponse(embedding=embedding.embedding, model=embedding.model, usage=embedding.usage, cached=embedding.cached)
+    except HTTPException:
+        raise
+    except CircuitOpenError as circuit_error:
+        raise _service_unavailable(circuit_error)
     except Exception as e:
         logger.error(f"Embedding creation failed: {str(e)}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Embedding creation failed: {str(e)}")
 
 
+@router.post("/embeddings", response_model=EmbeddingBatchResponse)
+async def create_embeddings(
+    request: EmbeddingBatchRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """
+    Create embeddings for many texts.
+
+    Texts are packed into provider-sized batches that run concurrently; the
+    response keeps input order and reports usage per text and in total.
+    """
+    user = await _authenticate(credentials, auth_service)
+
+    try:
+        embedding_service = get_embedding_service(request.provider)
+    except ValueError as provider_error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(provider_error))
+
+    try:
+        embeddings = await embedding_service.create_embeddings(texts=request.texts, model=request.model)
+    except CircuitOpenError as circuit_error:
+        raise _service_unavailable(circuit_error)
+    except Exception as e:
+        logger.error(f"Batch embedding creation failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Embedding creation failed: {str(e)}")
+
+    prompt_tokens = sum(embedding.usage.prompt_tokens for embedding in embeddings)
+    usage = LLMUsage(prompt_tokens=prompt_tokens, completion_tokens=0, total_tokens=prompt_tokens)
+    # Tokens served from the embedding cache are recorded separately at no cost
+    for cached in (False, True):
+        tokens = sum(embedding.usage.prompt_tokens for embedding in embeddings if embedding.cached == cached)
+        if tokens:
+            record_usage(user, embedding_service.provider, request.model, LLMUsage(prompt_tokens=tokens, completion_tokens=0, total_tokens=tokens), kind="embedding", cached=cached)
+
+    if request.encoding_format != "float":
+        return _encoded_embeddings_response(embeddings, request.encoding_format, request.model, usage, batch=True)
+    return EmbeddingBatchResponse(
+        data=[
+            EmbeddingResponse(embedding=embedding.embedding, model=embedding.model, usage=embedding.usage, cached=embedding.cached)
+            for embedding in embeddings
+        ],
+        model=request.model,
+        usage=usage,
+    )
+
+
+@router.get("/cache/stats", response_model=dict)
+async def get_cache_stats(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """Get response cache counters, including tokens served from cache, and semantic and embedding cache hit rates (admins only)."""
+    await _authenticate_admin(credentials, auth_service)
+    stats = {"enabled": settings.LLM_CACHE_ENABLED, "semantic": {"enabled": settings.SEMANTIC_CACHE_ENABLED}}
+    if settings.LLM_CACHE_ENABLED:
+        stats.update(get_response_cache().stats())
+    if settings.SEMANTIC_CACHE_ENABLED:
+        stats["semantic"].update(get_semantic_cache().stats())
+    stats["embeddings"] = {"enabled": settings.EMBEDDING_CACHE_ENABLED}
+    if settings.EMBEDDING_CACHE_ENABLED:
+        stats["embeddings"].update(get_embedding_cache().stats())
+    stats["single_flight"] = {"generation": generation_flight.stats(), "embedding": embedding_flight.stats()}
+    stats["embedding_micro_batching"] = {"enabled": settings.EMBEDDING_MICROBATCH_ENABLED, **embedding_batcher.stats()}
+    return stats
+
+
+@router.get("/usage", response_model=dict)
+async def get_usage(
+    since: Optional[datetime] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """
+    Get the authenticated user's token usage and cost per provider and model.
+
+    Args:
+        since: Only count calls at or after this time (ISO 8601)
+    """
+    user = await _authenticate(credentials, auth_service)
+    accountant = get_usage_accountant()
+    try:
+        rows = await accountant.summary(user_id=user.id, since=since)
+    except Exception as e:
+        logger.error(f"Failed to get usage summary: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get usage summary: {str(e)}")
+
+    return {
+        "user_id": user.id,
+        "since": since,
+        "total_cost_usd": round(sum(row["cost_usd"] for row in rows), 6),
+        "total_tokens": sum(row["total_tokens"] for row in rows),
+        "by_model": rows,
+    }
+
+
+@router.get("/usage/stats", response_model=dict)
+async def get_usage_stats(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """Get usage accounting pipeline counters (buffered, flushed and dropped records; admins only)."""
+    await _authenticate_admin(credentials, auth_service)
+    return get_usage_accountant().stats()
+
+
+@router.get("/prompt-templates", response_model=dict)
+async def get_prompt_templates():
+    """List the server-stored system prompt templates usable as prompt_template."""
+    return {"templates": get_prompt_templates_info(), "prompt_caching": settings.LLM_PROMPT_CACHING_ENABLED}
+
+
 @router.get("/models", response_model=dict)
 async def get_models():
-    """Get information about all available models."""
+    """Get information about all available models, with live latency stats and recent routing decisions."""
     try:
-        return get_all_models_info()
+        return {**get_all_models_info(), "live_stats": model_stats.snapshot(), "routing_decisions": model_router.last_decisions}
     except Exception as e:
         logger.error(f"Failed to get models info: {str(e)}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get models info: {str(e)}")
@@ -180,7 +779,18 @@ async def get_providers():
                 "models": [model.name for model in MODELS.values() if model.provider == "gemini"]
             }
         }
-        return {"providers": providers}
+        for provider, info in providers.items():
+            info["circuit_breaker"] = circuit_breakers.stats(provider)
+            info["embedding_circuit_breaker"] = circuit_breakers.stats(f"{provider}-embeddings")
+        if settings.LLM_RATE_LIMIT_ENABLED:
+            for provider, provider_limits in rate_scheduler.stats().items():
+                providers[provider]["rate_limits"] = provider_limits
+        return {
+            "providers": providers,
+            "routing": {"mode": settings.LLM_ROUTING_MODE, **get_hedged_router().stats()},
+            "http_pools": http_clients.stats(),
+            "adaptive_timeouts": circuit_breakers.timeouts.snapshot(),
+        }
     except Exception as e:
         logger.error(f"Failed to get providers info: {str(e)}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get providers info: {str(e)}")
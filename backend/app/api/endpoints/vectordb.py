@@ -2,15 +2,35 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List
 
-from app.services.vectordb import QdrantService, get_vector_db_service
+from app.services.vectordb import CollectionNotFoundError, QdrantService, get_vector_db_service
 from app.services.llm.embedding_service import EmbeddingService, get_embedding_service
-from app.services.supabase.auth import SupabaseAuthService, get_auth_service
-from app.models.vectordb import DocumentInput, SearchQuery, SearchResult, DocumentUploadResponse, DeleteDocumentsRequest
+from app.services.supabase.auth import SupabaseAuthService, get_auth_service, is_admin
+from app.models.vectordb import (
+    CollectionInfo,
+    DocumentInput,
+    SearchQuery,
+    SearchResult,
+    DocumentUploadResponse,
+    DeleteDocumentsRequest,
+    VectorCompression,
+)
+from app.config.models import EMBEDDING_MODEL_DIMENSIONS, MATRYOSHKA_EMBEDDING_MODELS
 
 router = APIRouter()
 security = HTTPBearer()
 
 
+async def _check_truncation(vector_db: QdrantService, model: str):
+    """Only Matryoshka models keep their meaning when truncated; checked before paying for embeddings."""
+    native_size = EMBEDDING_MODEL_DIMENSIONS.get(model)
+    # Load the collection's stored size first; it may truncate without QDRANT_COMPRESSION saying so
+    if native_size or await vector_db.collection_exists():
+        await vector_db.ensure_collection_exists(native_size)
+    dimensions = vector_db.compression.dimensions
+    if dimensions and model not in MATRYOSHKA_EMBEDDING_MODELS:
+        raise ValueError(f"Collection truncates vectors to {dimensions} dimensions, which {model} doesn't support; use one of {sorted(MATRYOSHKA_EMBEDDING_MODELS)}")
+
+
 @router.post("/documents", response_model=DocumentUploadResponse)
 async def add_documents(
     request: DocumentInput,
@@ -23,12 +43,11 @@ async def add_documents(
     try:
         # Validate user authentication
         await auth_service.get_user(credentials.credentials)
+        await _check_truncation(vector_db, request.embedding_model)
 
-        # Generate embeddings for each document
-        all_embeddings = []
-        for document in request.documents:
-            embedding_response = await embedding_service.create_embedding(text=document.text, model=request.embedding_model)
-            all_embeddings.append(embedding_response.embedding)
+        # Generate embeddings in provider-sized batches, in document order
+        embedding_responses = await embedding_service.create_embeddings(texts=[document.text for document in request.documents], model=request.embedding_model)
+        all_embeddings = [embedding_response.embedding for embedding_response in embedding_responses]
 
         # Prepare documents and metadata for storage
         docs = [{"text": doc.text, "title": doc.title} for doc in request.documents]
@@ -54,12 +73,19 @@ async def search_documents(
     try:
         # Validate user authentication
         await auth_service.get_user(credentials.credentials)
+        await _check_truncation(vector_db, query.embedding_model)
 
         # Generate embedding for the query
         embedding_response = await embedding_service.create_embedding(text=query.query_text, model=query.embedding_model)
 
         # Search vector database
-        results = await vector_db.search(query_embedding=embedding_response.embedding, limit=query.limit, filter_params=query.filter_metadata)
+        results = await vector_db.search(
+            query_embedding=embedding_response.embedding,
+            limit=query.limit,
+            filter_params=query.filter_metadata,
+            oversampling=query.oversampling,
+            rescore=query.rescore,
+        )
 
         return results
     except Exception as e:
@@ -85,3 +111,49 @@ async def delete_documents(
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to delete one or more documents")
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Document deletion failed: {str(e)}")
+
+
+@router.get("/collection", response_model=CollectionInfo)
+async def get_collection_info(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+    vector_db: QdrantService = Depends(get_vector_db_service),
+):
+    """Get the collection's size, compression settings and estimated vector memory."""
+    try:
+        # Validate user authentication
+        await auth_service.get_user(credentials.credentials)
+
+        return await vector_db.collection_info()
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Failed to get collection info: {str(e)}")
+
+
+@router.put("/collection/compression", response_model=CollectionInfo)
+async def set_collection_compression(
+    compression: VectorCompression,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+    vector_db: QdrantService = Depends(get_vector_db_service),
+):
+    """
+    Set the collection's quantization (none, scalar int8 or binary) and search oversampling/rescoring.
+
+    Truncation (dimensions) only applies to a collection that doesn't exist yet, which is
+    created right away; without dimensions a missing collection is a 409.
+    The collection is shared, so this requires an admin (app_metadata role "admin") or the service role.
+    """
+    try:
+        # Validate user authentication
+        user = await auth_service.get_user(credentials.credentials)
+        if not is_admin(user):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Changing collection compression requires an admin")
+
+        await vector_db.set_compression(compression)
+        return await vector_db.collection_info()
+    except HTTPException:
+        raise
+    except CollectionNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Failed to set compression: {str(e)}")
@@ -4,7 +4,7 @@ Contains all available models with descriptions, pricing, and capabilities
 """
 
 from enum import Enum
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from pydantic import BaseModel
 
 
@@ -226,6 +226,53 @@ DEFAULT_MODELS = {
     "gemini": "gemini-2.5-flash",
 }
 
+# Embedding model prices (input tokens only), for usage accounting
+EMBEDDING_PRICES_PER_MILLION: Dict[str, float] = {
+    "text-embedding-3-small": 0.02,
+    "text-embedding-3-large": 0.13,
+    "text-embedding-ada-002": 0.10,
+}
+
+# Price of prompt tokens read from the provider's prompt cache, as a share of the input price
+CACHED_INPUT_PRICE_MULTIPLIER: Dict[str, float] = {
+    "openai": 0.5,
+    "anthropic": 0.1,
+    "gemini": 0.25,
+}
+
+# Price of prompt tokens written to the prompt cache, as a share of the input price (Anthropic, 5-minute TTL)
+CACHE_WRITE_PRICE_MULTIPLIER: Dict[str, float] = {
+    "anthropic": 1.25,
+}
+
+# Embedding models trained so that a prefix of the vector is itself a usable embedding
+# (Matryoshka representation learning); only these may be truncated for storage
+MATRYOSHKA_EMBEDDING_MODELS = {"text-embedding-3-small", "text-embedding-3-large"}
+
+# Native vector size of the OpenAI embedding models, before any truncation
+EMBEDDING_MODEL_DIMENSIONS = {"text-embedding-ada-002": 1536, "text-embedding-3-small": 1536, "text-embedding-3-large": 3072}
+
+
+class RateLimit(BaseModel):
+    requests_per_minute: int
+    tokens_per_minute: int  # Input + output tokens
+
+
+# Client-side rate limits, enforced by the LLM request scheduler.
+# Set these to your account's provider limits; models not listed use their provider's entry.
+PROVIDER_RATE_LIMITS: Dict[str, RateLimit] = {
+    "openai": RateLimit(requests_per_minute=500, tokens_per_minute=200000),
+    "anthropic": RateLimit(requests_per_minute=50, tokens_per_minute=50000),
+    "gemini": RateLimit(requests_per_minute=360, tokens_per_minute=1000000),
+}
+
+MODEL_RATE_LIMITS: Dict[str, RateLimit] = {
+    "o3-pro": RateLimit(requests_per_minute=500, tokens_per_minute=30000),
+    "o3": RateLimit(requests_per_minute=500, tokens_per_minute=30000),
+    "claude-opus-4-20250514": RateLimit(requests_per_minute=50, tokens_per_minute=30000),
+    "gemini-2.5-pro": RateLimit(requests_per_minute=150, tokens_per_minute=2000000),
+}
+
 # Task-specific model recommendations
 TASK_RECOMMENDATIONS = {
     "transcript_processing": {
@@ -283,6 +330,38 @@ def get_model_for_task(task: str, budget_level: str = "budget") -> str:
     return list(provider_defaults.values())[0].name if provider_defaults else "o4-mini"
 
 
+def get_equivalent_models(model: str) -> List[str]:
+    """
+    Get models from other providers that can stand in for a model.
+
+    Models recommended at the same budget level (for any task) come first,
+    followed by the other providers' default models.
+    """
+    if model not in MODELS:
+        return []
+    provider = MODELS[model].provider
+
+    # Budget levels this model is recommended at, for any task
+    levels = {level for recommendations in TASK_RECOMMENDATIONS.values() for level, name in recommendations.items() if name == model}
+    candidates = [name for recommendations in TASK_RECOMMENDATIONS.values() for level, name in recommendations.items() if level in levels]
+    candidates += [default for other_provider, default in DEFAULT_MODELS.items() if other_provider != provider]
+
+    equivalents = []
+    for candidate in candidates:
+        if candidate in MODELS and MODELS[candidate].provider != provider and candidate not in equivalents:
+            equivalents.append(candidate)
+    return equivalents
+
+
+def get_rate_limit(model: str, provider: Optional[str] = None) -> Optional[RateLimit]:
+    """Get the client-side rate limit for a model, falling back to its provider's limit."""
+    if model in MODEL_RATE_LIMITS:
+        return MODEL_RATE_LIMITS[model]
+    if provider is None and model in MODELS:
+        provider = MODELS[model].provider
+    return PROVIDER_RATE_LIMITS.get(provider)
+
+
 def get_all_models_info() -> Dict[str, Any]:
     """Get comprehensive information about all models for frontend."""
     return {
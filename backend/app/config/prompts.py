@@ -0,0 +1,87 @@
+"""
+Prompt Templates Configuration
+Named system prompts that clients reference instead of re-sending them
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class PromptTemplate(BaseModel):
+    """A named system prompt stored on the server."""
+
+    name: str
+    description: str = ""
+    system_prompt: str
+
+
+# Built-in templates; more can be loaded from PROMPT_TEMPLATES_DIR at startup
+PROMPT_TEMPLATES: Dict[str, PromptTemplate] = {
+    "assistant": PromptTemplate(
+        name="assistant",
+        description="General-purpose assistant",
+        system_prompt="You are a helpful, precise assistant. Answer clearly and concisely, and say so when you are not sure.",
+    ),
+    "code-review": PromptTemplate(
+        name="code-review",
+        description="Reviews code for bugs, readability and performance",
+        system_prompt=(
+            "You are an experienced software engineer reviewing a code change. Point out bugs, security issues, "
+            "performance problems and unclear code, most important first. Be specific, quote the relevant lines and "
+            "suggest a fix for each issue. Do not comment on formatting that a linter would catch."
+        ),
+    ),
+}
+
+TEMPLATE_SUFFIXES = (".txt", ".md")
+
+
+def load_prompt_templates(directory: str) -> int:
+    """
+    Load every <name>.txt / <name>.md file in a directory as a template.
+
+    Files override built-in templates with the same name.
+
+    Returns:
+        Number of templates loaded
+    """
+    loaded = 0
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix not in TEMPLATE_SUFFIXES or not path.is_file():
+            continue
+        PROMPT_TEMPLATES[path.stem] = PromptTemplate(name=path.stem, system_prompt=path.read_text(encoding="utf-8").strip())
+        loaded += 1
+    return loaded
+
+
+def get_prompt_template(name: str) -> PromptTemplate:
+    """Get a template by name."""
+    if name not in PROMPT_TEMPLATES:
+        raise ValueError(f"Unknown prompt template: {name}")
+    return PROMPT_TEMPLATES[name]
+
+
+def resolve_system_prompt(template: Optional[str] = None, system_prompt: Optional[str] = None) -> Optional[str]:
+    """
+    Build the system prompt for a request.
+
+    The template text comes first and the request's own system prompt after it,
+    so requests sharing a template share a byte-identical prefix that provider
+    prompt caches can reuse.
+    """
+    parts = []
+    if template:
+        parts.append(get_prompt_template(template).system_prompt)
+    if system_prompt:
+        parts.append(system_prompt)
+    return "\n\n".join(parts) or None
+
+
+def get_prompt_templates_info() -> List[Dict[str, Any]]:
+    """Get template names and descriptions for the frontend."""
+    return [
+        {"name": template.name, "description": template.description, "characters": len(template.system_prompt)}
+        for template in PROMPT_TEMPLATES.values()
+    ]
@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import Any, Dict, List, Union
 
 from pydantic_settings import BaseSettings
 
@@ -17,15 +17,168 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_SERVICE_KEY: str
 
+    # Auth token verification
+    SUPABASE_AUTH_MODE: str = "remote"  # "local" verifies JWTs in-process, "remote" asks Supabase Auth
+    SUPABASE_JWT_SECRET: str = ""  # HS256 secret (Project Settings -> API -> JWT Secret)
+    SUPABASE_JWT_AUDIENCE: str = "authenticated"
+    SUPABASE_JWT_ISSUER: str = ""  # Defaults to {SUPABASE_URL}/auth/v1
+    SUPABASE_JWKS_URL: str = ""  # Defaults to {SUPABASE_URL}/auth/v1/.well-known/jwks.json
+    SUPABASE_JWKS_CACHE_SECONDS: int = 600
+    SUPABASE_JWT_LEEWAY_SECONDS: int = 30
+    SUPABASE_AUTH_REMOTE_FALLBACK: bool = False  # Fall back to Supabase Auth when a token can't be verified locally
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_TTL_SECONDS: int = 300  # Capped by each token's own "exp"
+    AUTH_NEGATIVE_CACHE_TTL_SECONDS: int = 10  # How long rejected tokens stay rejected without re-checking
+
     # LLM
     OPENAI_API_KEY: str = ""
     ANTHROPIC_API_KEY: str = ""
     GEMINI_API_KEY: str = ""
+    GEMINI_MODEL_CACHE_SIZE: int = 32  # Reused GenerativeModel clients (per model and generation settings)
+
+    # Pace requests client-side using the rate limits in app/config/models.py
+    LLM_RATE_LIMIT_ENABLED: bool = False
+
+    # Hedged/failover routing across providers ("direct" or "hedged"; requests can override)
+    LLM_ROUTING_MODE: str = "direct"
+    LLM_HEDGE_PERCENTILE: float = 95.0  # Primary latency percentile used as the hedge deadline
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_HEDGE_DEFAULT_DEADLINE_SECONDS: float = 10.0
+    LLM_HEDGE_MIN_DEADLINE_SECONDS: float = 0.5
+    LLM_HEDGE_MAX_FALLBACKS: int = 2
+
+    # Per-provider circuit breakers: fail fast with 503 while a provider is down
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_FAILURE_THRESHOLD: int = 5  # Consecutive failures that open the circuit
+    CIRCUIT_FAILURE_RATE: float = 0.5  # Or this failure share of the recent window
+    CIRCUIT_WINDOW: int = 20
+    CIRCUIT_MIN_CALLS: int = 10
+    CIRCUIT_OPEN_SECONDS: float = 30.0  # Cooldown before a half-open probe; doubles after failed probes
+    CIRCUIT_MAX_OPEN_SECONDS: float = 300.0
+
+    # Adaptive call timeouts: latency percentile x multiplier, clamped
+    LLM_TIMEOUT_PERCENTILE: float = 99.0
+    LLM_TIMEOUT_MULTIPLIER: float = 3.0
+    LLM_TIMEOUT_MIN_SECONDS: float = 10.0
+    LLM_TIMEOUT_MAX_SECONDS: float = 600.0  # Used until LLM_TIMEOUT_MIN_SAMPLES calls have been seen
+    LLM_TIMEOUT_MIN_SAMPLES: int = 20
+    LLM_TIMEOUT_FAILURE_SECONDS: float = 120.0  # Shorter timeouts aren't counted as provider failures
+
+    # Latency-aware model routing (used when a request sets "budget")
+    LLM_STATS_EWMA_ALPHA: float = 0.2  # Weight of the newest sample in latency/error averages
+    LLM_STATS_HALF_LIFE_SECONDS: float = 300.0  # Idle stats fade toward the prior so avoided models get retried
+    LLM_LATENCY_SLO_SECONDS: float = 10.0
+    LLM_TASK_LATENCY_SLO_SECONDS: Dict[str, float] = {}  # Per task, e.g. {"reasoning_tasks": 30}
+    LLM_MAX_ERROR_RATE: float = 0.2  # Models above this recent error rate are avoided
+
+    # Local token counting ("exact" uses tiktoken for OpenAI when available, "approximate" never does)
+    LLM_TOKENIZER_MODE: str = "exact"
+    LLM_TOKENIZER_WARMUP_TIMEOUT_SECONDS: float = 10.0  # Startup doesn't wait longer for encodings to load
+    LLM_PROMPT_OVERFLOW: str = "reject"  # "reject" or "trim" prompts that exceed the context window
+
+    # Share one upstream call between concurrent identical generation/embedding requests
+    LLM_SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Offline embedding provider ("local"): feature-hashed character n-grams
+    LOCAL_EMBEDDING_DIMENSIONS: int = 384
+
+    # Content-addressed embedding cache: memory LRU plus an optional on-disk vector arena
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 20000
+    EMBEDDING_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    EMBEDDING_CACHE_DIR: str = ""  # Persistent tier, disabled when empty
+    EMBEDDING_CACHE_DTYPE: str = "float16"  # On-disk precision: "float16" or "float32"
+    EMBEDDING_CACHE_MAX_DISK_BYTES: int = 4 * 1024 * 1024 * 1024
+
+    # Coalesce concurrent single-text embedding requests into batched provider calls
+    EMBEDDING_MICROBATCH_ENABLED: bool = True
+    EMBEDDING_MICROBATCH_MAX_SIZE: int = 64  # Queue length that sends a batch immediately
+    EMBEDDING_MICROBATCH_MAX_WAIT_MS: float = 5.0  # Longest a request waits for others to join
+
+    # Batched embeddings: inputs per upstream request (capped by each provider's limits) and requests in flight
+    EMBEDDING_BATCH_MAX_ITEMS: int = 256
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100000
+    EMBEDDING_BATCH_CONCURRENCY: int = 4
+
+    # Maximum in-flight requests per provider for /api/llm/generate/batch
+    LLM_BATCH_CONCURRENCY: Dict[str, int] = {"openai": 16, "anthropic": 8, "gemini": 8}
+
+    # LLM response cache (exact match)
+    LLM_CACHE_ENABLED: bool = False
+    LLM_CACHE_MAX_ENTRIES: int = 1000
+    LLM_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    LLM_CACHE_TTL_SECONDS: int = 3600
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.0  # Only cache requests at or below this temperature
+    LLM_CACHE_SQLITE_PATH: str = ""  # Persistent tier, disabled when empty
+
+    # LLM semantic cache (near-duplicate prompts, stored in Qdrant)
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_COLLECTION: str = "llm_semantic_cache"
+    SEMANTIC_CACHE_EMBEDDING_PROVIDER: str = "openai"
+    SEMANTIC_CACHE_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # Minimum cosine similarity for a hit
+    SEMANTIC_CACHE_MODEL_THRESHOLDS: Dict[str, float] = {}  # Per model family, e.g. {"o3-pro": 0.98}
+    SEMANTIC_CACHE_TTL_SECONDS: int = 86400
+    SEMANTIC_CACHE_MAX_TEMPERATURE: float = 0.3
+
+    # Provider prompt caching of long system prompts
+    LLM_PROMPT_CACHING_ENABLED: bool = True
+    PROMPT_TEMPLATES_DIR: str = ""  # Directory of <name>.txt / <name>.md system prompt templates
+
+    # Shared HTTP connection pools (one per upstream, used by the OpenAI/Anthropic SDKs)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    HTTP_HTTP2: bool = True
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    HTTP_READ_TIMEOUT_SECONDS: float = 600.0  # Long generations stream for minutes
+    HTTP_WRITE_TIMEOUT_SECONDS: float = 30.0
+    HTTP_POOL_TIMEOUT_SECONDS: float = 10.0  # Waiting for a free connection
+    HTTP_WARMUP_ENABLED: bool = True
+    HTTP_WARMUP_CONNECTIONS: int = 2  # Per configured provider, opened at startup
+
+    # Conversation sessions
+    CONVERSATION_MAX_SESSIONS: int = 1000  # Held in memory, least recently used evicted first
+    CONVERSATION_TTL_SECONDS: int = 86400  # Idle sessions expire after this long
+    CONVERSATION_MAX_TURNS: int = 200  # Stored turns per session, oldest dropped first
+    CONVERSATION_MAX_CONTEXT_TOKENS: int = 8000  # History tokens sent with each turn
+    CONVERSATION_OVERFLOW: str = "trim"  # "trim" drops old turns, "summarize" folds them into a summary
+    CONVERSATION_SUMMARY_MODEL: str = ""  # Defaults to the provider's default model
+    CONVERSATION_SUMMARY_MAX_TOKENS: int = 400
+    CONVERSATION_PERSIST_ENABLED: bool = False  # Write sessions through to Supabase
+    CONVERSATION_TABLE: str = "llm_conversations"
+
+    # Background generation jobs
+    JOBS_ENABLED: bool = True
+    JOBS_BACKEND: str = "memory"  # "memory" or "supabase" (shared across instances)
+    JOBS_TABLE: str = "llm_jobs"
+    JOBS_WORKERS: int = 4
+    JOBS_POLL_INTERVAL_SECONDS: float = 1.0
+    JOBS_TIMEOUT_SECONDS: float = 900.0
+    JOBS_RETRY_BASE_SECONDS: float = 2.0  # Doubles per attempt, with jitter
+    JOBS_RETRY_MAX_SECONDS: float = 120.0
+    JOBS_RETENTION: int = 10000  # Finished jobs kept by the memory backend
+    JOBS_WEBHOOK_SECRET: str = ""  # Signs callbacks with HMAC-SHA256 when set
+    JOBS_WEBHOOK_TIMEOUT_SECONDS: float = 10.0
+    JOBS_MAX_OUTSTANDING_PER_USER: int = 20  # Queued or running jobs a user may have at once
+    # Hosts job callbacks may be sent to; when empty any public address is allowed
+    JOBS_CALLBACK_ALLOWED_HOSTS: List[str] = []
+
+    # Usage accounting
+    USAGE_ACCOUNTING_ENABLED: bool = True
+    USAGE_PERSIST_ENABLED: bool = False  # Flush usage records to Supabase in the background (needs the llm_usage migration)
+    USAGE_TABLE: str = "llm_usage"
+    USAGE_BUFFER_SIZE: int = 10000  # Records held in memory; oldest are dropped when full
+    USAGE_FLUSH_BATCH_SIZE: int = 500
+    USAGE_FLUSH_INTERVAL_SECONDS: float = 5.0
 
     # Vector Database
     QDRANT_URL: str = ""
     QDRANT_API_KEY: str = ""
     QDRANT_COLLECTION_NAME: str = "default_collection"
+    # Per-collection vector compression, applied when a collection is created, e.g.
+    # {"default_collection": {"quantization": "scalar", "dimensions": 512, "oversampling": 2.0}}
+    QDRANT_COMPRESSION: Dict[str, Dict[str, Any]] = {}
 
     class Config:
         env_file = ".env"
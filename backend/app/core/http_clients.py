@@ -0,0 +1,170 @@
+"""
+Shared HTTP connection pools for provider SDKs and outbound calls.
+
+One httpx.AsyncClient per upstream (e.g. "openai" serves both LLM and
+embedding calls) so requests to the same host reuse keep-alive connections
+instead of each SDK client opening its own pool. Pools are tuned from settings,
+warmed at startup and closed at shutdown by the application lifespan. Each pool
+records how long requests wait for a connection and how many connections it opens.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Unauthenticated endpoints requested at startup to open connections ahead of traffic
+WARMUP_URLS = {
+    "openai": "https://api.openai.com/v1/models",
+    "anthropic": "https://api.anthropic.com/v1/models",
+}
+
+
+class PoolMetrics:
+    """Connection wait times and connection churn of one pool."""
+
+    def __init__(self, window: int = 1000):
+        self.requests = 0
+        self.connections_opened = 0
+        self.wait_seconds: Deque[float] = deque(maxlen=window)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.wait_seconds:
+            return None
+        ordered = sorted(self.wait_seconds)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """HTTP transport that measures how long each request waits for a pooled connection."""
+
+    def __init__(self, metrics: PoolMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        acquired = False
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(event: str, info: Dict[str, Any]):
+            nonlocal acquired
+            # The first connect (new connection) or send (reused connection) ends the wait for the pool
+            if not acquired and (event == "connection.connect_tcp.started" or event.endswith("send_request_headers.started")):
+                acquired = True
+                self.metrics.wait_seconds.append(time.perf_counter() - started)
+            if event == "connection.connect_tcp.complete":
+                self.metrics.connections_opened += 1
+            if outer_trace is not None:
+                await outer_trace(event, info)
+
+        request.extensions["trace"] = trace
+        self.metrics.requests += 1
+        return await super().handle_async_request(request)
+
+    def pool_stats(self) -> Dict[str, int]:
+        connections = self._pool.connections
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"connections": len(connections), "active": len(connections) - idle, "idle": idle}
+
+
+class HTTPClientRegistry:
+    """Named, shared httpx.AsyncClient instances with tuned pools."""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._transports: Dict[str, InstrumentedTransport] = {}
+        self._metrics: Dict[str, PoolMetrics] = {}
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        )
+
+    @staticmethod
+    def _timeout() -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+            read=settings.HTTP_READ_TIMEOUT_SECONDS,
+            write=settings.HTTP_WRITE_TIMEOUT_SECONDS,
+            pool=settings.HTTP_POOL_TIMEOUT_SECONDS,
+        )
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        Get the shared client for an upstream, creating it on first use.
+
+        Args:
+            name: Upstream name, e.g. "openai", "anthropic", "supabase", "webhooks"
+        """
+        client = self._clients.get(name)
+        if client is not None and not client.is_closed:
+            return client
+
+        metrics = self._metrics.setdefault(name, PoolMetrics())
+        http2 = settings.HTTP_HTTP2
+        try:
+            transport = InstrumentedTransport(metrics, http2=http2, limits=self._limits(), retries=1)
+        except ImportError:
+            # HTTP/2 needs the h2 package (httpx[http2])
+            logger.warning("h2 is not installed, using HTTP/1.1 connection pools")
+            transport = InstrumentedTransport(metrics, limits=self._limits(), retries=1)
+
+        client = httpx.AsyncClient(transport=transport, timeout=self._timeout())
+        self._clients[name] = client
+        self._transports[name] = transport
+        return client
+
+    async def warm_up(self, names, connections: int = settings.HTTP_WARMUP_CONNECTIONS):
+        """
+        Open connections to upstreams before the first real request.
+
+        Any HTTP status counts as success; only the connection (and TLS handshake) matters.
+        """
+
+        async def touch(name: str):
+            try:
+                await self.get(name).get(WARMUP_URLS[name], timeout=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+            except httpx.HTTPError as e:
+                logger.warning(f"Connection warm-up for {name} failed: {str(e)}")
+
+        await asyncio.gather(*(touch(name) for name in names if name in WARMUP_URLS for _ in range(connections)))
+
+    async def aclose(self):
+        """Close every pool."""
+        await asyncio.gather(*(client.aclose() for client in self._clients.values()), return_exceptions=True)
+        self._clients.clear()
+        self._transports.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-pool utilisation and connection wait times."""
+        stats = {}
+        for name, transport in self._transports.items():
+            metrics = self._metrics[name]
+            pool = transport.pool_stats()
+            p50, p99 = metrics.percentile(50), metrics.percentile(99)
+            stats[name] = {
+                **pool,
+                "max_connections": settings.HTTP_MAX_CONNECTIONS,
+                "utilisation": round(pool["active"] / settings.HTTP_MAX_CONNECTIONS, 4),
+                "requests": metrics.requests,
+                "connections_opened": metrics.connections_opened,
+                "pool_wait_p50_ms": round(p50 * 1000, 3) if p50 is not None else None,
+                "pool_wait_p99_ms": round(p99 * 1000, 3) if p99 is not None else None,
+            }
+        return stats
+
+
+# Shared by every SDK client and outbound call in the process
+http_clients = HTTPClientRegistry()
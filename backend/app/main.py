@@ -1,3 +1,7 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -8,10 +12,73 @@ from app.api.router import api_router
 from app.core.config import settings
 from app.core.rate_limiter import limiter
 
+logger = logging.getLogger(__name__)
+
+
+def _warm_tokenizers():
+    """Load tokenizer encodings at startup instead of on the first request."""
+    from app.config.models import MODELS
+    from app.services.llm.tokenizer import get_tokenizer
+
+    for model in MODELS.values():
+        get_tokenizer(model.provider, model.name)
+
+
+def _load_prompt_templates():
+    """Load server-stored prompt templates from PROMPT_TEMPLATES_DIR."""
+    from app.config.prompts import load_prompt_templates
+
+    if settings.PROMPT_TEMPLATES_DIR:
+        load_prompt_templates(settings.PROMPT_TEMPLATES_DIR)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown."""
+    from app.core.http_clients import http_clients
+    from app.services.llm.embedding_cache import get_embedding_cache
+    from app.services.llm.embedding_service import get_embedding_service
+    from app.services.llm.jobs import get_job_pool
+    from app.services.llm.llm_service import get_llm_service
+    from app.services.llm.usage_accounting import get_usage_accountant
+
+    try:
+        # Best effort: fetching encodings can hang on offline or air-gapped hosts
+        await asyncio.wait_for(asyncio.to_thread(_warm_tokenizers), timeout=settings.LLM_TOKENIZER_WARMUP_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"Tokenizer warm-up did not finish within {settings.LLM_TOKENIZER_WARMUP_TIMEOUT_SECONDS}s; continuing startup")
+    await asyncio.to_thread(_load_prompt_templates)
+    if settings.EMBEDDING_CACHE_ENABLED:
+        # Opening the disk arena reads its whole index; do it now, off the event loop,
+        # rather than inside the first embedding request
+        await asyncio.to_thread(get_embedding_cache)
+    if settings.HTTP_WARMUP_ENABLED:
+        # Open provider connections (TCP + TLS) before the first request needs them
+        configured = [name for name, key in (("openai", settings.OPENAI_API_KEY), ("anthropic", settings.ANTHROPIC_API_KEY)) if key]
+        await http_clients.warm_up(configured)
+    usage_accountant = get_usage_accountant()
+    if settings.USAGE_ACCOUNTING_ENABLED:
+        usage_accountant.start()
+    if settings.JOBS_ENABLED:
+        get_job_pool().start()
+    yield
+    await get_job_pool().stop()
+    # Flush usage records still in memory before the process exits
+    await usage_accountant.stop()
+    await http_clients.aclose()
+    if settings.EMBEDDING_CACHE_ENABLED:
+        get_embedding_cache().close()
+    # These hold SDK clients bound to the closed pools, or tasks and locks bound
+    # to this event loop; rebuild them if the app is started again (e.g. in tests)
+    for getter in (get_llm_service, get_embedding_service, get_embedding_cache, get_job_pool, get_usage_accountant):
+        getter.cache_clear()
+
+
 app = FastAPI(
     title="Vibe Stack Backend",
     description="AI-First Full-Stack Template API",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Add rate limiter
@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from typing import List, Optional, Literal, Union
 
 
 class LLMUsage(BaseModel):
@@ -8,16 +9,26 @@ class LLMUsage(BaseModel):
     prompt_tokens: int
     completion_tokens: Optional[int] = None
     total_tokens: int
+    cached_prompt_tokens: Optional[int] = None  # Prompt tokens read from the provider's prompt cache (included in prompt_tokens)
+    cache_write_tokens: Optional[int] = None  # Prompt tokens written to the prompt cache (Anthropic)
 
 
 class TextGenerationRequest(BaseModel):
     """Request for text generation."""
 
     prompt: str
+    system_prompt: Optional[str] = None  # Appended after the template's system prompt, if any
+    prompt_template: Optional[str] = None  # Name of a server-stored system prompt (see /prompt-templates)
     model: str = "o4-mini"
-    max_tokens: int = Field(default=500, ge=1, le=4000)
+    max_tokens: int = Field(default=500, ge=1)  # Clamped to the model's max_tokens
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
     provider: Literal["openai", "anthropic", "gemini"] = "openai"
+    bypass_cache: bool = False  # Skip the semantic cache for this request
+    routing: Optional[Literal["direct", "hedged"]] = None  # Defaults to LLM_ROUTING_MODE
+    # Set budget to let the server pick model and provider from live latency stats
+    budget: Optional[Literal["budget", "balanced", "premium"]] = None
+    task: Optional[str] = None  # Task name from TASK_RECOMMENDATIONS, selects the latency SLO
+    overflow: Optional[Literal["reject", "trim"]] = None  # Oversized prompts; defaults to LLM_PROMPT_OVERFLOW
 
 
 class TextGenerationResponse(BaseModel):
@@ -26,6 +37,105 @@ class TextGenerationResponse(BaseModel):
     text: str
     model: str
     usage: LLMUsage
+    cached: bool = False  # True when served from the response cache
+
+
+class BatchTextGenerationRequest(BaseModel):
+    """Request for generating text for many prompts at once."""
+
+    items: List[TextGenerationRequest] = Field(min_length=1, max_length=1000)
+
+
+class BatchTextGenerationResult(BaseModel):
+    """One line of a batch generation response; exactly one of result or error is set."""
+
+    index: int
+    result: Optional[TextGenerationResponse] = None
+    error: Optional[str] = None
+
+
+class JobCreateRequest(TextGenerationRequest):
+    """Request for running a generation as a background job."""
+
+    priority: int = Field(default=0, ge=0, le=9)  # Higher runs first
+    callback_url: Optional[str] = None  # Receives the finished Job as a POST
+    max_attempts: int = Field(default=3, ge=1, le=10)
+
+
+class Job(BaseModel):
+    """A queued text generation and its outcome."""
+
+    id: str
+    user_id: str
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"] = "queued"
+    priority: int = 0
+    request: TextGenerationRequest
+    result: Optional[TextGenerationResponse] = None
+    error: Optional[str] = None
+    callback_url: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int = 3
+    created_at: datetime
+    available_at: datetime  # Not claimed before this time (retry backoff)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class ConversationTurn(BaseModel):
+    """One message of a conversation."""
+
+    role: Literal["user", "assistant"]
+    content: str
+    tokens: int  # Counted once when the turn is added
+    created_at: datetime
+
+
+class Conversation(BaseModel):
+    """A server-side chat session."""
+
+    id: str
+    user_id: str
+    model: str
+    provider: Literal["openai", "anthropic", "gemini"]
+    system_prompt: Optional[str] = None
+    max_context_tokens: Optional[int] = None  # Defaults to CONVERSATION_MAX_CONTEXT_TOKENS
+    summary: Optional[str] = None  # Summary of the turns folded out of the context
+    summarized_turns: int = 0  # Leading turns covered by the summary
+    turns: List[ConversationTurn] = []
+    created_at: datetime
+    updated_at: datetime
+
+
+class ConversationCreateRequest(BaseModel):
+    """Request for starting a conversation."""
+
+    model: str = "o4-mini"
+    provider: Literal["openai", "anthropic", "gemini"] = "openai"
+    system_prompt: Optional[str] = None
+    prompt_template: Optional[str] = None
+    max_context_tokens: Optional[int] = Field(default=None, ge=256)
+
+
+class ConversationMessageRequest(BaseModel):
+    """A new user message in a conversation."""
+
+    prompt: str
+    max_tokens: int = Field(default=500, ge=1)
+    temperature: float = Field(default=0.7, ge=0.0, le=2.0)
+
+
+class ConversationMessageResponse(TextGenerationResponse):
+    """The assistant's reply and how much history was sent with it."""
+
+    conversation_id: str
+    context_turns: int  # Earlier turns sent with this message
+    trimmed_turns: int  # Earlier turns left out to fit the token budget
+    summarized: bool = False  # Whether a summary of older turns was sent
+
+
+# "float": JSON list; "base64": little-endian float32; "float16": base64 of little-endian float16;
+# "binary": raw little-endian float32 as application/octet-stream, usage in X- headers
+EmbeddingEncoding = Literal["float", "base64", "float16", "binary"]
 
 
 class EmbeddingRequest(BaseModel):
@@ -33,12 +143,31 @@ class EmbeddingRequest(BaseModel):
 
     text: str
     model: str = "text-embedding-ada-002"
-    provider: Literal["openai", "anthropic", "gemini"] = "openai"
+    provider: Literal["openai", "anthropic", "gemini", "local"] = "openai"
+    encoding_format: EmbeddingEncoding = "float"
 
 
 class EmbeddingResponse(BaseModel):
     """Response from embedding creation."""
 
-    embedding: List[float]
+    embedding: Union[List[float], str]  # A base64 string unless encoding_format is "float"
+    model: str
+    usage: LLMUsage
+    cached: bool = False
+
+
+class EmbeddingBatchRequest(BaseModel):
+    """Request for creating embeddings for many texts at once."""
+
+    texts: List[str] = Field(min_length=1, max_length=10000)
+    model: str = "text-embedding-ada-002"
+    provider: Literal["openai", "anthropic", "gemini", "local"] = "openai"
+    encoding_format: EmbeddingEncoding = "float"
+
+
+class EmbeddingBatchResponse(BaseModel):
+    """Embeddings in input order, each with its own usage, plus the total."""
+
+    data: List[EmbeddingResponse]
     model: str
     usage: LLMUsage
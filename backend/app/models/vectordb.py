@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 
 
 class Document(BaseModel):
@@ -30,6 +30,8 @@ class SearchQuery(BaseModel):
     embedding_model: str = "text-embedding-ada-002"
     limit: int = Field(default=10, gt=0, le=100)
     filter_metadata: Optional[Dict[str, Any]] = None
+    oversampling: Optional[float] = Field(default=None, ge=1.0)  # Overrides the collection's, for quantized collections
+    rescore: Optional[bool] = None
 
 
 class SearchResult(BaseModel):
@@ -45,3 +47,25 @@ class DeleteDocumentsRequest(BaseModel):
     """Request for deleting documents from the vector database."""
 
     document_ids: List[str]
+
+
+class VectorCompression(BaseModel):
+    """How a collection stores vectors: quantization and Matryoshka truncation."""
+
+    quantization: Literal["none", "scalar", "binary"] = "none"  # scalar: int8 (4x smaller), binary: 1 bit per dimension (32x)
+    dimensions: Optional[int] = Field(default=None, gt=0)  # Keep only the first N dimensions (Matryoshka models only)
+    oversampling: float = Field(default=2.0, ge=1.0)  # Candidates fetched with quantized vectors, as a multiple of the limit
+    rescore: bool = True  # Re-rank candidates with the original vectors
+    always_ram: bool = True  # Keep quantized vectors in RAM
+    on_disk: Optional[bool] = None  # Keep original vectors on disk; defaults to True when quantized
+
+
+class CollectionInfo(BaseModel):
+    """Size and compression of the collection."""
+
+    name: str
+    points: int
+    vector_size: int
+    compression: VectorCompression
+    ram_bytes_per_vector: float
+    estimated_ram_bytes: int
@@ -0,0 +1,59 @@
+"""
+Fan-out of batched text-generation requests with bounded per-provider concurrency.
+
+Each item is generated the way /generate handles it, honoring its budget,
+routing and bypass_cache. The per-provider limits are shared by all batches
+running in the process.
+"""
+
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.models.llm import TextGenerationRequest, TextGenerationResponse
+from app.services.llm.jobs import apply_budget_routing, run_generation
+
+DEFAULT_PROVIDER_CONCURRENCY = 4
+
+# Shared by every batch in the process, so concurrent batches don't multiply provider concurrency
+_provider_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def provider_semaphore(provider: str) -> asyncio.Semaphore:
+    """Semaphore bounding in-flight batch requests to a provider (LLM_BATCH_CONCURRENCY)."""
+    if provider not in _provider_semaphores:
+        _provider_semaphores[provider] = asyncio.Semaphore(settings.LLM_BATCH_CONCURRENCY.get(provider, DEFAULT_PROVIDER_CONCURRENCY))
+    return _provider_semaphores[provider]
+
+
+async def generate_batch(
+    items: List[TextGenerationRequest], user_id: Optional[str] = None
+) -> AsyncIterator[Tuple[int, Union[TextGenerationResponse, Exception]]]:
+    """
+    Run a batch of generations across providers.
+
+    Args:
+        items: Generation requests, possibly for different providers
+        user_id: Owner of the batch, scopes semantic-cache hits to that user
+
+    Yields:
+        (index, response or exception) in completion order
+    """
+
+    async def run(index: int, item: TextGenerationRequest) -> Tuple[int, Union[TextGenerationResponse, Exception]]:
+        try:
+            # Route first so the item waits on the provider that will actually serve it
+            item = apply_budget_routing(item)
+            async with provider_semaphore(item.provider):
+                return index, await run_generation(item, user_id)
+        except Exception as e:
+            return index, e
+
+    tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Stop outstanding work if the consumer goes away (e.g. client disconnect)
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,320 @@
+"""
+Per-provider circuit breakers with adaptive timeouts.
+
+Each provider's calls pass through a breaker. Timeouts, 5xx and 429 responses and
+connection errors count as failures; once enough pile up the breaker opens and
+calls fail immediately with CircuitOpenError (a 503) instead of waiting on a
+provider that is down. After a cooldown one probe call is let through
+(half-open): success closes the breaker, failure opens it again for longer.
+
+Timeouts adapt to each model's recent latency: a high percentile of successful
+calls times a safety multiplier, clamped between a floor and a ceiling.
+Latency is tracked per size class (max_tokens of a generation, items in an
+embedding batch) so short calls don't set the timeout for long ones. A call
+that runs into an adaptive timeout shorter than LLM_TIMEOUT_FAILURE_SECONDS
+isn't counted against the provider; it widens that size class's timeout
+instead.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List
+
+from app.core.config import settings
+from app.services.llm.embedding_service import EmbeddingResponse, EmbeddingService
+from app.services.llm.hedging import LatencyWindow
+from app.services.llm.llm_service import LLMResponse, LLMService, LLMStreamChunk
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# The only 4xx response that says the provider (not the request) is the problem
+RETRYABLE_STATUS_CODES = (429,)
+
+
+class CircuitOpenError(RuntimeError):
+    """The provider's circuit is open; the call was rejected without being sent."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open), retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def latency_key(model: str, size: int) -> str:
+    """Latency history key: the model plus a power-of-two size class."""
+    return f"{model}:{1 << max(0, size - 1).bit_length()}"
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """Whether an error says the provider is unhealthy (as opposed to a bad request)."""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    if isinstance(error, (ValueError, StopAsyncIteration)):
+        # Invalid input, unknown model, prompt too long
+        return False
+    # OpenAI/Anthropic errors carry status_code; google.api_core errors carry the HTTP status
+    # as code (OpenAI's code is a string such as "invalid_api_key", so only ints count)
+    status_code = getattr(error, "status_code", None)
+    if not isinstance(status_code, int):
+        status_code = getattr(error, "code", None)
+    if isinstance(status_code, int) and not isinstance(status_code, bool):
+        return status_code >= 500 or status_code in RETRYABLE_STATUS_CODES
+    return True
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one provider."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = settings.CIRCUIT_FAILURE_THRESHOLD,
+        failure_rate: float = settings.CIRCUIT_FAILURE_RATE,
+        window: int = settings.CIRCUIT_WINDOW,
+        min_calls: int = settings.CIRCUIT_MIN_CALLS,
+        open_seconds: float = settings.CIRCUIT_OPEN_SECONDS,
+        max_open_seconds: float = settings.CIRCUIT_MAX_OPEN_SECONDS,
+    ):
+        """
+        Initialize the breaker.
+
+        Args:
+            name: Provider name, used in errors and stats
+            failure_threshold: Consecutive failures that open the circuit
+            failure_rate: Failure share of the recent window that opens the circuit
+            window: Number of recent calls the failure rate is computed over
+            min_calls: Calls needed in the window before the failure rate is used
+            open_seconds: Cooldown before the first half-open probe
+            max_open_seconds: Upper bound on the cooldown, which doubles after each failed probe
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.outcomes: Deque[bool] = deque(maxlen=window)  # True for failures
+        self.opened_at = 0.0
+        self.cooldown = open_seconds
+        self.probe_in_flight = False
+        self.rejected = 0
+        self.times_opened = 0
+
+    def before_call(self):
+        """Let a call through or raise CircuitOpenError."""
+        if self.state == CLOSED:
+            return
+        if self.state == OPEN and self.retry_after() == 0:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            # Exactly one probe at a time decides whether the provider is back
+            self.probe_in_flight = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError(self.name, self.retry_after())
+
+    def retry_after(self) -> float:
+        """Seconds until the next half-open probe is allowed."""
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def record_success(self):
+        self.outcomes.append(False)
+        self.consecutive_failures = 0
+        if self.state == HALF_OPEN:
+            logger.info(f"Circuit for {self.name} closed")
+            self.state = CLOSED
+            self.cooldown = self.open_seconds
+            self.outcomes.clear()
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.outcomes.append(True)
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN:
+            self._open(min(self.cooldown * 2, self.max_open_seconds))
+        elif self.state == CLOSED and (self.consecutive_failures >= self.failure_threshold or self._failure_rate_exceeded()):
+            self._open(self.open_seconds)
+        self.probe_in_flight = False
+
+    def record_ignored(self):
+        """The call failed for a reason unrelated to provider health."""
+        self.probe_in_flight = False
+
+    def _failure_rate_exceeded(self) -> bool:
+        return len(self.outcomes) >= self.min_calls and sum(self.outcomes) / len(self.outcomes) >= self.failure_rate
+
+    def _open(self, cooldown: float):
+        logger.warning(f"Circuit for {self.name} opened for {cooldown:.0f}s after {self.consecutive_failures} consecutive failures")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.cooldown = cooldown
+        self.times_opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "recent_failure_rate": round(sum(self.outcomes) / len(self.outcomes), 4) if self.outcomes else 0.0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+        if self.state != CLOSED:
+            stats["retry_after_seconds"] = round(self.retry_after(), 1)
+        return stats
+
+
+class AdaptiveTimeout:
+    """Call timeouts derived from recent successful latencies, per model and size class."""
+
+    def __init__(
+        self,
+        percentile: float = settings.LLM_TIMEOUT_PERCENTILE,
+        multiplier: float = settings.LLM_TIMEOUT_MULTIPLIER,
+        min_seconds: float = settings.LLM_TIMEOUT_MIN_SECONDS,
+        max_seconds: float = settings.LLM_TIMEOUT_MAX_SECONDS,
+        min_samples: int = settings.LLM_TIMEOUT_MIN_SAMPLES,
+        failure_seconds: float = settings.LLM_TIMEOUT_FAILURE_SECONDS,
+    ):
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.min_samples = min_samples
+        self.failure_seconds = failure_seconds
+        self._latency: Dict[str, LatencyWindow] = {}
+
+    def record(self, key: str, seconds: float):
+        self._latency.setdefault(key, LatencyWindow()).record(seconds)
+
+    def timeout_for(self, key: str) -> float:
+        """Seconds to wait for a call; the ceiling until enough calls have been observed."""
+        window = self._latency.get(key)
+        if window is None or not window.samples or len(window.samples) < self.min_samples:
+            return self.max_seconds
+        return min(self.max_seconds, max(self.min_seconds, window.percentile(self.percentile) * self.multiplier))
+
+    def counts_as_failure(self, timeout: float) -> bool:
+        """Whether running into this timeout says the provider is unhealthy."""
+        return timeout >= min(self.failure_seconds, self.max_seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {key: round(self.timeout_for(key), 3) for key in self._latency}
+
+
+class CircuitBreakerRegistry:
+    """Breakers and adaptive timeouts, one per provider (and per embedding provider)."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.timeouts = AdaptiveTimeout()
+
+    def get(self, name: str) -> CircuitBreaker:
+        if name not in self._breakers:
+            self._breakers[name] = CircuitBreaker(name)
+        return self._breakers[name]
+
+    def is_open(self, name: str) -> bool:
+        breaker = self._breakers.get(name)
+        return breaker is not None and breaker.state == OPEN and breaker.retry_after() > 0
+
+    def stats(self, name: str) -> Dict[str, Any]:
+        breaker = self._breakers.get(name)
+        return breaker.stats() if breaker is not None else {"state": CLOSED}
+
+
+async def _guarded(breaker: CircuitBreaker, timeouts: AdaptiveTimeout, key: str, call):
+    """Run a call through the breaker with the adaptive timeout for its latency key."""
+    breaker.before_call()
+    timeout = timeouts.timeout_for(key)
+    started = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(call(), timeout=timeout)
+    except asyncio.CancelledError:
+        # The caller gave up (e.g. a hedged request lost the race); says nothing about the provider
+        breaker.record_ignored()
+        raise
+    except asyncio.TimeoutError as e:
+        if timeouts.counts_as_failure(timeout):
+            breaker.record_failure()
+        else:
+            # Our estimate was too tight (e.g. an unusually long generation), not
+            # necessarily a sick provider: record the wait so the timeout widens
+            breaker.record_ignored()
+            timeouts.record(key, timeout)
+        raise asyncio.TimeoutError(f"{breaker.name} did not answer within {timeout:.1f}s") from e
+    except Exception as e:
+        if is_provider_failure(e):
+            breaker.record_failure()
+        else:
+            breaker.record_ignored()
+        raise
+
+    breaker.record_success()
+    timeouts.record(key, time.perf_counter() - started)
+    return result
+
+
+class CircuitBreakerLLMService(LLMService):
+    """Wraps an LLM service with its provider's circuit breaker and adaptive timeouts."""
+
+    def __init__(self, service: LLMService, provider: str, default_model: str, registry: CircuitBreakerRegistry):
+        self.service = service
+        self.default_model = default_model
+        self.breaker = registry.get(provider)
+        self.timeouts = registry.timeouts
+
+    async def generate_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
+        """Generate text, failing fast while the provider's circuit is open."""
+        return await _guarded(
+            self.breaker,
+            self.timeouts,
+            latency_key(model or self.default_model, max_tokens),
+            lambda: self.service.generate_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs),
+        )
+
+    async def stream_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> AsyncIterator[LLMStreamChunk]:
+        """Stream text; the adaptive timeout applies to the first chunk, which is when a dead provider shows."""
+        stream = self.service.stream_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+        try:
+            # Keyed apart from generate_text calls, so the timeout is learned from time-to-first-chunk alone
+            first = await _guarded(self.breaker, self.timeouts, f"{model or self.default_model}:first-chunk", stream.__anext__)
+            yield first
+            async for chunk in stream:
+                yield chunk
+        except StopAsyncIteration:
+            return
+        finally:
+            await stream.aclose()
+
+
+class CircuitBreakerEmbeddingService(EmbeddingService):
+    """Wraps an embedding service with a circuit breaker and adaptive timeouts."""
+
+    def __init__(self, service: EmbeddingService, provider: str, registry: CircuitBreakerRegistry):
+        self.service = service
+        self.breaker = registry.get(f"{provider}-embeddings")
+        self.timeouts = registry.timeouts
+        self.provider = provider
+        self.max_batch_items = service.max_batch_items
+        self.max_batch_tokens = service.max_batch_tokens
+
+    async def create_embedding(self, text: str, model: str = "text-embedding-ada-002") -> EmbeddingResponse:
+        """Create an embedding, failing fast while the provider's circuit is open."""
+        return await _guarded(self.breaker, self.timeouts, latency_key(model, 1), lambda: self.service.create_embedding(text=text, model=model))
+
+    async def embed_batch(self, texts: List[str], model: str) -> List[EmbeddingResponse]:
+        """Embed one batch; the latency history is per batch size class since big batches take longer."""
+        return await _guarded(self.breaker, self.timeouts, latency_key(model, len(texts)), lambda: self.service.embed_batch(texts, model))
+
+
+# Shared by all services in the process
+circuit_breakers = CircuitBreakerRegistry()
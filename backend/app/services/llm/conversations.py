@@ -0,0 +1,295 @@
+"""
+Server-side conversation sessions.
+
+History lives in a bounded in-process store (optionally written through to
+Supabase), so clients send only the new message each turn. Turn token counts
+are computed once when a turn is added; each request then sends the newest
+turns that fit the token budget. Older turns are dropped or, in "summarize"
+mode, folded into a running summary in the background.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.config.models import DEFAULT_MODELS, MODELS
+from app.core.config import settings
+from app.models.llm import Conversation, ConversationMessageRequest, ConversationTurn
+from app.services.llm.llm_service import LLMResponse, get_llm_service
+from app.services.llm.tokenizer import MESSAGE_OVERHEAD_TOKENS, count_tokens, preflight
+from app.services.llm.usage_accounting import get_usage_accountant
+from app.services.supabase.client import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+# Framing tokens per message (role and separators)
+TURN_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = (
+    "Update the summary of an ongoing conversation with the new messages below. Keep names, facts, decisions "
+    "and open questions; drop pleasantries. Reply with the updated summary only.\n\n"
+    "Current summary:\n{summary}\n\nNew messages:\n{transcript}"
+)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ConversationStore:
+    """Bounded LRU of conversations with idle expiry and optional Supabase write-through."""
+
+    def __init__(
+        self,
+        max_sessions: int = settings.CONVERSATION_MAX_SESSIONS,
+        ttl_seconds: int = settings.CONVERSATION_TTL_SECONDS,
+        persist: bool = settings.CONVERSATION_PERSIST_ENABLED,
+        table: str = settings.CONVERSATION_TABLE,
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            max_sessions: Conversations held in memory
+            ttl_seconds: Idle time after which a conversation expires
+            persist: Write conversations through to Supabase and load them on a miss
+            table: Supabase table for persisted conversations
+        """
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self.table = table
+        # id -> (conversation, last access time), least recently used first
+        self._sessions: "OrderedDict[str, Tuple[Conversation, float]]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    def lock(self, conversation_id: str) -> asyncio.Lock:
+        """Lock that serializes turns of one conversation."""
+        return self._locks.setdefault(conversation_id, asyncio.Lock())
+
+    def _remember(self, conversation: Conversation):
+        self._sessions[conversation.id] = (conversation, time.monotonic())
+        self._sessions.move_to_end(conversation.id)
+        while len(self._sessions) > self.max_sessions:
+            evicted, _ = self._sessions.popitem(last=False)
+            self._locks.pop(evicted, None)
+
+    async def get(self, conversation_id: str) -> Optional[Conversation]:
+        """Get a conversation from memory, or from Supabase when persistence is enabled."""
+        entry = self._sessions.get(conversation_id)
+        if entry is not None:
+            conversation, last_access = entry
+            if time.monotonic() - last_access <= self.ttl_seconds:
+                self._remember(conversation)
+                return conversation
+            self._sessions.pop(conversation_id)
+            self._locks.pop(conversation_id, None)
+
+        if not self.persist:
+            return None
+        supabase = await get_supabase_client()
+        response = await supabase.table(self.table).select("data").eq("id", conversation_id).execute()
+        if not response.data:
+            return None
+        conversation = Conversation(**response.data[0]["data"])
+        if (_now() - conversation.updated_at).total_seconds() > self.ttl_seconds:
+            return None
+        self._remember(conversation)
+        return conversation
+
+    def save(self, conversation: Conversation):
+        """Keep a conversation in memory and write it through to Supabase in the background."""
+        conversation.updated_at = _now()
+        self._remember(conversation)
+        if self.persist:
+            self.run_in_background(self._write(conversation.model_dump(mode="json")))
+
+    def delete(self, conversation_id: str):
+        self._sessions.pop(conversation_id, None)
+        self._locks.pop(conversation_id, None)
+        if self.persist:
+            self.run_in_background(self._remove(conversation_id))
+
+    def run_in_background(self, coroutine):
+        """Run persistence or summarization work without delaying the response."""
+        task = asyncio.create_task(coroutine)
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _write(self, data: Dict[str, Any]):
+        try:
+            supabase = await get_supabase_client()
+            await supabase.table(self.table).upsert(
+                {"id": data["id"], "user_id": data["user_id"], "data": data, "updated_at": data["updated_at"]}
+            ).execute()
+        except Exception as e:
+            logger.error(f"Failed to persist conversation {data['id']}: {str(e)}")
+
+    async def _remove(self, conversation_id: str):
+        try:
+            supabase = await get_supabase_client()
+            await supabase.table(self.table).delete().eq("id", conversation_id).execute()
+        except Exception as e:
+            logger.error(f"Failed to delete conversation {conversation_id}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, "persist": self.persist}
+
+
+class ConversationManager:
+    """Runs conversation turns, sending each one only the history that fits."""
+
+    def __init__(self, store: ConversationStore, overflow: str = settings.CONVERSATION_OVERFLOW):
+        self.store = store
+        self.overflow = overflow
+        self._summarizing: Set[str] = set()
+
+    async def create(
+        self, user_id: str, model: str, provider: str, system_prompt: Optional[str] = None, max_context_tokens: Optional[int] = None
+    ) -> Conversation:
+        """Start a conversation."""
+        now = _now()
+        conversation = Conversation(
+            id=str(uuid.uuid4()),
+            user_id=str(user_id),
+            model=model,
+            provider=provider,
+            system_prompt=system_prompt,
+            max_context_tokens=max_context_tokens,
+            created_at=now,
+            updated_at=now,
+        )
+        self.store.save(conversation)
+        return conversation
+
+    def _system_prompt(self, conversation: Conversation) -> Optional[str]:
+        """The conversation's system prompt followed by the summary of folded turns."""
+        parts = [conversation.system_prompt] if conversation.system_prompt else []
+        if conversation.summary:
+            parts.append(f"Summary of the earlier conversation:\n{conversation.summary}")
+        return "\n\n".join(parts) or None
+
+    def _budget(self, conversation: Conversation) -> int:
+        return conversation.max_context_tokens or settings.CONVERSATION_MAX_CONTEXT_TOKENS
+
+    def select_history(self, conversation: Conversation, budget: int) -> List[ConversationTurn]:
+        """
+        Newest unsummarized turns whose tokens fit the budget, oldest first.
+
+        The selection always starts with a user turn, as providers require.
+        """
+        selected: List[ConversationTurn] = []
+        used = 0
+        for turn in reversed(conversation.turns[conversation.summarized_turns :]):
+            cost = turn.tokens + TURN_OVERHEAD_TOKENS
+            if used + cost > budget:
+                break
+            selected.append(turn)
+            used += cost
+        selected.reverse()
+        while selected and selected[0].role != "user":
+            selected.pop(0)
+        return selected
+
+    def _add_turn(self, conversation: Conversation, role: str, content: str):
+        conversation.turns.append(
+            ConversationTurn(role=role, content=content, tokens=count_tokens(content, conversation.provider, conversation.model), created_at=_now())
+        )
+        overflow = len(conversation.turns) - settings.CONVERSATION_MAX_TURNS
+        if overflow > 0:
+            del conversation.turns[:overflow]
+            conversation.summarized_turns = max(0, conversation.summarized_turns - overflow)
+
+    async def send(self, conversation: Conversation, request: ConversationMessageRequest) -> Tuple[LLMResponse, Dict[str, Any]]:
+        """
+        Send a user message with as much history as fits and record both turns.
+
+        Returns:
+            (response, context details: context_turns, trimmed_turns, summarized)
+
+        Raises:
+            PromptTooLongError: The message alone doesn't fit the model
+        """
+        async with self.store.lock(conversation.id):
+            system_prompt = self._system_prompt(conversation)
+            checked = preflight(request.prompt, conversation.model, conversation.provider, request.max_tokens, system_prompt=system_prompt)
+
+            # History gets what's left of the context window, capped by the session budget
+            budget = self._budget(conversation)
+            config = MODELS.get(conversation.model)
+            if config is not None:
+                budget = min(budget, config.context_window - checked.max_tokens - checked.prompt_tokens - MESSAGE_OVERHEAD_TOKENS)
+            history = self.select_history(conversation, budget)
+            pending = len(conversation.turns) - conversation.summarized_turns
+
+            llm_service = get_llm_service(conversation.provider)
+            response = await llm_service.generate_text(
+                prompt=checked.prompt,
+                model=conversation.model,
+                max_tokens=checked.max_tokens,
+                temperature=request.temperature,
+                system_prompt=system_prompt,
+                history=[{"role": turn.role, "content": turn.content} for turn in history],
+            )
+
+            self._add_turn(conversation, "user", checked.prompt)
+            self._add_turn(conversation, "assistant", response.text)
+            self.store.save(conversation)
+
+        if self.overflow == "summarize":
+            self._maybe_summarize(conversation)
+
+        return response, {"context_turns": len(history), "trimmed_turns": pending - len(history), "summarized": bool(conversation.summary)}
+
+    def _maybe_summarize(self, conversation: Conversation):
+        """Fold the oldest turns into the summary once history outgrows the budget."""
+        unsummarized = conversation.turns[conversation.summarized_turns :]
+        if conversation.id in self._summarizing or sum(turn.tokens + TURN_OVERHEAD_TOKENS for turn in unsummarized) <= self._budget(conversation):
+            return
+        self._summarizing.add(conversation.id)
+        self.store.run_in_background(self._summarize(conversation))
+
+    async def _summarize(self, conversation: Conversation):
+        try:
+            start = conversation.summarized_turns
+            # Fold the older half, ending on an assistant turn so user/assistant pairs stay together
+            end = start + max(2, (len(conversation.turns) - start) // 2)
+            while end < len(conversation.turns) and conversation.turns[end - 1].role != "assistant":
+                end += 1
+            folded = conversation.turns[start:end]
+            transcript = "\n\n".join(f"{'User' if turn.role == 'user' else 'Assistant'}: {turn.content}" for turn in folded)
+
+            model = settings.CONVERSATION_SUMMARY_MODEL or DEFAULT_MODELS[conversation.provider]
+            response = await get_llm_service(conversation.provider).generate_text(
+                prompt=SUMMARY_PROMPT.format(summary=conversation.summary or "(none)", transcript=transcript),
+                model=model,
+                max_tokens=settings.CONVERSATION_SUMMARY_MAX_TOKENS,
+                temperature=0.2,
+            )
+            if settings.USAGE_ACCOUNTING_ENABLED:
+                get_usage_accountant().record(conversation.user_id, conversation.provider, response.model, response.usage, kind="summarization")
+
+            # Turns may have been added or dropped meanwhile; find the last folded turn again
+            last = next((index for index, turn in enumerate(conversation.turns) if turn is folded[-1]), None)
+            if last is not None and conversation.summarized_turns <= last:
+                conversation.summary = response.text.strip()
+                conversation.summarized_turns = last + 1
+                self.store.save(conversation)
+        except Exception as e:
+            # Trimming still keeps requests within budget; try again after the next turn
+            logger.warning(f"Failed to summarize conversation {conversation.id}: {str(e)}")
+        finally:
+            self._summarizing.discard(conversation.id)
+
+
+@lru_cache()
+def get_conversation_manager() -> ConversationManager:
+    """Return the process-wide conversation manager."""
+    return ConversationManager(ConversationStore())
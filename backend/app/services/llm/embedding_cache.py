@@ -0,0 +1,341 @@
+"""
+Content-addressed embedding cache.
+
+Embeddings are keyed on (provider, model, hash of the normalized text) and kept
+in a bounded in-memory LRU and optionally in a persistent arena on disk: one
+append-only file of raw float16/float32 vectors, memory-mapped for reads, plus
+an append-only index of fixed-size records (key, offset, dimensions, tokens).
+Several worker processes can share the directory; appends take a file lock and
+each process picks up the others' index records on a miss.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import re
+import struct
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.llm import LLMUsage
+from app.services.llm.embedding_service import EmbeddingResponse, EmbeddingService
+
+logger = logging.getLogger(__name__)
+
+# Index record: key digest, byte offset into the arena, dimensions, prompt tokens
+INDEX_RECORD = struct.Struct("<32sQII")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace so trivially different copies share an entry."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def make_embedding_key(provider: str, model: str, text: str) -> bytes:
+    """SHA-256 digest of the provider, model and normalized text."""
+    return hashlib.sha256(f"{provider}\0{model}\0{normalize_text(text)}".encode()).digest()
+
+
+class MemoryEmbeddingCache:
+    """LRU of float32 vectors bounded by entry count and total bytes."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        # key -> (vector, prompt tokens)
+        self._entries: "OrderedDict[bytes, Tuple[np.ndarray, int]]" = OrderedDict()
+
+    def get(self, key: bytes) -> Optional[Tuple[np.ndarray, int]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: bytes, vector: np.ndarray, tokens: int):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = (vector, tokens)
+        self.bytes_used += vector.nbytes
+        while len(self._entries) > self.max_entries or self.bytes_used > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.bytes_used -= evicted.nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ArenaEmbeddingStore:
+    """Persistent tier: a memory-mapped arena of raw vectors plus an append-only index."""
+
+    def __init__(self, directory: str, dtype: str = settings.EMBEDDING_CACHE_DTYPE, max_bytes: int = settings.EMBEDDING_CACHE_MAX_DISK_BYTES):
+        """
+        Open (or create) the store.
+
+        Args:
+            directory: Directory holding the arena and index files
+            dtype: "float16" (half the bytes, ~3 significant digits) or "float32"
+            max_bytes: Arena size after which new vectors are no longer persisted
+        """
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # The dtype is part of the file names so switching it never misreads old vectors
+        self.arena_path = os.path.join(directory, f"vectors.{self.dtype.name}.bin")
+        self.index_path = os.path.join(directory, f"index.{self.dtype.name}.bin")
+        for path in (self.arena_path, self.index_path):
+            open(path, "ab").close()
+
+        self._index: Dict[bytes, Tuple[int, int, int]] = {}
+        self._index_position = 0
+        self._mmap: Optional[mmap.mmap] = None
+        self._lock = asyncio.Lock()
+        self._full_logged = False
+        self._refresh()
+
+    @property
+    def bytes_used(self) -> int:
+        return os.path.getsize(self.arena_path)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _refresh(self):
+        """Read index records appended since the last refresh, by this or another process."""
+        arena_size = self.bytes_used
+        with open(self.index_path, "rb") as index_file:
+            index_file.seek(self._index_position)
+            data = index_file.read()
+        # A trailing partial record is an append in progress; it is read on a later refresh
+        complete = len(data) - len(data) % INDEX_RECORD.size
+        for key, offset, dimensions, tokens in INDEX_RECORD.iter_unpack(data[:complete]):
+            if offset + dimensions * self.dtype.itemsize <= arena_size:
+                self._index[key] = (offset, dimensions, tokens)
+        self._index_position += complete
+
+    def _view(self, offset: int, size: int) -> Optional[mmap.mmap]:
+        """The arena mapping, remapped when it has grown past the current mapping."""
+        if self._mmap is None or offset + size > len(self._mmap):
+            if self.bytes_used < offset + size:
+                return None
+            if self._mmap is not None:
+                self._mmap.close()
+            with open(self.arena_path, "rb") as arena:
+                self._mmap = mmap.mmap(arena.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    async def refresh(self):
+        """Pick up index records appended since the last refresh, off the event loop."""
+        async with self._lock:
+            await asyncio.to_thread(self._refresh)
+
+    def get(self, key: bytes) -> Optional[Tuple[np.ndarray, int]]:
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        offset, dimensions, tokens = entry
+        view = self._view(offset, dimensions * self.dtype.itemsize)
+        if view is None:
+            return None
+        # Copy out of the mapping so the vector outlives a remap
+        vector = np.frombuffer(view, dtype=self.dtype, count=dimensions, offset=offset).astype(np.float32)
+        return vector, tokens
+
+    def _append(self, entries: List[Tuple[bytes, np.ndarray, int]]):
+        with open(self.index_path, "ab") as index_file:
+            # One writer at a time across processes; vectors are written before the index records that point at them
+            fcntl.flock(index_file, fcntl.LOCK_EX)
+            try:
+                with open(self.arena_path, "ab") as arena:
+                    offset = arena.tell()
+                    if offset >= self.max_bytes:
+                        if not self._full_logged:
+                            logger.warning(f"Embedding cache arena {self.arena_path} is full, new embeddings are not persisted")
+                            self._full_logged = True
+                        return
+                    records = []
+                    for key, vector, tokens in entries:
+                        data = vector.astype(self.dtype).tobytes()
+                        arena.write(data)
+                        records.append(INDEX_RECORD.pack(key, offset, len(vector), tokens))
+                        offset += len(data)
+                    arena.flush()
+                index_file.write(b"".join(records))
+                index_file.flush()
+            finally:
+                fcntl.flock(index_file, fcntl.LOCK_UN)
+
+    async def set_many(self, entries: List[Tuple[bytes, np.ndarray, int]]):
+        """Persist vectors that aren't stored yet."""
+        entries = [entry for entry in entries if entry[0] not in self._index]
+        if not entries:
+            return
+        # File I/O runs off the event loop
+        async with self._lock:
+            await asyncio.to_thread(self._append, entries)
+            await asyncio.to_thread(self._refresh)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+class EmbeddingCache:
+    """Two-tier (memory, then optional disk arena) cache of embedding vectors."""
+
+    def __init__(
+        self,
+        max_entries: int = settings.EMBEDDING_CACHE_MAX_ENTRIES,
+        max_bytes: int = settings.EMBEDDING_CACHE_MAX_BYTES,
+        directory: str = settings.EMBEDDING_CACHE_DIR,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of vectors kept in memory
+            max_bytes: Maximum total size of the vectors kept in memory
+            directory: Directory of the persistent tier (empty disables it)
+        """
+        self.memory = MemoryEmbeddingCache(max_entries=max_entries, max_bytes=max_bytes)
+        self.disk = ArenaEmbeddingStore(directory) if directory else None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.cached_tokens = 0
+
+    def _lookup(self, key: bytes) -> Optional[Tuple[np.ndarray, int]]:
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                # Promote to the memory tier
+                self.memory.set(key, *entry)
+                self.disk_hits += 1
+        return entry
+
+    async def get_many(self, keys: List[bytes]) -> List[Optional[Tuple[np.ndarray, int]]]:
+        """Look up several keys; the disk index is refreshed at most once per call."""
+        entries = [self._lookup(key) for key in keys]
+        if self.disk is not None and any(entry is None for entry in entries):
+            # Other processes may have stored some of the misses since the last refresh
+            await self.disk.refresh()
+            entries = [entry if entry is not None else self._lookup(key) for key, entry in zip(keys, entries)]
+
+        for entry in entries:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.cached_tokens += entry[1]
+        return entries
+
+    async def set_many(self, entries: List[Tuple[bytes, np.ndarray, int]]):
+        for key, vector, tokens in entries:
+            self.memory.set(key, vector, tokens)
+        if self.disk is not None:
+            await self.disk.set_many(entries)
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and bytes held by each tier."""
+        lookups = self.hits + self.misses
+        stats = {
+            "entries": len(self.memory),
+            "bytes": self.memory.bytes_used,
+            "persistent": self.disk is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "cached_tokens": self.cached_tokens,
+        }
+        if self.disk is not None:
+            stats.update({"disk_entries": len(self.disk), "disk_bytes": self.disk.bytes_used, "disk_dtype": self.disk.dtype.name})
+        return stats
+
+
+class CachedEmbeddingService(EmbeddingService):
+    """Wraps an embedding service and serves previously embedded texts from the embedding cache."""
+
+    def __init__(self, service: EmbeddingService, provider: str, cache: EmbeddingCache):
+        """
+        Initialize the wrapper.
+
+        Args:
+            service: The provider service to call on a cache miss
+            provider: Provider name, part of the cache key
+            cache: Shared embedding cache
+        """
+        self.service = service
+        self.provider = provider
+        self.max_batch_items = service.max_batch_items
+        self.max_batch_tokens = service.max_batch_tokens
+        self.cache = cache
+
+    @staticmethod
+    def _cached_response(entry: Tuple[np.ndarray, int], model: str) -> EmbeddingResponse:
+        vector, tokens = entry
+        return EmbeddingResponse(
+            embedding=vector, model=model, usage=LLMUsage(prompt_tokens=tokens, completion_tokens=0, total_tokens=tokens), cached=True
+        )
+
+    async def create_embedding(self, text: str, model: str = "text-embedding-ada-002") -> EmbeddingResponse:
+        """Create an embedding, or return the cached one for the same normalized text."""
+        return (await self.create_embeddings([text], model))[0]
+
+    async def create_embeddings(self, texts: List[str], model: str = "text-embedding-ada-002") -> List[EmbeddingResponse]:
+        """Create embeddings, sending only texts not found in the cache (each distinct text once)."""
+        keys = [make_embedding_key(self.provider, model, text) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+        entries = dict(zip(unique_keys, await self.cache.get_many(unique_keys)))
+        results: List[Optional[EmbeddingResponse]] = [None] * len(texts)
+        missing: Dict[bytes, List[int]] = {}
+        for index, key in enumerate(keys):
+            entry = entries[key]
+            if entry is None:
+                missing.setdefault(key, []).append(index)
+            else:
+                results[index] = self._cached_response(entry, model)
+
+        if missing:
+            miss_keys = list(missing)
+            miss_texts = [texts[missing[key][0]] for key in miss_keys]
+            if len(miss_texts) == 1:
+                responses = [await self.service.create_embedding(text=miss_texts[0], model=model)]
+            else:
+                responses = await self.service.create_embeddings(texts=miss_texts, model=model)
+
+            entries = []
+            for key, response in zip(miss_keys, responses):
+                indices = missing[key]
+                results[indices[0]] = response
+                # Repeats within the request are served from the first copy
+                for index in indices[1:]:
+                    results[index] = response.model_copy(update={"cached": True})
+                entries.append((key, response.vector(), response.usage.prompt_tokens))
+            await self.cache.set_many(entries)
+
+        return results
+
+
+@lru_cache()
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache."""
+    return EmbeddingCache()
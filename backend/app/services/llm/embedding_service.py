@@ -1,38 +1,159 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional, Union
+import asyncio
+import base64
 import openai
 import google.generativeai as genai
 import numpy as np
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 from functools import lru_cache
 
 from app.core.config import settings
+from app.core.http_clients import http_clients
 from app.models.llm import LLMUsage
+from app.services.llm.hashed_ngrams import hashed_ngram_embeddings
+from app.services.llm.tokenizer import count_tokens
+
+# Local batches up to this size are embedded on the event loop; larger ones in a worker thread
+LOCAL_INLINE_BATCH_SIZE = 64
 
 
 class EmbeddingResponse(BaseModel):
-    """Response from an embedding service."""
+    """
+    Response from an embedding service.
+
+    The vector is kept in the form it was produced in: a float list from a
+    provider API, or a float32 array for local and cached vectors. The other
+    form is only built when it is asked for, so encoded responses are written
+    straight from the array without ever creating a float list.
+    """
 
-    embedding: List[float]
     model: str
     usage: LLMUsage
+    cached: bool = False
+    _embedding: Optional[List[float]] = PrivateAttr(default=None)
+    _vector: Optional[np.ndarray] = PrivateAttr(default=None)
+
+    def __init__(self, embedding: Union[List[float], np.ndarray], **data):
+        super().__init__(**data)
+        if isinstance(embedding, np.ndarray):
+            self._vector = embedding.astype(np.float32, copy=False)
+        else:
+            self._embedding = embedding
+
+    @property
+    def embedding(self) -> List[float]:
+        """The embedding as a list of floats."""
+        if self._embedding is None:
+            self._embedding = self._vector.tolist()
+        return self._embedding
+
+    def vector(self) -> np.ndarray:
+        """The embedding as a float32 array."""
+        if self._vector is None:
+            self._vector = np.asarray(self._embedding, dtype=np.float32)
+        return self._vector
+
+
+# Wire dtypes of the encoded formats, always little-endian
+ENCODING_DTYPES = {"base64": np.dtype("<f4"), "float16": np.dtype("<f2"), "binary": np.dtype("<f4")}
+
+
+def encode_embeddings(vectors: np.ndarray, encoding_format: str) -> List[str]:
+    """Base64-encode each row of a (texts x dimensions) matrix in the format's dtype."""
+    rows = np.ascontiguousarray(vectors, dtype=ENCODING_DTYPES[encoding_format])
+    return [base64.b64encode(row.tobytes()).decode("ascii") for row in rows]
+
+
+def pack_batches(token_counts: List[int], max_items: int, max_tokens: int) -> List[List[int]]:
+    """
+    Group input indices into consecutive batches within item and token limits.
+
+    An input larger than max_tokens gets a batch of its own (the provider rejects it if it's too long).
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for index, tokens in enumerate(token_counts):
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def apportion_tokens(total: int, weights: List[int]) -> List[int]:
+    """Split a batch's reported token total across its inputs in proportion to their local counts."""
+    weight_sum = sum(weights)
+    if weight_sum == 0:
+        return [0] * len(weights)
+    shares = [total * weight // weight_sum for weight in weights]
+    # Rounding leftovers go to the largest inputs so the shares add up to the total
+    for index in sorted(range(len(weights)), key=lambda i: weights[i], reverse=True)[: total - sum(shares)]:
+        shares[index] += 1
+    return shares
 
 
 class EmbeddingService(ABC):
     """Abstract base class for embedding services."""
 
+    # Provider (selects the tokenizer) and limits for one upstream batch request
+    provider: str = ""
+    max_batch_items: int = 2048
+    max_batch_tokens: int = 300000
+
     @abstractmethod
     async def create_embedding(self, text: str, model: str) -> EmbeddingResponse:
         """Create an embedding vector for the text."""
         pass
 
+    async def embed_batch(self, texts: List[str], model: str) -> List[EmbeddingResponse]:
+        """Embed one provider-sized batch. Providers without a batch API embed each input concurrently."""
+        return list(await asyncio.gather(*(self.create_embedding(text=text, model=model) for text in texts)))
+
+    async def create_embeddings(self, texts: List[str], model: str = "text-embedding-ada-002") -> List[EmbeddingResponse]:
+        """
+        Create embeddings for many texts, in input order, each with its own usage.
+
+        Inputs are packed into batches by count and token limits and the batches run concurrently.
+
+        Args:
+            texts: Texts to embed
+            model: Embedding model
+        """
+        token_counts = [count_tokens(text, self.provider, model) for text in texts]
+        batches = pack_batches(
+            token_counts,
+            max_items=min(self.max_batch_items, settings.EMBEDDING_BATCH_MAX_ITEMS),
+            max_tokens=min(self.max_batch_tokens, settings.EMBEDDING_BATCH_MAX_TOKENS),
+        )
+        semaphore = asyncio.Semaphore(settings.EMBEDDING_BATCH_CONCURRENCY)
+
+        async def run(batch: List[int]) -> List[EmbeddingResponse]:
+            async with semaphore:
+                return await self.embed_batch([texts[index] for index in batch], model)
+
+        results: List[EmbeddingResponse] = [None] * len(texts)
+        for batch, responses in zip(batches, await asyncio.gather(*(run(batch) for batch in batches))):
+            for index, response in zip(batch, responses):
+                results[index] = response
+        return results
+
 
 class OpenAIEmbeddingService(EmbeddingService):
     """OpenAI implementation of the embedding service."""
 
+    provider = "openai"
+    max_batch_items = 2048
+    max_batch_tokens = 300000
+
     def __init__(self, api_key: str):
         """Initialize the OpenAI client."""
-        self.client = openai.AsyncOpenAI(api_key=api_key)
+        # Shares keep-alive connections with the OpenAI LLM service
+        self.client = openai.AsyncOpenAI(api_key=api_key, http_client=http_clients.get("openai"))
 
     async def create_embedding(self, text: str, model: str = "text-embedding-ada-002") -> EmbeddingResponse:
         """Create an embedding using OpenAI."""
@@ -44,52 +165,89 @@ class OpenAIEmbeddingService(EmbeddingService):
 
         return EmbeddingResponse(embedding=embedding, model=model, usage=usage)
 
+    async def embed_batch(self, texts: List[str], model: str) -> List[EmbeddingResponse]:
+        """Embed a batch in one request; the reported usage is split across inputs by their local token counts."""
+        response = await self.client.embeddings.create(model=model, input=texts)
+
+        # Items carry their input index; don't rely on the response order
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        shares = apportion_tokens(response.usage.prompt_tokens, [count_tokens(text, "openai", model) for text in texts])
+
+        return [
+            EmbeddingResponse(embedding=embedding, model=model, usage=LLMUsage(prompt_tokens=tokens, completion_tokens=0, total_tokens=tokens))
+            for embedding, tokens in zip(embeddings, shares)
+        ]
+
+
+class LocalEmbeddingService(EmbeddingService):
+    """Offline embeddings from feature-hashed character n-grams (no API calls, no cost)."""
+
+    provider = "local"
+    max_batch_items = 100000
+    max_batch_tokens = 100000000
+    default_dimensions = settings.LOCAL_EMBEDDING_DIMENSIONS
+
+    def dimensions_for(self, model: str) -> int:
+        """Vector length; a "-<dimensions>" suffix on the model name (e.g. "local-ngram-768") overrides the default."""
+        suffix = model.rsplit("-", 1)[-1] if model and model.startswith("local-") else ""
+        return int(suffix) if suffix.isdigit() else self.default_dimensions
+
+    def _embed(self, texts: List[str], model: str) -> List[EmbeddingResponse]:
+        vectors = hashed_ngram_embeddings(texts, dimensions=self.dimensions_for(model))
+        responses = []
+        for text, vector in zip(texts, vectors):
+            tokens = count_tokens(text, self.provider, model)
+            responses.append(EmbeddingResponse(embedding=vector, model=model, usage=LLMUsage(prompt_tokens=tokens, completion_tokens=0, total_tokens=tokens)))
+        return responses
+
+    async def create_embedding(self, text: str, model: str = "local-ngram") -> EmbeddingResponse:
+        """Create an embedding locally."""
+        return self._embed([text], model)[0]
 
-class AnthropicEmbeddingService(EmbeddingService):
+    async def embed_batch(self, texts: List[str], model: str) -> List[EmbeddingResponse]:
+        """Embed a batch in one vectorized pass."""
+        return await self.create_embeddings(texts, model)
+
+    async def create_embeddings(self, texts: List[str], model: str = "local-ngram") -> List[EmbeddingResponse]:
+        """Embed all texts in one vectorized pass; large inputs run off the event loop."""
+        if len(texts) <= LOCAL_INLINE_BATCH_SIZE:
+            return self._embed(texts, model)
+        return await asyncio.to_thread(self._embed, texts, model)
+
+
+class AnthropicEmbeddingService(LocalEmbeddingService):
     """Anthropic implementation of the embedding service."""
 
+    provider = "anthropic"
+    default_dimensions = 1536
+
     def __init__(self, api_key: str):
         """Initialize the Anthropic client."""
-        # Note: Anthropic doesn't currently have a dedicated embeddings API,
-        # so this is a placeholder for future implementation
+        # Note: Anthropic doesn't currently have a dedicated embeddings API, so vectors come
+        # from the local n-gram embedder: deterministic and searchable, though not semantic
         self.api_key = api_key
 
     async def create_embedding(self, text: str, model: str = "claude-embedding") -> EmbeddingResponse:
-        """Create an embedding using Anthropic."""
-        # This is a placeholder implementation
-        # In a real implementation, you'd call the Anthropic embedding API when available
-
-        # For now, return a random embedding as a placeholder
-        # In production, you would replace this with the actual API call
-        random_embedding = list(np.random.normal(0, 1, 1536))
+        """Create an embedding for Anthropic users (computed locally)."""
+        return self._embed([text], model)[0]
 
-        usage = LLMUsage(prompt_tokens=len(text.split()), completion_tokens=0, total_tokens=len(text.split()))
 
-        return EmbeddingResponse(embedding=[float(x) for x in random_embedding], model=model, usage=usage)
-
-
-class GeminiEmbeddingService(EmbeddingService):
+class GeminiEmbeddingService(LocalEmbeddingService):
     """Google Gemini implementation of the embedding service."""
 
+    provider = "gemini"
+    default_dimensions = 768  # Gemini text-embedding-004 size
+
     def __init__(self, api_key: str):
         """Initialize the Gemini client."""
         genai.configure(api_key=api_key)
         self.api_key = api_key
 
     async def create_embedding(self, text: str, model: str = "models/text-embedding-004") -> EmbeddingResponse:
-        """Create an embedding using Google Gemini."""
-        # Note: Gemini embedding API is still evolving
-        # For now, we'll use a placeholder similar to Anthropic
-        # Replace with actual Gemini embedding call when API is stable
-        
-        # Placeholder implementation with random embeddings
-        # In production, you would replace this with:
-        # response = genai.embed_content(model=model, content=text)
-        random_embedding = list(np.random.normal(0, 1, 768))  # Gemini typically uses 768-dim embeddings
-
-        usage = LLMUsage(prompt_tokens=len(text.split()), completion_tokens=0, total_tokens=len(text.split()))
-
-        return EmbeddingResponse(embedding=[float(x) for x in random_embedding], model=model, usage=usage)
+        """Create an embedding for Gemini users (computed locally)."""
+        # Note: Gemini embedding API is still evolving; until it is wired in
+        # (genai.embed_content), vectors come from the local n-gram embedder
+        return self._embed([text], model)[0]
 
 
 class EmbeddingServiceFactory:
@@ -102,6 +260,8 @@ class EmbeddingServiceFactory:
             if not settings.OPENAI_API_KEY:
                 raise ValueError("OpenAI API key not configured")
             return OpenAIEmbeddingService(api_key=settings.OPENAI_API_KEY)
+        elif provider == "local":
+            return LocalEmbeddingService()
         elif provider == "anthropic":
             if not settings.ANTHROPIC_API_KEY:
                 raise ValueError("Anthropic API key not configured")
@@ -117,4 +277,29 @@ class EmbeddingServiceFactory:
 @lru_cache()
 def get_embedding_service(provider: str = "openai") -> EmbeddingService:
     """Dependency to get an embedding service."""
-    return EmbeddingServiceFactory.get_service(provider)
+    service = EmbeddingServiceFactory.get_service(provider)
+    # Computed in-process (also Anthropic and Gemini for now): nothing to gain from batching requests
+    computed_locally = isinstance(service, LocalEmbeddingService)
+
+    if settings.CIRCUIT_BREAKER_ENABLED:
+        from app.services.llm.circuit_breaker import CircuitBreakerEmbeddingService, circuit_breakers
+
+        service = CircuitBreakerEmbeddingService(service, provider=provider, registry=circuit_breakers)
+
+    if settings.EMBEDDING_MICROBATCH_ENABLED and not computed_locally:
+        from app.services.llm.micro_batcher import MicroBatchingEmbeddingService, embedding_batcher
+
+        service = MicroBatchingEmbeddingService(service, provider=provider, batcher=embedding_batcher)
+
+    if settings.LLM_SINGLE_FLIGHT_ENABLED:
+        from app.services.llm.single_flight import SingleFlightEmbeddingService, embedding_flight
+
+        service = SingleFlightEmbeddingService(service, provider=provider, flight=embedding_flight)
+
+    # Outermost, so texts embedded before never reach the provider (or wait on an in-flight call)
+    if settings.EMBEDDING_CACHE_ENABLED:
+        from app.services.llm.embedding_cache import CachedEmbeddingService, get_embedding_cache
+
+        service = CachedEmbeddingService(service, provider=provider, cache=get_embedding_cache())
+
+    return service
@@ -0,0 +1,83 @@
+"""
+Offline text embeddings from feature-hashed character n-grams.
+
+Each text is lower-cased, its whitespace collapsed and padded with spaces, and
+every UTF-8 byte n-gram (3 to 5 bytes by default) is hashed into one of
+`dimensions` buckets with a hash-derived sign. Counts are dampened (log1p) and
+the vector is L2-normalized, so cosine similarity reflects shared substrings.
+
+The whole batch is processed at once: texts are concatenated into one byte
+array, n-gram hashes are computed with shifted-array arithmetic and summed into
+a (texts x dimensions) matrix with a single bincount. The output depends only
+on the input and the parameters, never on process state or a random seed.
+"""
+
+import re
+from typing import List, Sequence
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+# 64-bit multipliers: polynomial base for rolling hashes and finalizer constants (splitmix64)
+_BASE = np.uint64(0x100000001B3)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _finalize(hashes: np.ndarray) -> np.ndarray:
+    """Scramble hashes so that buckets and signs are evenly spread."""
+    hashes = hashes ^ (hashes >> np.uint64(30))
+    hashes = hashes * _MIX_1
+    hashes = hashes ^ (hashes >> np.uint64(27))
+    hashes = hashes * _MIX_2
+    return hashes ^ (hashes >> np.uint64(31))
+
+
+def hashed_ngram_embeddings(texts: Sequence[str], dimensions: int = 384, min_n: int = 3, max_n: int = 5) -> np.ndarray:
+    """
+    Embed texts as L2-normalized, signed feature-hashed character n-gram counts.
+
+    Args:
+        texts: Texts to embed
+        dimensions: Vector length
+        min_n: Shortest n-gram, in UTF-8 bytes (at least 2)
+        max_n: Longest n-gram, in UTF-8 bytes
+
+    Returns:
+        float32 array of shape (len(texts), dimensions); empty texts map to zero vectors
+    """
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+    if not texts:
+        return vectors
+
+    encoded = [f" {_WHITESPACE.sub(' ', text.lower()).strip()} ".encode("utf-8") for text in texts]
+    lengths = np.fromiter((len(data) for data in encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    owner = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+
+    buckets: List[np.ndarray] = []
+    weights: List[np.ndarray] = []
+    with np.errstate(over="ignore"):
+        # Rolling hash of data[i : i + n], built up one byte at a time; uint64 arithmetic wraps
+        rolling = data.copy()
+        for n in range(2, max_n + 1):
+            rolling = rolling[:-1] * _BASE + data[n - 1 :]
+            if n < min_n:
+                continue
+            # Drop n-grams that span two texts
+            within = owner[: len(rolling)] == owner[n - 1 : n - 1 + len(rolling)]
+            # Mixing in n keeps e.g. a 3-gram and a 4-gram with equal rolling hashes apart
+            hashes = _finalize(rolling[within] + np.uint64(n) * _MIX_2)
+            rows = owner[: len(rolling)][within]
+            buckets.append(rows * dimensions + (hashes % np.uint64(dimensions)).astype(np.int64))
+            # The top bit decides the sign, so collisions tend to cancel instead of pile up
+            weights.append(np.where(hashes >> np.uint64(63), -1.0, 1.0))
+
+    if buckets:
+        counts = np.bincount(np.concatenate(buckets), weights=np.concatenate(weights), minlength=len(texts) * dimensions)
+        vectors = counts.reshape(len(texts), dimensions).astype(np.float32)
+
+    vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
@@ -0,0 +1,185 @@
+"""
+Hedged and failover text generation across providers.
+
+The request goes to the primary model first. If it hasn't answered by a
+deadline derived from that model's recent latency percentile, an equivalent
+model from another provider is raced against it; the first successful answer
+wins and the other request is cancelled. Hard failures move on to the next
+equivalent model.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from app.config.models import MODELS, get_equivalent_models
+from app.core.config import settings
+from app.services.llm.llm_service import LLMResponse, LLMService, get_llm_service
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyWindow:
+    """
+    Recent call durations for one model.
+
+    Calls cancelled before finishing (hedge losers) are kept as their elapsed
+    time, a lower bound on their latency. They are the slow tail, so leaving
+    them out would pull the percentile deadline down and hedge more and more.
+    """
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class HedgedRouter:
+    """Routes a generation to a primary model with hedging and failover to equivalents."""
+
+    def __init__(
+        self,
+        get_service: Callable[[str], LLMService] = get_llm_service,
+        percentile: float = settings.LLM_HEDGE_PERCENTILE,
+        min_samples: int = settings.LLM_HEDGE_MIN_SAMPLES,
+        default_deadline: float = settings.LLM_HEDGE_DEFAULT_DEADLINE_SECONDS,
+        min_deadline: float = settings.LLM_HEDGE_MIN_DEADLINE_SECONDS,
+        max_fallbacks: int = settings.LLM_HEDGE_MAX_FALLBACKS,
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            get_service: Returns the LLM service for a provider (stubs can be injected here)
+            percentile: Latency percentile of the primary model used as the hedge deadline
+            min_samples: Samples needed before the percentile is trusted
+            default_deadline: Hedge deadline while there are too few samples
+            min_deadline: Lower bound on the hedge deadline
+            max_fallbacks: Maximum number of equivalent models tried after the primary
+        """
+        self.get_service = get_service
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_deadline = default_deadline
+        self.min_deadline = min_deadline
+        self.max_fallbacks = max_fallbacks
+        self._latency: Dict[str, LatencyWindow] = {}
+
+        self.hedges = 0
+        self.fallback_wins = 0
+        self.failovers = 0
+
+    def hedge_deadline(self, model: str) -> float:
+        """Seconds to wait for the primary before sending a hedged request."""
+        window = self._latency.get(model)
+        if window is None or len(window.samples) < self.min_samples:
+            return self.default_deadline
+        return max(self.min_deadline, window.percentile(self.percentile))
+
+    def _fallback_models(self, model: str) -> List[str]:
+        """Equivalent models whose provider is configured and not failing."""
+        from app.services.llm.circuit_breaker import circuit_breakers
+
+        fallbacks = []
+        for candidate in get_equivalent_models(model):
+            if circuit_breakers.is_open(MODELS[candidate].provider):
+                continue
+            try:
+                self.get_service(MODELS[candidate].provider)
+            except ValueError:
+                # Provider not configured
+                continue
+            fallbacks.append(candidate)
+        return fallbacks[: self.max_fallbacks]
+
+    def _start(self, provider: str, model: str, prompt: str, max_tokens: int, temperature: float, **kwargs) -> asyncio.Task:
+        # Equivalent models can have a lower output limit than the primary
+        config = MODELS.get(model)
+        if config is not None:
+            max_tokens = min(max_tokens, config.max_tokens)
+
+        async def call() -> LLMResponse:
+            window = self._latency.setdefault(model, LatencyWindow())
+            started = time.perf_counter()
+            try:
+                response = await self.get_service(provider).generate_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+            except asyncio.CancelledError:
+                # Censored sample: it would have taken at least this long
+                window.record(time.perf_counter() - started)
+                raise
+            window.record(time.perf_counter() - started)
+            return response
+
+        return asyncio.ensure_future(call())
+
+    async def generate_text(self, prompt: str, model: str, provider: str, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
+        """Generate text with hedging and failover."""
+        fallbacks = self._fallback_models(model)
+        pending: Dict[asyncio.Task, str] = {self._start(provider, model, prompt, max_tokens, temperature, **kwargs): model}
+        errors: List[str] = []
+        hedged = False
+
+        try:
+            while pending:
+                timeout = None
+                if not hedged and fallbacks:
+                    timeout = self.hedge_deadline(model)
+
+                done, _ = await asyncio.wait(pending.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Primary is slower than usual: race an equivalent model against it
+                    hedged = True
+                    self.hedges += 1
+                    hedge_model = fallbacks.pop(0)
+                    logger.info(f"Hedging {model} with {hedge_model} after {timeout:.2f}s")
+                    pending[self._start(MODELS[hedge_model].provider, hedge_model, prompt, max_tokens, temperature, **kwargs)] = hedge_model
+                    continue
+
+                for task in done:
+                    task_model = pending.pop(task)
+                    if task.exception() is None:
+                        if task_model != model:
+                            self.fallback_wins += 1
+                        return task.result()
+                    errors.append(f"{task_model}: {task.exception()}")
+
+                # Hard failure: move down the fallback chain if nothing else is running
+                if not pending and fallbacks:
+                    self.failovers += 1
+                    hedged = True
+                    next_model = fallbacks.pop(0)
+                    logger.warning(f"Failing over to {next_model} after: {errors[-1]}")
+                    pending[self._start(MODELS[next_model].provider, next_model, prompt, max_tokens, temperature, **kwargs)] = next_model
+        finally:
+            # Cancel the losing request(s)
+            for task in pending:
+                task.cancel()
+
+        raise RuntimeError(f"All models failed: {'; '.join(errors)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedges": self.hedges,
+            "fallback_wins": self.fallback_wins,  # Answered by a model other than the primary
+            "failovers": self.failovers,
+            "deadlines": {model: round(self.hedge_deadline(model), 3) for model in self._latency},
+        }
+
+
+@lru_cache()
+def get_hedged_router() -> HedgedRouter:
+    """Return the process-wide hedged router."""
+    return HedgedRouter()
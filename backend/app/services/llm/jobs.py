@@ -0,0 +1,533 @@
+"""
+Background job queue for long-running text generations.
+
+POST /api/llm/jobs enqueues a job and returns at once; a pool of in-process
+workers claims jobs by priority and runs them, so slow models don't hold a
+request open past load balancer timeouts. Failed attempts are retried with
+exponential backoff, and finished jobs can notify a callback URL. Callback
+URLs must resolve to public addresses (or hosts in JOBS_CALLBACK_ALLOWED_HOSTS),
+and each user may only have a bounded number of jobs outstanding.
+
+The queue backend is pluggable: "memory" keeps jobs in this process, while
+"supabase" stores them in a Postgres table claimed with FOR UPDATE SKIP LOCKED,
+so any number of instances can share one queue.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import hmac
+import ipaddress
+import itertools
+import logging
+import random
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config.models import MODELS
+from app.config.prompts import resolve_system_prompt
+from app.core.config import settings
+from app.core.http_clients import http_clients
+from app.models.llm import Job, JobCreateRequest, TextGenerationRequest, TextGenerationResponse
+from app.services.llm.circuit_breaker import CircuitOpenError
+from app.services.llm.hedging import get_hedged_router
+from app.services.llm.llm_service import get_llm_service
+from app.services.llm.model_router import model_router
+from app.services.llm.semantic_cache import get_semantic_cache
+from app.services.llm.tokenizer import preflight
+from app.services.llm.usage_accounting import get_usage_accountant, served_provider
+from app.services.supabase.client import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+OUTSTANDING_STATUSES = ("queued", "running")
+
+# Callback delivery attempts before giving up
+WEBHOOK_ATTEMPTS = 3
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class CallbackURLError(ValueError):
+    """The callback URL may not be called by the server."""
+
+
+class TooManyJobsError(RuntimeError):
+    """The user already has the maximum number of outstanding jobs."""
+
+
+async def check_callback_url(url: str, allowed_hosts: Optional[List[str]] = None):
+    """
+    Reject callback URLs that would make the server call into private networks.
+
+    The host must be in allowed_hosts when that is non-empty, and every address it
+    resolves to must be public (not loopback, link-local, private or reserved).
+    """
+    allowed_hosts = settings.JOBS_CALLBACK_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts
+    try:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError as e:
+        raise CallbackURLError("callback_url is not a valid URL") from e
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise CallbackURLError("callback_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if allowed_hosts and host not in {allowed.lower() for allowed in allowed_hosts}:
+        raise CallbackURLError(f"callback_url host {host} is not allowed")
+
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        raise CallbackURLError(f"callback_url host {host} does not resolve") from e
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise CallbackURLError(f"callback_url host {host} resolves to a non-public address")
+
+
+class JobQueueBackend(ABC):
+    """Stores jobs and hands them to workers in priority order."""
+
+    @abstractmethod
+    async def enqueue(self, job: Job):
+        """Add a queued job."""
+        pass
+
+    @abstractmethod
+    async def claim(self, wait: float) -> Optional[Job]:
+        """Mark the highest-priority ready job as running and return it, waiting up to wait seconds."""
+        pass
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Job]:
+        """Get a job by id."""
+        pass
+
+    @abstractmethod
+    async def update(self, job: Job) -> bool:
+        """Save a job's state; returns False if it was cancelled meanwhile (the update is dropped)."""
+        pass
+
+    @abstractmethod
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job and return it."""
+        pass
+
+    @abstractmethod
+    async def count_outstanding(self, user_id: str) -> int:
+        """Number of queued or running jobs of a user."""
+        pass
+
+
+class MemoryJobQueue(JobQueueBackend):
+    """Job queue held in this process."""
+
+    def __init__(self, retention: int = settings.JOBS_RETENTION):
+        """
+        Initialize the queue.
+
+        Args:
+            retention: Finished jobs kept for polling, oldest forgotten first
+        """
+        self.retention = retention
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._ready: List[Tuple[int, int, str]] = []  # (-priority, sequence, id)
+        self._delayed: List[Tuple[datetime, int, str]] = []  # (available_at, sequence, id)
+        self._sequence = itertools.count()
+        self._changed = asyncio.Condition()
+
+    async def enqueue(self, job: Job):
+        async with self._changed:
+            self._jobs[job.id] = job
+            if job.available_at > _now():
+                heapq.heappush(self._delayed, (job.available_at, next(self._sequence), job.id))
+            else:
+                heapq.heappush(self._ready, (-job.priority, next(self._sequence), job.id))
+            self._changed.notify()
+
+    def _pop_ready(self) -> Optional[Job]:
+        now = _now()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, job_id = heapq.heappop(self._delayed)
+            job = self._jobs.get(job_id)
+            if job is not None:
+                heapq.heappush(self._ready, (-job.priority, next(self._sequence), job_id))
+
+        while self._ready:
+            _, _, job_id = heapq.heappop(self._ready)
+            job = self._jobs.get(job_id)
+            # Skip jobs cancelled while queued
+            if job is not None and job.status == "queued":
+                return job
+        return None
+
+    async def claim(self, wait: float) -> Optional[Job]:
+        async with self._changed:
+            job = self._pop_ready()
+            if job is None:
+                # Wake up for a new job, or when the next delayed retry comes due
+                if self._delayed:
+                    wait = min(wait, max(0.0, (self._delayed[0][0] - _now()).total_seconds()))
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                job = self._pop_ready()
+            if job is None:
+                return None
+            job.status = "running"
+            job.attempts += 1
+            job.started_at = _now()
+            return job.model_copy(deep=True)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        return job.model_copy(deep=True) if job is not None else None
+
+    async def update(self, job: Job) -> bool:
+        current = self._jobs.get(job.id)
+        if current is None or current.status == "cancelled":
+            return False
+        if job.status == "queued":
+            # Retry: goes back on the queue once its backoff has passed
+            await self.enqueue(job)
+        else:
+            self._jobs[job.id] = job
+        if job.status in FINISHED_STATUSES:
+            self._forget_old()
+        return True
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is not None and job.status not in FINISHED_STATUSES:
+            job.status = "cancelled"
+            job.finished_at = _now()
+            self._forget_old()
+        return job.model_copy(deep=True) if job is not None else None
+
+    async def count_outstanding(self, user_id: str) -> int:
+        return sum(1 for job in self._jobs.values() if job.user_id == user_id and job.status in OUTSTANDING_STATUSES)
+
+    def _forget_old(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATUSES]
+        for job_id in finished[: max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+
+
+class SupabaseJobQueue(JobQueueBackend):
+    """Job queue in a Supabase table, shared by every instance."""
+
+    def __init__(self, table: str = settings.JOBS_TABLE, stale_seconds: float = settings.JOBS_TIMEOUT_SECONDS * 2):
+        """
+        Initialize the queue.
+
+        Args:
+            table: Supabase table holding the jobs
+            stale_seconds: Running jobs older than this are assumed lost (e.g. instance restarted) and claimed again
+        """
+        self.table = table
+        self.stale_seconds = stale_seconds
+
+    @staticmethod
+    def _row(job: Job) -> Dict[str, Any]:
+        return job.model_dump(mode="json")
+
+    async def enqueue(self, job: Job):
+        supabase = await get_supabase_client()
+        await supabase.table(self.table).insert(self._row(job)).execute()
+
+    async def claim(self, wait: float) -> Optional[Job]:
+        supabase = await get_supabase_client()
+        # claim_llm_job locks the row with FOR UPDATE SKIP LOCKED, so instances never claim the same job
+        response = await supabase.rpc("claim_llm_job", {"p_stale_seconds": int(self.stale_seconds)}).execute()
+        if not response.data:
+            await asyncio.sleep(wait)
+            return None
+        return Job(**response.data[0])
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        supabase = await get_supabase_client()
+        response = await supabase.table(self.table).select("*").eq("id", job_id).execute()
+        return Job(**response.data[0]) if response.data else None
+
+    async def update(self, job: Job) -> bool:
+        supabase = await get_supabase_client()
+        response = await supabase.table(self.table).update(self._row(job)).eq("id", job.id).neq("status", "cancelled").execute()
+        return bool(response.data)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        supabase = await get_supabase_client()
+        await (
+            supabase.table(self.table)
+            .update({"status": "cancelled", "finished_at": _now().isoformat()})
+            .eq("id", job_id)
+            .in_("status", list(OUTSTANDING_STATUSES))
+            .execute()
+        )
+        return await self.get(job_id)
+
+    async def count_outstanding(self, user_id: str) -> int:
+        supabase = await get_supabase_client()
+        response = await supabase.table(self.table).select("id", count="exact").eq("user_id", user_id).in_("status", list(OUTSTANDING_STATUSES)).execute()
+        return response.count or 0
+
+
+class NonRetryableJobError(Exception):
+    """The job can't succeed by retrying (invalid request, unknown template, etc.)."""
+
+
+def apply_budget_routing(request: TextGenerationRequest) -> TextGenerationRequest:
+    """Let the latency-aware router pick model and provider when the request sets a budget, as /generate does."""
+    if request.budget is None:
+        return request
+    try:
+        chosen, decision = model_router.select_model(task=request.task, budget_level=request.budget)
+    except ValueError as e:
+        raise NonRetryableJobError(str(e)) from e
+    logger.info(f"Model router chose {chosen}: {decision['reason']}")
+    return request.model_copy(update={"model": chosen, "provider": MODELS[chosen].provider})
+
+
+async def run_generation(request: TextGenerationRequest, user_id: Optional[str] = None) -> TextGenerationResponse:
+    """
+    Run one generation the way /generate does: budget routing, hedging, response cache and single-flight.
+
+    With a user_id the semantic cache is used too (scoped to that user) unless the
+    request sets bypass_cache; jobs run without it.
+    """
+    request = apply_budget_routing(request)
+    try:
+        system_prompt = resolve_system_prompt(request.prompt_template, request.system_prompt)
+        checked = preflight(request.prompt, request.model, request.provider, request.max_tokens, system_prompt=system_prompt, overflow=request.overflow)
+        llm_service = get_llm_service(request.provider)
+    except ValueError as e:
+        raise NonRetryableJobError(str(e)) from e
+
+    semantic_cache = None
+    prompt_embedding = None
+    if user_id is not None and settings.SEMANTIC_CACHE_ENABLED and not request.bypass_cache:
+        semantic_cache = get_semantic_cache()
+        if semantic_cache.applies_to(request.temperature):
+            cached_response, prompt_embedding = await semantic_cache.lookup(checked.prompt, request.model, user_id, checked.max_tokens, system_prompt)
+            if cached_response is not None:
+                return TextGenerationResponse(text=cached_response.text, model=cached_response.model, usage=cached_response.usage, cached=True)
+        else:
+            semantic_cache = None
+
+    started = time.perf_counter()
+    if (request.routing or settings.LLM_ROUTING_MODE) == "hedged":
+        response = await get_hedged_router().generate_text(
+            prompt=checked.prompt,
+            model=request.model,
+            provider=request.provider,
+            max_tokens=checked.max_tokens,
+            temperature=request.temperature,
+            system_prompt=system_prompt,
+        )
+    else:
+        response = await llm_service.generate_text(
+            prompt=checked.prompt, model=request.model, max_tokens=checked.max_tokens, temperature=request.temperature, system_prompt=system_prompt
+        )
+    if semantic_cache is not None and not response.cached:
+        semantic_cache.record_provider_latency(request.model, time.perf_counter() - started)
+        if prompt_embedding is not None:
+            semantic_cache.store_in_background(checked.prompt, prompt_embedding, response, request.model, user_id, checked.max_tokens, system_prompt)
+    return TextGenerationResponse(text=response.text, model=response.model, usage=response.usage, cached=response.cached)
+
+
+class JobWorkerPool:
+    """In-process workers that claim and run jobs from a queue backend."""
+
+    def __init__(
+        self,
+        backend: JobQueueBackend,
+        workers: int = settings.JOBS_WORKERS,
+        poll_interval: float = settings.JOBS_POLL_INTERVAL_SECONDS,
+        timeout: float = settings.JOBS_TIMEOUT_SECONDS,
+        retry_base: float = settings.JOBS_RETRY_BASE_SECONDS,
+        retry_max: float = settings.JOBS_RETRY_MAX_SECONDS,
+        max_outstanding_per_user: int = settings.JOBS_MAX_OUTSTANDING_PER_USER,
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            backend: Queue the jobs are claimed from
+            workers: Jobs run concurrently by this process
+            poll_interval: Seconds to wait for work before checking again
+            timeout: Maximum seconds per attempt
+            retry_base: Backoff before the first retry, doubled for each further attempt
+            retry_max: Upper bound on the backoff
+            max_outstanding_per_user: Queued or running jobs a user may have at once
+        """
+        self.backend = backend
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_outstanding_per_user = max_outstanding_per_user
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._background_tasks: Set[asyncio.Task] = set()
+
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+
+    async def submit(self, user_id: str, request: JobCreateRequest) -> Job:
+        """Queue a generation and return the job, raising TooManyJobsError if the user is at the cap."""
+        if await self.backend.count_outstanding(str(user_id)) >= self.max_outstanding_per_user:
+            raise TooManyJobsError(f"At most {self.max_outstanding_per_user} jobs may be queued or running at once")
+        now = _now()
+        job = Job(
+            id=str(uuid.uuid4()),
+            user_id=str(user_id),
+            priority=request.priority,
+            request=TextGenerationRequest(**request.model_dump(include=set(TextGenerationRequest.model_fields))),
+            callback_url=request.callback_url,
+            max_attempts=request.max_attempts,
+            created_at=now,
+            available_at=now,
+        )
+        await self.backend.enqueue(job)
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job, stopping it if it is running in this process."""
+        job = await self.backend.cancel(job_id)
+        task = self._running.get(job_id)
+        if task is not None and job is not None and job.status == "cancelled":
+            task.cancel()
+        return job
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self):
+        while True:
+            try:
+                job = await self.backend.claim(self.poll_interval)
+            except Exception as e:
+                logger.error(f"Failed to claim job: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if job is None:
+                continue
+
+            task = asyncio.create_task(self._attempt(job))
+            self._running[job.id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    # The worker itself is shutting down
+                    task.cancel()
+                    raise
+            finally:
+                self._running.pop(job.id, None)
+
+    def _backoff(self, attempts: int) -> float:
+        """Full-jitter exponential backoff before the next attempt."""
+        return random.uniform(0, min(self.retry_max, self.retry_base * 2 ** (attempts - 1)))
+
+    async def _attempt(self, job: Job):
+        try:
+            job.result = await asyncio.wait_for(run_generation(job.request), timeout=self.timeout)
+            job.status = "succeeded"
+            job.error = None
+            self.succeeded += 1
+            if settings.USAGE_ACCOUNTING_ENABLED:
+                get_usage_accountant().record(job.user_id, served_provider(job.result.model, job.request.provider), job.result.model, job.result.usage, cached=job.result.cached)
+        except NonRetryableJobError as e:
+            job.status = "failed"
+            job.error = str(e)
+            self.failed += 1
+        except Exception as e:
+            job.error = f"Attempt {job.attempts} failed: {str(e) or type(e).__name__}"
+            if job.attempts < job.max_attempts:
+                delay = self._backoff(job.attempts)
+                if isinstance(e, CircuitOpenError):
+                    # Don't spend an attempt before the provider's circuit can close again
+                    delay = max(delay, e.retry_after)
+                logger.warning(f"Job {job.id} {job.error}; retrying in {delay:.1f}s")
+                job.status = "queued"
+                job.available_at = _now() + timedelta(seconds=delay)
+                self.retries += 1
+            else:
+                job.status = "failed"
+                self.failed += 1
+
+        if job.status in FINISHED_STATUSES:
+            job.finished_at = _now()
+        if await self.backend.update(job) and job.status in FINISHED_STATUSES and job.callback_url:
+            task = asyncio.create_task(self._notify(job))
+            # Keep a reference so the task isn't garbage collected mid-flight
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    async def _notify(self, job: Job):
+        """POST the finished job to its callback URL, signed when JOBS_WEBHOOK_SECRET is set."""
+        body = job.model_dump_json().encode()
+        headers = {"Content-Type": "application/json"}
+        if settings.JOBS_WEBHOOK_SECRET:
+            signature = hmac.new(settings.JOBS_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+            headers["X-Signature-SHA256"] = signature
+
+        try:
+            # Checked again at delivery in case the host now resolves somewhere else
+            await check_callback_url(job.callback_url)
+        except CallbackURLError as e:
+            logger.warning(f"Not calling back for job {job.id}: {str(e)}")
+            return
+
+        client = http_clients.get("webhooks")
+        for attempt in range(1, WEBHOOK_ATTEMPTS + 1):
+            try:
+                response = await client.post(job.callback_url, content=body, headers=headers, timeout=settings.JOBS_WEBHOOK_TIMEOUT_SECONDS)
+                if response.status_code < 500:
+                    return
+                error = f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = str(e)
+            logger.warning(f"Callback for job {job.id} failed (attempt {attempt}): {error}")
+            if attempt < WEBHOOK_ATTEMPTS:
+                await asyncio.sleep(self._backoff(attempt + 1))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "workers": self.workers,
+            "running": len(self._running),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
+
+
+@lru_cache()
+def get_job_pool() -> JobWorkerPool:
+    """Return the process-wide job worker pool."""
+    backend = SupabaseJobQueue() if settings.JOBS_BACKEND == "supabase" else MemoryJobQueue()
+    return JobWorkerPool(backend)
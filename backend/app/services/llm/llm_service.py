@@ -1,4 +1,8 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import AsyncIterator, Optional, Tuple
+import hashlib
+import json
 import openai
 import anthropic
 import google.generativeai as genai
@@ -6,6 +10,7 @@ from pydantic import BaseModel
 from functools import lru_cache
 
 from app.core.config import settings
+from app.core.http_clients import http_clients
 from app.models.llm import LLMUsage
 from app.config.models import DEFAULT_MODELS, MODELS, get_model_for_task
 
@@ -16,6 +21,15 @@ class LLMResponse(BaseModel):
     text: str
     model: str
     usage: LLMUsage
+    cached: bool = False
+
+
+class LLMStreamChunk(BaseModel):
+    """A piece of a streamed LLM response; the last chunk carries the usage."""
+
+    text: str = ""
+    model: str
+    usage: Optional[LLMUsage] = None
 
 
 class LLMService(ABC):
@@ -26,27 +40,36 @@ class LLMService(ABC):
         """Generate text using the LLM."""
         pass
 
+    @abstractmethod
+    def stream_text(self, prompt: str, model: str, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> AsyncIterator[LLMStreamChunk]:
+        """
+        Stream generated text as it is produced.
+
+        Yields text chunks followed by a final chunk with the usage. Closing the
+        iterator (e.g. when the client disconnects) stops generation upstream.
+        """
+        pass
+
 
 class OpenAIService(LLMService):
     """OpenAI implementation of the LLM service."""
 
     def __init__(self, api_key: str):
         """Initialize the OpenAI client."""
-        self.client = openai.AsyncOpenAI(api_key=api_key)
+        self.client = openai.AsyncOpenAI(api_key=api_key, http_client=http_clients.get("openai"))
 
-    async def generate_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
-        """Generate text using OpenAI."""
-        # Use default model if none specified
-        if model is None:
-            model = DEFAULT_MODELS["openai"]
-            
+    def _build_request_params(self, prompt: str, model: str, max_tokens: int, temperature: float, **kwargs) -> dict:
+        """Build chat completion parameters for a model."""
         # Extract special parameters for o3 models
         reasoning_effort = kwargs.pop('reasoning_effort', None)
         
-        # Build messages
-        messages = [{"role": "user", "content": prompt}]
-        if 'system_prompt' in kwargs:
-            messages.insert(0, {"role": "system", "content": kwargs.pop('system_prompt')})
+        # Build messages; system prompt and earlier turns come first so they form a stable, cacheable prefix
+        history = kwargs.pop('history', None) or []
+        messages = [{"role": turn["role"], "content": turn["content"]} for turn in history]
+        messages.append({"role": "user", "content": prompt})
+        system_prompt = kwargs.pop('system_prompt', None)
+        if system_prompt:
+            messages.insert(0, {"role": "system", "content": system_prompt})
         
         # Build request parameters
         request_params = {
@@ -54,6 +77,13 @@ class OpenAIService(LLMService):
             "messages": messages,
             **kwargs
         }
+
+        # OpenAI caches long prefixes automatically; a key derived from the system
+        # prompt routes requests sharing it to the same cache
+        if system_prompt and settings.LLM_PROMPT_CACHING_ENABLED:
+            extra_body = dict(request_params.get("extra_body") or {})
+            extra_body.setdefault("prompt_cache_key", hashlib.sha256(system_prompt.encode()).hexdigest()[:32])
+            request_params["extra_body"] = extra_body
         
         # Use max_completion_tokens for newer models, max_tokens for older ones
         if model.startswith(("gpt-4o", "o1", "o3", "o4")):
@@ -70,33 +100,76 @@ class OpenAIService(LLMService):
         # Add reasoning_effort for o3 models
         if model.startswith("o3") and reasoning_effort:
             request_params["reasoning_effort"] = reasoning_effort
-        
-        response = await self.client.chat.completions.create(**request_params)
 
-        usage = LLMUsage(
-            prompt_tokens=response.usage.prompt_tokens, completion_tokens=response.usage.completion_tokens, total_tokens=response.usage.total_tokens
+        return request_params
+
+    @staticmethod
+    def _usage(usage) -> LLMUsage:
+        """Convert OpenAI usage, including tokens served from the prompt cache."""
+        details = getattr(usage, "prompt_tokens_details", None)
+        return LLMUsage(
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            total_tokens=usage.total_tokens,
+            cached_prompt_tokens=getattr(details, "cached_tokens", None),
         )
 
+    async def generate_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
+        """Generate text using OpenAI."""
+        # Use default model if none specified
+        if model is None:
+            model = DEFAULT_MODELS["openai"]
+
+        request_params = self._build_request_params(prompt, model, max_tokens, temperature, **kwargs)
+
+        response = await self.client.chat.completions.create(**request_params)
+
+        usage = self._usage(response.usage)
+
         return LLMResponse(text=response.choices[0].message.content, model=model, usage=usage)
 
+    async def stream_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> AsyncIterator[LLMStreamChunk]:
+        """Stream text using OpenAI."""
+        if model is None:
+            model = DEFAULT_MODELS["openai"]
+
+        request_params = self._build_request_params(prompt, model, max_tokens, temperature, **kwargs)
+        request_params["stream"] = True
+        # Ask for a final chunk with token usage
+        request_params["stream_options"] = {"include_usage": True}
+
+        stream = await self.client.chat.completions.create(**request_params)
+        usage = None
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = self._usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield LLMStreamChunk(text=chunk.choices[0].delta.content, model=model)
+        finally:
+            # Closes the HTTP response so OpenAI stops generating if we stop reading
+            await stream.close()
+
+        yield LLMStreamChunk(model=model, usage=usage or LLMUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0))
+
 
 class AnthropicService(LLMService):
     """Anthropic (Claude) implementation of the LLM service."""
 
     def __init__(self, api_key: str):
         """Initialize the Anthropic client."""
-        self.client = anthropic.AsyncAnthropic(api_key=api_key)
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, http_client=http_clients.get("anthropic"))
 
-    async def generate_text(
-        self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs
-    ) -> LLMResponse:
-        """Generate text using Anthropic Claude."""
-        # Use default model if none specified
-        if model is None:
-            model = DEFAULT_MODELS["anthropic"]
-            
-        # Build messages
-        messages = [{"role": "user", "content": prompt}]
+    def _build_request_params(self, prompt: str, model: str, max_tokens: int, temperature: float, **kwargs) -> dict:
+        """Build Messages API parameters for a model."""
+        # Build messages, with earlier conversation turns first
+        history = kwargs.pop('history', None) or []
+        messages = [{"role": turn["role"], "content": turn["content"]} for turn in history]
+        if messages and settings.LLM_PROMPT_CACHING_ENABLED:
+            # Cache the conversation so far; the next turn reads it back from cache
+            last = messages[-1]
+            last["content"] = [{"type": "text", "text": last["content"], "cache_control": {"type": "ephemeral"}}]
+        messages.append({"role": "user", "content": prompt})
         
         # Extract system prompt if provided
         system_prompt = kwargs.pop('system_prompt', None)
@@ -110,28 +183,128 @@ class AnthropicService(LLMService):
             **kwargs
         }
         
-        # Add system prompt if provided
+        # Add system prompt if provided, marked as a prompt cache breakpoint so
+        # repeated calls read it from cache instead of paying for it again
         if system_prompt:
-            request_params["system"] = system_prompt
-        
-        response = await self.client.messages.create(**request_params)
+            if settings.LLM_PROMPT_CACHING_ENABLED:
+                request_params["system"] = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+            else:
+                request_params["system"] = system_prompt
 
-        usage = LLMUsage(
-            prompt_tokens=response.usage.input_tokens,
-            completion_tokens=response.usage.output_tokens,
-            total_tokens=response.usage.input_tokens + response.usage.output_tokens,
+        return request_params
+
+    @staticmethod
+    def _usage(usage) -> LLMUsage:
+        """Convert Anthropic usage; input_tokens excludes tokens read from or written to the cache."""
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        prompt_tokens = usage.input_tokens + cache_read + cache_write
+        return LLMUsage(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=usage.output_tokens,
+            total_tokens=prompt_tokens + usage.output_tokens,
+            cached_prompt_tokens=cache_read,
+            cache_write_tokens=cache_write,
         )
 
+    async def generate_text(
+        self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs
+    ) -> LLMResponse:
+        """Generate text using Anthropic Claude."""
+        # Use default model if none specified
+        if model is None:
+            model = DEFAULT_MODELS["anthropic"]
+
+        request_params = self._build_request_params(prompt, model, max_tokens, temperature, **kwargs)
+
+        response = await self.client.messages.create(**request_params)
+
+        usage = self._usage(response.usage)
+
         return LLMResponse(text=response.content[0].text, model=model, usage=usage)
 
+    async def stream_text(
+        self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs
+    ) -> AsyncIterator[LLMStreamChunk]:
+        """Stream text using Anthropic Claude."""
+        if model is None:
+            model = DEFAULT_MODELS["anthropic"]
+
+        request_params = self._build_request_params(prompt, model, max_tokens, temperature, **kwargs)
+
+        # Leaving the context manager closes the HTTP response, which stops generation upstream
+        async with self.client.messages.stream(**request_params) as stream:
+            async for text in stream.text_stream:
+                yield LLMStreamChunk(text=text, model=model)
+            message = await stream.get_final_message()
+
+        yield LLMStreamChunk(model=model, usage=self._usage(message.usage))
+
 
 class GeminiService(LLMService):
     """Google Gemini implementation of the LLM service."""
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, max_cached_models: int = settings.GEMINI_MODEL_CACHE_SIZE):
         """Initialize the Gemini client."""
         genai.configure(api_key=api_key)
-        self.client = genai.GenerativeModel("gemini-pro")
+        self.max_cached_models = max_cached_models
+        # (model name, generation settings) -> GenerativeModel, least recently used first
+        self._models: "OrderedDict[Tuple[str, str], genai.GenerativeModel]" = OrderedDict()
+
+    def _get_model(self, model: str, generation_params: dict) -> genai.GenerativeModel:
+        """Return a cached model client for a model name and generation settings."""
+        key = (model, json.dumps(generation_params, sort_keys=True, default=str))
+        client = self._models.get(key)
+        if client is not None:
+            self._models.move_to_end(key)
+            return client
+
+        client = genai.GenerativeModel(model, generation_config=genai.types.GenerationConfig(**generation_params))
+        self._models[key] = client
+        if len(self._models) > self.max_cached_models:
+            self._models.popitem(last=False)
+        return client
+
+    def _build_request(self, prompt: str, max_tokens: int, temperature: float, **kwargs):
+        """Build the full prompt and generation parameters."""
+        # Extract system prompt and earlier conversation turns if provided
+        system_prompt = kwargs.pop('system_prompt', None)
+        history = kwargs.pop('history', None) or []
+        
+        # Build the full prompt with system context and transcript if provided
+        full_prompt = prompt
+        if system_prompt or history:
+            transcript = [f"System: {system_prompt}"] if system_prompt else []
+            transcript += [f"{'User' if turn['role'] == 'user' else 'Assistant'}: {turn['content']}" for turn in history]
+            transcript.append(f"User: {prompt}")
+            full_prompt = "\n\n".join(transcript)
+        
+        # Configure generation parameters
+        generation_params = {
+            "max_output_tokens": max_tokens,
+            "temperature": temperature,
+            **kwargs
+        }
+
+        return full_prompt, generation_params
+
+    @staticmethod
+    async def _usage(client: genai.GenerativeModel, full_prompt: str, response, text: str) -> LLMUsage:
+        """Token usage reported by Gemini, counted with the model's tokenizer if missing."""
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is not None and metadata.prompt_token_count:
+            completion_tokens = metadata.candidates_token_count or 0
+            return LLMUsage(
+                prompt_tokens=metadata.prompt_token_count,
+                completion_tokens=completion_tokens,
+                total_tokens=metadata.total_token_count or metadata.prompt_token_count + completion_tokens,
+                # Gemini 2.5 caches repeated prefixes implicitly
+                cached_prompt_tokens=getattr(metadata, "cached_content_token_count", None) or None,
+            )
+
+        prompt_tokens = (await client.count_tokens_async(full_prompt)).total_tokens
+        completion_tokens = (await client.count_tokens_async(text)).total_tokens if text else 0
+        return LLMUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
 
     async def generate_text(
         self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs
@@ -140,44 +313,42 @@ class GeminiService(LLMService):
         # Use default model if none specified
         if model is None:
             model = DEFAULT_MODELS["gemini"]
-            
-        # Extract system prompt if provided
-        system_prompt = kwargs.pop('system_prompt', None)
-        
-        # Build the full prompt with system context if provided
-        full_prompt = prompt
-        if system_prompt:
-            full_prompt = f"System: {system_prompt}\n\nUser: {prompt}"
-        
-        # Configure generation parameters
-        generation_config = genai.types.GenerationConfig(
-            max_output_tokens=max_tokens,
-            temperature=temperature,
-            **kwargs
-        )
-        
-        # Create the model with the specified name
-        client = genai.GenerativeModel(model)
-        
+
+        full_prompt, generation_params = self._build_request(prompt, max_tokens, temperature, **kwargs)
+
+        # Reuse the model client for these settings
+        client = self._get_model(model, generation_params)
+
         # Generate response
-        response = await client.generate_content_async(
-            full_prompt,
-            generation_config=generation_config
-        )
-        
-        # Gemini doesn't provide detailed token usage in the same way
-        # For now, we'll estimate based on text length
-        estimated_prompt_tokens = len(prompt.split()) * 1.3  # Rough approximation
-        estimated_completion_tokens = len(response.text.split()) * 1.3
-        
-        usage = LLMUsage(
-            prompt_tokens=int(estimated_prompt_tokens),
-            completion_tokens=int(estimated_completion_tokens),
-            total_tokens=int(estimated_prompt_tokens + estimated_completion_tokens),
-        )
+        response = await client.generate_content_async(full_prompt)
+
+        usage = await self._usage(client, full_prompt, response, response.text)
 
         return LLMResponse(text=response.text, model=model, usage=usage)
 
+    async def stream_text(
+        self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs
+    ) -> AsyncIterator[LLMStreamChunk]:
+        """Stream text using Google Gemini."""
+        if model is None:
+            model = DEFAULT_MODELS["gemini"]
+
+        full_prompt, generation_params = self._build_request(prompt, max_tokens, temperature, **kwargs)
+
+        client = self._get_model(model, generation_params)
+        response = await client.generate_content_async(full_prompt, stream=True)
+
+        # Abandoning this loop drops the streaming response and its connection
+        parts = []
+        async for chunk in response:
+            # chunk.text raises on chunks without parts (e.g. the final finish_reason chunk)
+            if chunk.parts and chunk.text:
+                parts.append(chunk.text)
+                yield LLMStreamChunk(text=chunk.text, model=model)
+
+        # usage_metadata is filled in once the stream has been fully consumed
+        yield LLMStreamChunk(model=model, usage=await self._usage(client, full_prompt, response, "".join(parts)))
+
 
 class LLMServiceFactory:
     """Factory for creating LLM service instances."""
@@ -204,4 +375,34 @@ class LLMServiceFactory:
 @lru_cache()
 def get_llm_service(provider: str = "openai") -> LLMService:
     """Dependency to get an LLM service."""
-    return LLMServiceFactory.get_service(provider)
\ No newline at end of file
+    service = LLMServiceFactory.get_service(provider)
+
+    # Fail fast while the provider is down; innermost so every caller shares the provider's breaker
+    if settings.CIRCUIT_BREAKER_ENABLED:
+        from app.services.llm.circuit_breaker import CircuitBreakerLLMService, circuit_breakers
+
+        service = CircuitBreakerLLMService(service, provider=provider, default_model=DEFAULT_MODELS[provider], registry=circuit_breakers)
+
+    # Record live latency/error stats of every upstream call for the model router
+    from app.services.llm.model_stats import InstrumentedLLMService, model_stats
+
+    service = InstrumentedLLMService(service, default_model=DEFAULT_MODELS[provider], registry=model_stats)
+
+    # Pace upstream calls to stay within the provider's rate limits
+    if settings.LLM_RATE_LIMIT_ENABLED:
+        from app.services.llm.rate_scheduler import RateLimitedLLMService, rate_scheduler
+
+        service = RateLimitedLLMService(service, provider=provider, scheduler=rate_scheduler)
+
+    if settings.LLM_SINGLE_FLIGHT_ENABLED:
+        from app.services.llm.single_flight import SingleFlightLLMService, generation_flight
+
+        service = SingleFlightLLMService(service, provider=provider, flight=generation_flight)
+
+    # The cache wraps single-flight so hits never wait on an in-flight call
+    if settings.LLM_CACHE_ENABLED:
+        from app.services.llm.response_cache import CachedLLMService, get_response_cache
+
+        service = CachedLLMService(service, provider=provider, cache=get_response_cache())
+
+    return service
\ No newline at end of file
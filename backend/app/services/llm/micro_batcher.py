@@ -0,0 +1,165 @@
+"""
+Micro-batching of concurrent single-text embedding requests.
+
+Requests for the same provider and model wait briefly in a queue; the queue is
+sent as one batched provider call when it reaches the maximum batch size or its
+oldest request has waited the maximum delay, and each waiter gets its own
+result back. Batch sizes and queue delays are recorded as histograms.
+"""
+
+import asyncio
+import bisect
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.llm.circuit_breaker import is_provider_failure
+from app.services.llm.embedding_service import EmbeddingResponse, EmbeddingService
+
+BATCH_SIZE_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+QUEUE_DELAY_BOUNDS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Counts of observations per upper bound, plus an overflow bucket."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"le_{bound:g}" for bound in self.bounds] + ["le_inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+        }
+
+
+# A queued request: text, the waiter's future, and when it was queued
+_Pending = Tuple[str, asyncio.Future, float]
+
+
+class EmbeddingMicroBatcher:
+    """Collects single embedding requests per (provider, model) and sends them as batches."""
+
+    def __init__(self, max_batch_size: int = settings.EMBEDDING_MICROBATCH_MAX_SIZE, max_wait_ms: float = settings.EMBEDDING_MICROBATCH_MAX_WAIT_MS):
+        """
+        Initialize the batcher.
+
+        Args:
+            max_batch_size: Queue length that triggers an immediate batch
+            max_wait_ms: Longest a request waits for others to join its batch
+        """
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queues: Dict[Tuple[str, str], List[_Pending]] = {}
+        self._services: Dict[Tuple[str, str], EmbeddingService] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        self._tasks = set()
+
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = Histogram(BATCH_SIZE_BOUNDS)
+        self.queue_delays_ms = Histogram(QUEUE_DELAY_BOUNDS_MS)
+
+    async def submit(self, service: EmbeddingService, provider: str, text: str, model: str) -> EmbeddingResponse:
+        """Queue one text and wait for its embedding from the next batch."""
+        loop = asyncio.get_running_loop()
+        key = (provider, model)
+        future = loop.create_future()
+        queue = self._queues.setdefault(key, [])
+        queue.append((text, future, time.perf_counter()))
+        self._services[key] = service
+
+        if len(queue) >= self.max_batch_size:
+            self._flush(key)
+        elif len(queue) == 1:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+        # Shield so a cancelled waiter doesn't cancel the batch call for the others
+        return await asyncio.shield(future)
+
+    def _flush(self, key: Tuple[str, str]):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._queues.pop(key, None)
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(self._services[key], key[1], batch))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, service: EmbeddingService, model: str, batch: List[_Pending]):
+        dispatched = time.perf_counter()
+        self.batches += 1
+        self.items += len(batch)
+        self.batch_sizes.observe(len(batch))
+        for _, _, queued_at in batch:
+            self.queue_delays_ms.observe((dispatched - queued_at) * 1000)
+
+        try:
+            if len(batch) == 1:
+                responses = [await service.create_embedding(text=batch[0][0], model=model)]
+            else:
+                responses = await service.create_embeddings(texts=[text for text, _, _ in batch], model=model)
+        except Exception as e:
+            if len(batch) > 1 and not is_provider_failure(e):
+                # One invalid input (e.g. too long) rejects the whole request; don't fail the others with it
+                responses = await asyncio.gather(*(service.create_embedding(text=text, model=model) for text, _, _ in batch), return_exceptions=True)
+            else:
+                responses = [e] * len(batch)
+
+        for (_, future, _), response in zip(batch, responses):
+            if future.done():
+                continue
+            if isinstance(response, BaseException):
+                future.set_exception(response)
+            else:
+                future.set_result(response)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "batches": self.batches,
+            "items": self.items,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_delay_ms": self.queue_delays_ms.snapshot(),
+        }
+
+
+class MicroBatchingEmbeddingService(EmbeddingService):
+    """Wraps an embedding service so concurrent single-text requests are sent together."""
+
+    def __init__(self, service: EmbeddingService, provider: str, batcher: EmbeddingMicroBatcher):
+        self.service = service
+        self.provider = provider
+        self.max_batch_items = service.max_batch_items
+        self.max_batch_tokens = service.max_batch_tokens
+        self.batcher = batcher
+
+    async def create_embedding(self, text: str, model: str = "text-embedding-ada-002") -> EmbeddingResponse:
+        """Create an embedding as part of the next batch for this model."""
+        return await self.batcher.submit(self.service, self.provider, text, model)
+
+    async def create_embeddings(self, texts: List[str], model: str = "text-embedding-ada-002") -> List[EmbeddingResponse]:
+        """Requests that are already batches go straight to the provider."""
+        return await self.service.create_embeddings(texts=texts, model=model)
+
+    async def embed_batch(self, texts: List[str], model: str) -> List[EmbeddingResponse]:
+        return await self.service.embed_batch(texts, model)
+
+
+# Shared by all providers; queues are per provider and model
+embedding_batcher = EmbeddingMicroBatcher()
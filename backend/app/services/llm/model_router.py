@@ -0,0 +1,129 @@
+"""
+Latency-aware model selection.
+
+Picks a model within the requested budget tier that meets the task's latency
+SLO, using the live EWMA stats in model_stats instead of the static
+speed_rating. speed_rating serves as a prior for models that haven't been
+called yet; stats of models that haven't been called for a while fade back
+toward it, so a model avoided after a few bad calls gets another chance.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config.models import MODELS, TASK_RECOMMENDATIONS, ModelConfig, ModelTier
+from app.core.config import settings
+from app.services.llm.llm_service import get_llm_service
+from app.services.llm.model_stats import ModelStatsRegistry, model_stats
+
+BUDGET_TIERS = {
+    "budget": ModelTier.BUDGET,
+    "balanced": ModelTier.NEXT_TIER,
+    "premium": ModelTier.PREMIUM,
+}
+
+# Assumed latency (seconds) for a model with no observations yet, by speed_rating
+PRIOR_LATENCY_SECONDS = {5: 1.0, 4: 2.0, 3: 4.0, 2: 8.0, 1: 15.0}
+
+
+class ModelRouter:
+    """Chooses the model for a task and budget level from observed latency."""
+
+    def __init__(self, registry: ModelStatsRegistry = model_stats, is_configured: Optional[Callable[[str], bool]] = None):
+        """
+        Initialize the router.
+
+        Args:
+            registry: Live per-model stats
+            is_configured: Returns whether a provider can be used (defaults to checking get_llm_service)
+        """
+        self.registry = registry
+        self.is_configured = is_configured or _provider_configured
+        self.last_decisions: Dict[str, Dict[str, Any]] = {}
+
+    def expected_latency(self, model: ModelConfig, streaming: bool = False) -> Tuple[float, bool]:
+        """Expected latency (TTFT when streaming) and whether it was observed or assumed."""
+        prior = PRIOR_LATENCY_SECONDS.get(model.speed_rating, 5.0)
+        stats = self.registry.get(model.name)
+        observed = stats.ttft if streaming and stats is not None and stats.ttft is not None else (stats.latency if stats else None)
+        if observed is not None:
+            freshness = stats.freshness()
+            return freshness * observed + (1 - freshness) * prior, True
+        return prior, False
+
+    def latency_slo(self, task: Optional[str]) -> float:
+        return settings.LLM_TASK_LATENCY_SLO_SECONDS.get(task or "", settings.LLM_LATENCY_SLO_SECONDS)
+
+    def select_model(self, task: Optional[str] = None, budget_level: str = "budget", streaming: bool = False) -> Tuple[str, Dict[str, Any]]:
+        """
+        Pick a model for a task within a budget tier.
+
+        Among available models in the tier that meet the latency SLO and error-rate
+        limit, the task's recommended model wins; otherwise the most accurate, then
+        cheapest. If none meet the SLO, the fastest healthy model is used.
+
+        Returns:
+            (model name, decision details explaining the choice)
+        """
+        if budget_level not in BUDGET_TIERS:
+            raise ValueError(f"Unknown budget level: {budget_level}")
+
+        slo = self.latency_slo(task)
+        recommended = TASK_RECOMMENDATIONS.get(task or "", {}).get(budget_level)
+        candidates: List[Dict[str, Any]] = []
+        for model in MODELS.values():
+            if model.tier != BUDGET_TIERS[budget_level] or not model.available or not self.is_configured(model.provider):
+                continue
+            latency, observed = self.expected_latency(model, streaming)
+            stats = self.registry.get(model.name)
+            error_rate = stats.current_error_rate() if stats else 0.0
+            candidates.append(
+                {
+                    "model": model.name,
+                    "expected_latency_seconds": round(latency, 3),
+                    "observed": observed,
+                    "error_rate": round(error_rate, 4),
+                    "meets_slo": latency <= slo and error_rate <= settings.LLM_MAX_ERROR_RATE,
+                    "accuracy_rating": model.accuracy_rating,
+                    "price": model.input_price_per_million + model.output_price_per_million,
+                }
+            )
+
+        if not candidates:
+            raise ValueError(f"No configured models in the {budget_level} tier")
+
+        eligible = [c for c in candidates if c["meets_slo"]]
+        if eligible:
+            choice = next((c for c in eligible if c["model"] == recommended), None)
+            if choice is not None:
+                reason = "task recommendation meets the latency SLO"
+            else:
+                choice = sorted(eligible, key=lambda c: (-c["accuracy_rating"], c["price"]))[0]
+                reason = "most accurate model meeting the latency SLO"
+        else:
+            healthy = [c for c in candidates if c["error_rate"] <= settings.LLM_MAX_ERROR_RATE] or candidates
+            choice = min(healthy, key=lambda c: c["expected_latency_seconds"])
+            reason = "no model meets the latency SLO; fastest healthy model"
+
+        decision = {
+            "task": task,
+            "budget_level": budget_level,
+            "latency_slo_seconds": slo,
+            "metric": "ttft" if streaming else "latency",
+            "recommended": recommended,
+            "chosen": choice["model"],
+            "reason": reason,
+            "candidates": candidates,
+        }
+        self.last_decisions[f"{task or 'default'}:{budget_level}"] = decision
+        return choice["model"], decision
+
+
+def _provider_configured(provider: str) -> bool:
+    try:
+        get_llm_service(provider)
+        return True
+    except ValueError:
+        return False
+
+
+model_router = ModelRouter()
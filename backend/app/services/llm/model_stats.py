@@ -0,0 +1,147 @@
+"""
+Live per-model latency, time-to-first-token and error-rate statistics.
+
+Every upstream call made through get_llm_service is recorded here as an
+exponentially weighted moving average, so recent behaviour dominates. The
+averages also fade with time since the last call (freshness), so a model
+that was avoided after a bad patch is eventually tried again.
+"""
+
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.services.llm.llm_service import LLMResponse, LLMService, LLMStreamChunk
+
+
+class ModelStats:
+    """EWMA of latency, time-to-first-token and error rate for one model."""
+
+    def __init__(self, alpha: float, half_life: float = settings.LLM_STATS_HALF_LIFE_SECONDS):
+        self.alpha = alpha
+        self.half_life = half_life
+        self.latency: Optional[float] = None
+        self.ttft: Optional[float] = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.last_updated: Optional[float] = None
+
+    def freshness(self, now: Optional[float] = None) -> float:
+        """Weight of the averages against the prior: 1 right after a call, halving every half_life seconds."""
+        if self.last_updated is None:
+            return 0.0
+        if self.half_life <= 0:
+            return 1.0
+        age = max(0.0, (now or time.time()) - self.last_updated)
+        return 0.5 ** (age / self.half_life)
+
+    def current_error_rate(self, now: Optional[float] = None) -> float:
+        """Error rate faded toward zero by the time since the last call."""
+        return self.error_rate * self.freshness(now)
+
+    def _ewma(self, previous: Optional[float], sample: float, freshness: float) -> float:
+        if previous is None:
+            return sample
+        # A stale average counts for less against the new sample
+        weight = (1 - self.alpha) * freshness
+        return (self.alpha * sample + weight * previous) / (self.alpha + weight)
+
+    def record_success(self, latency: float, ttft: Optional[float] = None):
+        freshness = self.freshness()
+        self.calls += 1
+        self.latency = self._ewma(self.latency, latency, freshness)
+        if ttft is not None:
+            self.ttft = self._ewma(self.ttft, ttft, freshness)
+        self.error_rate = self._ewma(self.error_rate * freshness, 0.0, 1.0)
+        self.last_updated = time.time()
+
+    def record_error(self):
+        freshness = self.freshness()
+        self.calls += 1
+        self.errors += 1
+        self.error_rate = self._ewma(self.error_rate * freshness, 1.0, 1.0)
+        self.last_updated = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latency_seconds": round(self.latency, 3) if self.latency is not None else None,
+            "ttft_seconds": round(self.ttft, 3) if self.ttft is not None else None,
+            "error_rate": round(self.current_error_rate(), 4),
+            "freshness": round(self.freshness(), 4),
+            "calls": self.calls,
+            "errors": self.errors,
+            "last_updated": self.last_updated,
+        }
+
+
+class ModelStatsRegistry:
+    """Holds live stats for every model that has been called."""
+
+    def __init__(self, alpha: float = settings.LLM_STATS_EWMA_ALPHA, half_life: float = settings.LLM_STATS_HALF_LIFE_SECONDS):
+        self.alpha = alpha
+        self.half_life = half_life
+        self._stats: Dict[str, ModelStats] = {}
+
+    def get(self, model: str) -> Optional[ModelStats]:
+        return self._stats.get(model)
+
+    def _for(self, model: str) -> ModelStats:
+        if model not in self._stats:
+            self._stats[model] = ModelStats(self.alpha, self.half_life)
+        return self._stats[model]
+
+    def record_success(self, model: str, latency: float, ttft: Optional[float] = None):
+        self._for(model).record_success(latency, ttft)
+
+    def record_error(self, model: str):
+        self._for(model).record_error()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {model: stats.to_dict() for model, stats in self._stats.items()}
+
+
+class InstrumentedLLMService(LLMService):
+    """Wraps an LLM service and records the latency and errors of each upstream call."""
+
+    def __init__(self, service: LLMService, default_model: str, registry: ModelStatsRegistry):
+        self.service = service
+        self.default_model = default_model
+        self.registry = registry
+
+    async def generate_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
+        """Generate text, recording latency or error for the model."""
+        started = time.perf_counter()
+        try:
+            response = await self.service.generate_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+        except Exception:
+            self.registry.record_error(model or self.default_model)
+            raise
+
+        self.registry.record_success(model or self.default_model, time.perf_counter() - started)
+        return response
+
+    async def stream_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> AsyncIterator[LLMStreamChunk]:
+        """Stream text, recording time-to-first-token, total latency or error for the model."""
+        started = time.perf_counter()
+        ttft = None
+        completed = False
+        stream = self.service.stream_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+        try:
+            async for chunk in stream:
+                if ttft is None and chunk.text:
+                    ttft = time.perf_counter() - started
+                yield chunk
+            completed = True
+        except Exception:
+            self.registry.record_error(model or self.default_model)
+            raise
+        finally:
+            await stream.aclose()
+            # Streams abandoned by the client say nothing about the provider
+            if completed:
+                self.registry.record_success(model or self.default_model, time.perf_counter() - started, ttft)
+
+
+# Shared by all providers; keyed by model name
+model_stats = ModelStatsRegistry()
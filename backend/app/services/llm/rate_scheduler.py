@@ -0,0 +1,179 @@
+"""
+Client-side request scheduler that respects provider rate limits.
+
+Each (provider, model) pair gets a requests-per-minute and a tokens-per-minute
+token bucket, configured by the rate limits in app/config/models.py. Requests
+estimate their token cost before sending, wait in FIFO order while a bucket is
+empty, and are trued up to the actual LLMUsage afterwards.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from app.config.models import DEFAULT_MODELS, RateLimit, get_rate_limit
+from app.models.llm import LLMUsage
+from app.services.llm.llm_service import LLMResponse, LLMService, LLMStreamChunk
+from app.services.llm.tokenizer import count_tokens
+
+
+def estimate_tokens(prompt: str, max_tokens: int, provider: str, model: str, system_prompt: Optional[str] = None) -> int:
+    """Worst-case token cost of a request: prompt tokens plus the full completion budget."""
+    system_tokens = count_tokens(system_prompt, provider, model) if system_prompt else 0
+    return count_tokens(prompt, provider, model) + system_tokens + max_tokens
+
+
+class TokenBucket:
+    """A bucket refilled continuously up to its capacity."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken (0 if it can be taken now)."""
+        self._refill()
+        # Never ask for more than the bucket can ever hold
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.refill_per_second
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        """Adjust the level by a correction; negative amounts put the bucket into debt."""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class ModelRateLimiter:
+    """RPM and TPM buckets for one (provider, model) pair."""
+
+    def __init__(self, limit: RateLimit):
+        self.limit = limit
+        self.requests = TokenBucket(limit.requests_per_minute, limit.requests_per_minute / 60)
+        self.tokens = TokenBucket(limit.tokens_per_minute, limit.tokens_per_minute / 60)
+        # asyncio.Lock wakes waiters in FIFO order, so queued requests are served fairly
+        self._lock = asyncio.Lock()
+        self.waiting = 0
+        self.admitted = 0
+        self.total_wait_seconds = 0.0
+
+    async def acquire(self, estimated_tokens: int):
+        """Wait until both buckets can cover the request, then take from them."""
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+        finally:
+            self.waiting -= 1
+
+        self.admitted += 1
+        self.total_wait_seconds += time.monotonic() - started
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Replace the estimate with the actual token usage."""
+        self.tokens.give_back(estimated_tokens - actual_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests_per_minute": self.limit.requests_per_minute,
+            "tokens_per_minute": self.limit.tokens_per_minute,
+            "requests_available": int(self.requests.level),
+            "tokens_available": int(self.tokens.level),
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "avg_wait_seconds": self.total_wait_seconds / self.admitted if self.admitted else 0.0,
+        }
+
+
+class RateScheduler:
+    """Holds one limiter per (provider, model)."""
+
+    def __init__(self):
+        self._limiters: Dict[Tuple[str, str], ModelRateLimiter] = {}
+
+    def limiter_for(self, provider: str, model: str) -> Optional[ModelRateLimiter]:
+        key = (provider, model)
+        if key not in self._limiters:
+            limit = get_rate_limit(model, provider)
+            if limit is None:
+                return None
+            self._limiters[key] = ModelRateLimiter(limit)
+        return self._limiters[key]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Bucket levels and queueing per provider and model."""
+        stats: Dict[str, Dict[str, Any]] = {}
+        for (provider, model), limiter in self._limiters.items():
+            stats.setdefault(provider, {})[model] = limiter.stats()
+        return stats
+
+
+class RateLimitedLLMService(LLMService):
+    """Wraps an LLM service so requests are paced by the rate scheduler."""
+
+    def __init__(self, service: LLMService, provider: str, scheduler: RateScheduler):
+        self.service = service
+        self.provider = provider
+        self.scheduler = scheduler
+
+    async def generate_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
+        """Wait for rate-limit capacity, then generate text."""
+        limiter = self.scheduler.limiter_for(self.provider, model or DEFAULT_MODELS[self.provider])
+        if limiter is None:
+            return await self.service.generate_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+
+        estimated = estimate_tokens(prompt, max_tokens, self.provider, model or DEFAULT_MODELS[self.provider], kwargs.get("system_prompt"))
+        await limiter.acquire(estimated)
+        try:
+            response = await self.service.generate_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+        except Exception:
+            # Failed requests don't consume tokens, only the request slot
+            limiter.settle(estimated, 0)
+            raise
+
+        limiter.settle(estimated, response.usage.total_tokens)
+        return response
+
+    async def stream_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> AsyncIterator[LLMStreamChunk]:
+        """Wait for rate-limit capacity, then stream text."""
+        limiter = self.scheduler.limiter_for(self.provider, model or DEFAULT_MODELS[self.provider])
+        estimated = estimate_tokens(prompt, max_tokens, self.provider, model or DEFAULT_MODELS[self.provider], kwargs.get("system_prompt"))
+        if limiter is not None:
+            await limiter.acquire(estimated)
+
+        usage: Optional[LLMUsage] = None
+        stream = self.service.stream_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                yield chunk
+        finally:
+            # Propagate early close to the provider stream so upstream generation stops
+            await stream.aclose()
+            # Without final usage (stream cut short) keep the conservative estimate
+            if limiter is not None:
+                limiter.settle(estimated, usage.total_tokens if usage else estimated)
+
+
+# Shared by all providers; limiters are keyed by (provider, model)
+rate_scheduler = RateScheduler()
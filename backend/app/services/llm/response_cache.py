@@ -0,0 +1,222 @@
+"""
+Exact-match response cache for LLM text generation.
+
+Responses are keyed on a canonical hash of every request parameter, kept in a
+bounded in-memory LRU and optionally in a SQLite file that survives restarts.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.llm.llm_service import LLMResponse, LLMService, LLMStreamChunk
+
+
+def make_cache_key(provider: str, prompt: str, model: str, max_tokens: int, temperature: float, **kwargs) -> str:
+    """Canonical hash of all request parameters."""
+    params = {
+        "provider": provider,
+        "prompt": prompt,
+        "model": model,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        **kwargs,
+    }
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class MemoryResponseCache:
+    """LRU cache bounded by entry count and total payload bytes."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        # key -> (expires_at, payload, payload size in UTF-8 bytes)
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, payload: str, expires_at: float):
+        # Non-ASCII text takes several bytes per character
+        size = len(payload.encode())
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, payload, size)
+        self.bytes_used += size
+
+        while len(self._entries) > self.max_entries or self.bytes_used > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self.bytes_used -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteResponseCache:
+    """Persistent cache tier stored in a SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Calls are serialized through one worker thread at a time
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = asyncio.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS llm_response_cache (key TEXT PRIMARY KEY, payload TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self._conn.execute("DELETE FROM llm_response_cache WHERE expires_at <= ?", (time.time(),))
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[Tuple[str, float]]:
+        row = self._conn.execute("SELECT payload, expires_at FROM llm_response_cache WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _set(self, key: str, payload: str, expires_at: float):
+        self._conn.execute("INSERT OR REPLACE INTO llm_response_cache (key, payload, expires_at) VALUES (?, ?, ?)", (key, payload, expires_at))
+        self._conn.commit()
+
+    async def get(self, key: str) -> Optional[Tuple[str, float]]:
+        # Disk I/O runs off the event loop
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, payload: str, expires_at: float):
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, payload, expires_at)
+
+
+class ResponseCache:
+    """Two-tier (memory, then optional SQLite) cache of LLM responses."""
+
+    def __init__(
+        self,
+        max_entries: int = settings.LLM_CACHE_MAX_ENTRIES,
+        max_bytes: int = settings.LLM_CACHE_MAX_BYTES,
+        ttl_seconds: int = settings.LLM_CACHE_TTL_SECONDS,
+        sqlite_path: str = settings.LLM_CACHE_SQLITE_PATH,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of responses kept in memory
+            max_bytes: Maximum total size of the responses kept in memory
+            ttl_seconds: How long a response may be served from cache
+            sqlite_path: SQLite file for the persistent tier (empty disables it)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.memory = MemoryResponseCache(max_entries=max_entries, max_bytes=max_bytes)
+        self.disk = SQLiteResponseCache(sqlite_path) if sqlite_path else None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.cached_prompt_tokens = 0
+        self.cached_completion_tokens = 0
+
+    async def get(self, key: str) -> Optional[LLMResponse]:
+        payload = self.memory.get(key)
+
+        if payload is None and self.disk is not None:
+            row = await self.disk.get(key)
+            if row is not None:
+                payload, expires_at = row
+                # Promote to the memory tier
+                self.memory.set(key, payload, expires_at)
+                self.disk_hits += 1
+
+        if payload is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        response = LLMResponse.model_validate_json(payload)
+        self.cached_prompt_tokens += response.usage.prompt_tokens
+        self.cached_completion_tokens += response.usage.completion_tokens or 0
+        return response
+
+    async def set(self, key: str, response: LLMResponse):
+        payload = response.model_dump_json()
+        expires_at = time.time() + self.ttl_seconds
+        self.memory.set(key, payload, expires_at)
+        if self.disk is not None:
+            await self.disk.set(key, payload, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tokens served from cache instead of a provider."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.memory),
+            "bytes": self.memory.bytes_used,
+            "persistent": self.disk is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "cached_completion_tokens": self.cached_completion_tokens,
+        }
+
+
+class CachedLLMService(LLMService):
+    """Wraps an LLM service and serves identical requests from the response cache."""
+
+    def __init__(self, service: LLMService, provider: str, cache: ResponseCache, max_temperature: float = settings.LLM_CACHE_MAX_TEMPERATURE):
+        """
+        Initialize the wrapper.
+
+        Args:
+            service: The provider service to call on a cache miss
+            provider: Provider name, part of the cache key
+            cache: Shared response cache
+            max_temperature: Only requests at or below this temperature are cached
+        """
+        self.service = service
+        self.provider = provider
+        self.cache = cache
+        self.max_temperature = max_temperature
+
+    async def generate_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
+        """Generate text, using the cache for sufficiently deterministic requests."""
+        if temperature > self.max_temperature:
+            return await self.service.generate_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+
+        key = make_cache_key(self.provider, prompt, model, max_tokens, temperature, **kwargs)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached.model_copy(update={"cached": True})
+
+        response = await self.service.generate_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+        await self.cache.set(key, response)
+        return response
+
+    def stream_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> AsyncIterator[LLMStreamChunk]:
+        """Streams are not cached."""
+        return self.service.stream_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+
+
+@lru_cache()
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache."""
+    return ResponseCache()
@@ -0,0 +1,202 @@
+"""
+Semantic response cache for text generation.
+
+Prompts are embedded with the embedding service and stored with their
+completion in a dedicated Qdrant collection. A new prompt whose nearest
+neighbour (for the same user, requested model family, max_tokens and system
+prompt) is similar enough reuses that completion. Entries are never shared
+between users.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.llm import LLMUsage
+from app.services.llm.embedding_service import EmbeddingService, get_embedding_service
+from app.services.llm.llm_service import LLMResponse
+from app.services.vectordb.qdrant_service import QdrantService
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the per-model provider latency average
+LATENCY_EWMA_ALPHA = 0.2
+
+# Purge expired entries from Qdrant at most this often
+PURGE_INTERVAL_SECONDS = 300
+
+
+def model_family(model: str) -> str:
+    """Group dated snapshots of a model together (claude-3-haiku-20240307 -> claude-3-haiku)."""
+    return re.sub(r"-\d{8}$", "", model)
+
+
+def system_prompt_hash(system_prompt: Optional[str]) -> str:
+    """Completions are only reused under the same system prompt ("" for none)."""
+    return hashlib.sha256(system_prompt.encode()).hexdigest()[:16] if system_prompt else ""
+
+
+def cache_scope(user_id: Any, model: str, max_tokens: int, system_prompt: Optional[str]) -> Dict[str, Any]:
+    """Payload fields a stored completion must match exactly to be reused."""
+    return {
+        "user_id": str(user_id),
+        "model_family": model_family(model),
+        "max_tokens": max_tokens,
+        "system_prompt_hash": system_prompt_hash(system_prompt),
+    }
+
+
+class SemanticCache:
+    """Serves completions for prompts that are near-duplicates of earlier ones."""
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        vector_db: QdrantService,
+        embedding_model: str = settings.SEMANTIC_CACHE_EMBEDDING_MODEL,
+        threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+        model_thresholds: Optional[Dict[str, float]] = None,
+        ttl_seconds: int = settings.SEMANTIC_CACHE_TTL_SECONDS,
+        max_temperature: float = settings.SEMANTIC_CACHE_MAX_TEMPERATURE,
+    ):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            embedding_service: Service used to embed prompts
+            vector_db: Qdrant service bound to the cache collection
+            embedding_model: Embedding model for prompts
+            threshold: Default minimum cosine similarity for a hit
+            model_thresholds: Per-model-family overrides of the threshold
+            ttl_seconds: How long a stored completion may be reused
+            max_temperature: Only requests at or below this temperature use the cache
+        """
+        self.embedding_service = embedding_service
+        self.vector_db = vector_db
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.model_thresholds = model_thresholds if model_thresholds is not None else settings.SEMANTIC_CACHE_MODEL_THRESHOLDS
+        self.ttl_seconds = ttl_seconds
+        self.max_temperature = max_temperature
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.latency_saved_seconds = 0.0
+        self._provider_latency: Dict[str, float] = {}
+        self._last_purge = 0.0
+        self._background_tasks = set()
+
+    def threshold_for(self, model: str) -> float:
+        """Similarity threshold for a model family."""
+        return self.model_thresholds.get(model_family(model), self.threshold)
+
+    def applies_to(self, temperature: float) -> bool:
+        """Whether a request is deterministic enough to be served from cache."""
+        return temperature <= self.max_temperature
+
+    async def lookup(
+        self, prompt: str, model: str, user_id: Any, max_tokens: int, system_prompt: Optional[str] = None
+    ) -> Tuple[Optional[LLMResponse], Optional[List[float]]]:
+        """
+        Look for the user's stored completion of a similar prompt with the same model, max_tokens and system prompt.
+
+        Returns:
+            (response, prompt embedding) - the embedding can be passed to store() on a miss
+        """
+        started = time.perf_counter()
+        try:
+            embedding = (await self.embedding_service.create_embedding(text=prompt, model=self.embedding_model)).embedding
+            results = await self.vector_db.search(
+                query_embedding=embedding,
+                limit=1,
+                filter_params=cache_scope(user_id, model, max_tokens, system_prompt),
+                range_params={"expires_at": {"gt": time.time()}},
+            )
+        except Exception as e:
+            # The cache must never fail a request
+            self.errors += 1
+            logger.warning(f"Semantic cache lookup failed: {str(e)}")
+            return None, None
+
+        if not results or results[0]["score"] < self.threshold_for(model):
+            self.misses += 1
+            return None, embedding
+
+        self.hits += 1
+        lookup_seconds = time.perf_counter() - started
+        provider_seconds = self._provider_latency.get(model_family(model))
+        if provider_seconds is not None:
+            self.latency_saved_seconds += max(provider_seconds - lookup_seconds, 0.0)
+
+        document = results[0]["document"]
+        return LLMResponse(text=document["text"], model=document["model"], usage=LLMUsage(**document["usage"]), cached=True), embedding
+
+    def record_provider_latency(self, model: str, seconds: float):
+        """Track how long the provider takes, to estimate the latency saved by hits."""
+        family = model_family(model)
+        previous = self._provider_latency.get(family)
+        self._provider_latency[family] = seconds if previous is None else LATENCY_EWMA_ALPHA * seconds + (1 - LATENCY_EWMA_ALPHA) * previous
+
+    def store_in_background(
+        self, prompt: str, embedding: List[float], response: LLMResponse, model: str, user_id: Any, max_tokens: int, system_prompt: Optional[str] = None
+    ):
+        """Store a completion without delaying the response to the caller."""
+        task = asyncio.create_task(self.store(prompt, embedding, response, model, user_id, max_tokens, system_prompt))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def store(
+        self, prompt: str, embedding: List[float], response: LLMResponse, model: str, user_id: Any, max_tokens: int, system_prompt: Optional[str] = None
+    ):
+        """
+        Store a completion for future lookups.
+
+        model is the requested model, which can differ from response.model after a
+        hedged fallback; lookups are keyed on what was asked for.
+        """
+        now = time.time()
+        try:
+            await self.vector_db.add_documents(
+                documents=[{"prompt": prompt, "text": response.text, "model": response.model, "usage": response.usage.model_dump()}],
+                embeddings=[embedding],
+                metadata=[
+                    {
+                        **cache_scope(user_id, model, max_tokens, system_prompt),
+                        "expires_at": now + self.ttl_seconds,
+                    }
+                ],
+            )
+            if now - self._last_purge > PURGE_INTERVAL_SECONDS:
+                self._last_purge = now
+                await self.vector_db.delete_by_filter(range_params={"expires_at": {"lte": now}})
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Semantic cache store failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and estimated latency saved compared with calling the provider."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "latency_saved_seconds": round(self.latency_saved_seconds, 3),
+            "provider_latency_seconds": {family: round(seconds, 3) for family, seconds in self._provider_latency.items()},
+        }
+
+
+@lru_cache()
+def get_semantic_cache() -> SemanticCache:
+    """Return the process-wide semantic cache."""
+    return SemanticCache(
+        embedding_service=get_embedding_service(settings.SEMANTIC_CACHE_EMBEDDING_PROVIDER),
+        vector_db=QdrantService(collection_name=settings.SEMANTIC_CACHE_COLLECTION),
+    )
@@ -0,0 +1,116 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+While a request is in flight, identical requests wait for its result instead of
+making their own upstream call. Errors are delivered to every waiter. The
+shared call is cancelled once every waiter has been cancelled, so an abandoned
+request (e.g. the loser of a hedged race) doesn't keep running upstream.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, TypeVar
+
+from app.services.llm.embedding_service import EmbeddingResponse, EmbeddingService
+from app.services.llm.llm_service import LLMResponse, LLMService, LLMStreamChunk
+from app.services.llm.response_cache import make_cache_key
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn() for key, or join the call already in flight for it."""
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+
+        self._waiters[task] += 1
+        try:
+            # Shield so a cancelled waiter (e.g. a client that disconnected) doesn't
+            # cancel the shared call for everyone else
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done():
+                self._waiters[task] -= 1
+                if self._waiters[task] == 0:
+                    # Nobody is waiting any more: stop the upstream call
+                    self._forget(key, task)
+                    task.cancel()
+            raise
+
+    def _forget(self, key: str, task: asyncio.Task):
+        """Stop routing new callers for key to task."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.done():
+            self._waiters.pop(task, None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "upstream_calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / total if total else 0.0,
+        }
+
+
+class SingleFlightLLMService(LLMService):
+    """Wraps an LLM service so concurrent identical generations share one upstream call."""
+
+    def __init__(self, service: LLMService, provider: str, flight: SingleFlight):
+        self.service = service
+        self.provider = provider
+        self.flight = flight
+
+    async def generate_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
+        """Generate text, joining an identical in-flight request if there is one."""
+        key = make_cache_key(self.provider, prompt, model, max_tokens, temperature, **kwargs)
+        return await self.flight.do(
+            key, lambda: self.service.generate_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+        )
+
+    def stream_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> AsyncIterator[LLMStreamChunk]:
+        """Streams are not coalesced."""
+        return self.service.stream_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+
+
+class SingleFlightEmbeddingService(EmbeddingService):
+    """Wraps an embedding service so concurrent identical embeddings share one upstream call."""
+
+    def __init__(self, service: EmbeddingService, provider: str, flight: SingleFlight):
+        self.service = service
+        self.provider = provider
+        self.max_batch_items = service.max_batch_items
+        self.max_batch_tokens = service.max_batch_tokens
+        self.flight = flight
+
+    async def create_embedding(self, text: str, model: str = None) -> EmbeddingResponse:
+        """Create an embedding, joining an identical in-flight request if there is one."""
+        key = make_cache_key(self.provider, text, model, 0, 0.0, kind="embedding")
+        if model is None:
+            return await self.flight.do(key, lambda: self.service.create_embedding(text=text))
+        return await self.flight.do(key, lambda: self.service.create_embedding(text=text, model=model))
+
+    async def embed_batch(self, texts: List[str], model: str) -> List[EmbeddingResponse]:
+        """Batches are not shared; identical single embeddings still are."""
+        return await self.service.embed_batch(texts, model)
+
+
+# Shared by all providers; keys include the provider name
+generation_flight = SingleFlight()
+embedding_flight = SingleFlight()
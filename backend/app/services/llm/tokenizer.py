@@ -0,0 +1,182 @@
+"""
+Local token counting and pre-flight validation of generation requests.
+
+Counting happens in-process so oversized requests are rejected (or trimmed)
+before any provider round trip. OpenAI models use their real BPE encoding via
+tiktoken when it is installed and its encoding files are available; otherwise,
+and for providers without a public tokenizer, a fast character-ratio
+approximation is used, so this works offline.
+"""
+
+import logging
+import math
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import BaseModel
+
+from app.config.models import DEFAULT_MODELS, MODELS
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Average characters per token of each provider's tokenizer on English text
+CHARS_PER_TOKEN = {
+    "openai": 4.0,
+    "anthropic": 3.5,
+    "gemini": 4.0,
+}
+
+# tiktoken encodings for OpenAI model name prefixes
+OPENAI_ENCODINGS = {
+    ("o1", "o3", "o4", "gpt-4o", "gpt-4.1"): "o200k_base",
+    ("gpt-4", "gpt-3.5", "text-embedding"): "cl100k_base",
+}
+
+# Tokens reserved for message framing (roles, separators) around the prompt
+MESSAGE_OVERHEAD_TOKENS = 8
+
+
+class PromptTooLongError(ValueError):
+    """The prompt doesn't fit in the model's context window."""
+
+
+class Tokenizer:
+    """Fast approximate tokenizer based on a characters-per-token ratio."""
+
+    exact = False
+
+    def __init__(self, chars_per_token: float = 4.0):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Keep the last max_tokens tokens of text (the most recent context)."""
+        if max_tokens <= 0:
+            return ""
+        keep = int(max_tokens * self.chars_per_token)
+        return text[-keep:] if len(text) > keep else text
+
+
+class TiktokenTokenizer(Tokenizer):
+    """Exact tokenizer for OpenAI models."""
+
+    exact = True
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        tokens = self.encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[-max_tokens:])
+
+
+def _openai_encoding_name(model: str) -> str:
+    for prefixes, name in OPENAI_ENCODINGS.items():
+        if model.startswith(prefixes):
+            return name
+    return "o200k_base"
+
+
+@lru_cache()
+def _load_encoding(name: str):
+    """Load a tiktoken encoding once, or None if it isn't available."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # tiktoken not installed, or its encoding files can't be fetched offline
+        logger.warning(f"Exact tokenizer {name} unavailable, using approximation: {str(e)}")
+        return None
+
+
+@lru_cache()
+def get_tokenizer(provider: str, model: Optional[str] = None, mode: str = settings.LLM_TOKENIZER_MODE) -> Tokenizer:
+    """
+    Get the tokenizer for a provider and model.
+
+    Args:
+        provider: Provider name
+        model: Model name (selects the OpenAI encoding)
+        mode: "exact" uses real encodings where available, "approximate" always uses the ratio
+    """
+    if mode == "exact" and provider == "openai":
+        encoding = _load_encoding(_openai_encoding_name(model or DEFAULT_MODELS["openai"]))
+        if encoding is not None:
+            return TiktokenTokenizer(encoding)
+
+    return Tokenizer(CHARS_PER_TOKEN.get(provider, 4.0))
+
+
+def count_tokens(text: str, provider: str, model: Optional[str] = None) -> int:
+    """Count the tokens of text for a provider and model."""
+    return get_tokenizer(provider, model).count(text)
+
+
+class PreflightResult(BaseModel):
+    """Outcome of validating a request against the model's limits."""
+
+    prompt: str
+    max_tokens: int
+    prompt_tokens: int
+    max_tokens_clamped: bool = False
+    prompt_trimmed: bool = False
+    exact: bool
+    context_window: Optional[int] = None
+    estimated_cost_usd: Optional[float] = None  # Upper bound, assumes all max_tokens are generated
+
+
+def preflight(prompt: str, model: str, provider: str, max_tokens: int, system_prompt: Optional[str] = None, overflow: Optional[str] = None) -> PreflightResult:
+    """
+    Validate a request against the model's limits before sending it.
+
+    Clamps max_tokens to the model's maximum output and checks that prompt plus
+    completion fit in the context window. Oversized prompts are rejected with
+    PromptTooLongError, or trimmed to fit when overflow is "trim".
+    """
+    overflow = overflow or settings.LLM_PROMPT_OVERFLOW
+    tokenizer = get_tokenizer(provider, model)
+    prompt_tokens = tokenizer.count(prompt)
+    system_tokens = tokenizer.count(system_prompt) if system_prompt else 0
+
+    config = MODELS.get(model)
+    if config is None:
+        # Unknown model: nothing to validate against
+        return PreflightResult(prompt=prompt, max_tokens=max_tokens, prompt_tokens=prompt_tokens + system_tokens, exact=tokenizer.exact)
+
+    max_tokens_clamped = max_tokens > config.max_tokens
+    max_tokens = min(max_tokens, config.max_tokens)
+
+    available = config.context_window - max_tokens - system_tokens - MESSAGE_OVERHEAD_TOKENS
+    prompt_trimmed = False
+    if prompt_tokens > available:
+        if overflow != "trim" or available <= 0:
+            raise PromptTooLongError(
+                f"Prompt is {prompt_tokens + system_tokens} tokens but {model} allows {config.context_window - max_tokens - MESSAGE_OVERHEAD_TOKENS} "
+                f"with max_tokens={max_tokens} (context window {config.context_window})"
+            )
+        prompt = tokenizer.truncate(prompt, available)
+        prompt_tokens = tokenizer.count(prompt)
+        prompt_trimmed = True
+
+    total_prompt_tokens = prompt_tokens + system_tokens
+    cost = (total_prompt_tokens * config.input_price_per_million + max_tokens * config.output_price_per_million) / 1_000_000
+
+    return PreflightResult(
+        prompt=prompt,
+        max_tokens=max_tokens,
+        prompt_tokens=total_prompt_tokens,
+        max_tokens_clamped=max_tokens_clamped,
+        prompt_trimmed=prompt_trimmed,
+        exact=tokenizer.exact,
+        context_window=config.context_window,
+        estimated_cost_usd=round(cost, 6),
+    )
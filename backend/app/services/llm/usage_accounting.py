@@ -0,0 +1,260 @@
+"""
+Per-user token usage and cost accounting.
+
+Request handlers only append a record to an in-memory ring buffer, which is
+O(1) and never touches the network. A background task started in the
+application lifespan flushes the buffer to a Supabase table in batches, so
+persistence never adds latency to /generate or /embedding. Aggregates combine
+the persisted rows with records that haven't been flushed yet.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.config.models import CACHE_WRITE_PRICE_MULTIPLIER, CACHED_INPUT_PRICE_MULTIPLIER, EMBEDDING_PRICES_PER_MILLION, MODELS
+from app.core.config import settings
+from app.models.llm import LLMUsage
+from app.services.supabase.client import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = ("requests", "cached_requests", "prompt_tokens", "completion_tokens", "total_tokens", "cost_usd")
+
+
+class UsageRecord(BaseModel):
+    """Tokens and cost of one LLM or embedding call."""
+
+    user_id: str
+    kind: str  # "generation" or "embedding"
+    provider: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int = 0
+    total_tokens: int
+    cost_usd: float
+    cached: bool = False
+    created_at: datetime
+
+
+def compute_cost(model: str, prompt_tokens: int, completion_tokens: int = 0, cached_prompt_tokens: int = 0, cache_write_tokens: int = 0) -> float:
+    """
+    Cost in USD of a call, from the model's per-million-token prices (0 for unpriced models).
+
+    prompt_tokens includes cached_prompt_tokens and cache_write_tokens, which are
+    priced at the provider's prompt cache read and write rates instead.
+    """
+    if model in MODELS:
+        config = MODELS[model]
+        uncached_tokens = max(0, prompt_tokens - cached_prompt_tokens - cache_write_tokens)
+        input_price = config.input_price_per_million
+        cost = (
+            uncached_tokens * input_price
+            + cached_prompt_tokens * input_price * CACHED_INPUT_PRICE_MULTIPLIER.get(config.provider, 1.0)
+            + cache_write_tokens * input_price * CACHE_WRITE_PRICE_MULTIPLIER.get(config.provider, 1.0)
+            + completion_tokens * config.output_price_per_million
+        )
+    else:
+        cost = prompt_tokens * EMBEDDING_PRICES_PER_MILLION.get(model, 0.0)
+    return round(cost / 1_000_000, 8)
+
+
+class UsageAccountant:
+    """Buffers usage records in memory and flushes them to Supabase in batches."""
+
+    def __init__(
+        self,
+        table: str = settings.USAGE_TABLE,
+        buffer_size: int = settings.USAGE_BUFFER_SIZE,
+        batch_size: int = settings.USAGE_FLUSH_BATCH_SIZE,
+        flush_interval: float = settings.USAGE_FLUSH_INTERVAL_SECONDS,
+        persist: bool = settings.USAGE_PERSIST_ENABLED,
+    ):
+        """
+        Initialize the accountant.
+
+        Args:
+            table: Supabase table the records are written to
+            buffer_size: Maximum records held in memory
+            batch_size: Maximum records per insert
+            flush_interval: Seconds between flushes (a full batch flushes sooner)
+            persist: Whether to flush to Supabase; otherwise the buffer keeps the most recent records
+        """
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.persist = persist
+        self._buffer: Deque[UsageRecord] = deque(maxlen=buffer_size)
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.flush_failures = 0
+        self.last_flush: Optional[float] = None
+
+    def record(
+        self, user_id: str, provider: str, model: str, usage: LLMUsage, kind: str = "generation", cached: bool = False
+    ) -> UsageRecord:
+        """
+        Record the usage of one call. Never blocks or does I/O.
+
+        Cached responses are recorded with zero cost since no provider was called.
+        """
+        completion_tokens = usage.completion_tokens or 0
+        cost = compute_cost(model, usage.prompt_tokens, completion_tokens, usage.cached_prompt_tokens or 0, usage.cache_write_tokens or 0)
+        record = UsageRecord(
+            user_id=str(user_id),
+            kind=kind,
+            provider=MODELS[model].provider if model in MODELS else provider,
+            model=model,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=usage.total_tokens,
+            cost_usd=0.0 if cached else cost,
+            cached=cached,
+            created_at=datetime.now(timezone.utc),
+        )
+
+        if len(self._buffer) == self._buffer.maxlen and self.persist:
+            # Flushing can't keep up (or Supabase is down): the oldest record is lost
+            self.dropped += 1
+        self._buffer.append(record)
+        self.recorded += 1
+        if self.persist and len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+        return record
+
+    async def flush(self) -> int:
+        """Write buffered records to Supabase in batches, returning how many were written."""
+        written = 0
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                supabase = await get_supabase_client()
+                await supabase.table(self.table).insert([record.model_dump(mode="json") for record in batch]).execute()
+            except Exception as e:
+                # Put the batch back (as space allows) and retry on the next flush
+                self.flush_failures += 1
+                logger.error(f"Failed to flush {len(batch)} usage records: {str(e)}")
+                for record in reversed(batch):
+                    if len(self._buffer) == self._buffer.maxlen:
+                        self.dropped += 1
+                        continue
+                    self._buffer.appendleft(record)
+                break
+            written += len(batch)
+            self.flushed += len(batch)
+        self.last_flush = time.time()
+        return written
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
+
+    def start(self):
+        """Start the background flush task (no-op when persistence is disabled)."""
+        if self.persist and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and flush what's left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.persist:
+            await self.flush()
+
+    def _pending(self, user_id: Optional[str], since: Optional[datetime]) -> List[UsageRecord]:
+        return [
+            record
+            for record in self._buffer
+            if (user_id is None or record.user_id == str(user_id)) and (since is None or record.created_at >= since)
+        ]
+
+    async def summary(self, user_id: Optional[str] = None, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Aggregate usage per user, provider and model.
+
+        Args:
+            user_id: Restrict to one user (all users if None)
+            since: Only count calls at or after this time
+
+        Returns:
+            One row per (user_id, provider, model) with request, token and cost totals
+        """
+        if since is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        totals: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+        def add(row: Dict[str, Any]):
+            key = (row["user_id"], row["provider"], row["model"])
+            entry = totals.setdefault(key, {"user_id": key[0], "provider": key[1], "model": key[2], **{field: 0 for field in SUMMARY_FIELDS}})
+            for field in SUMMARY_FIELDS:
+                entry[field] += row[field]
+
+        if self.persist:
+            supabase = await get_supabase_client()
+            response = await supabase.rpc(
+                "llm_usage_summary", {"p_user_id": user_id, "p_since": since.isoformat() if since else None}
+            ).execute()
+            for row in response.data:
+                add({**row, "user_id": str(row["user_id"]), "cost_usd": float(row["cost_usd"])})
+
+        for record in self._pending(user_id, since):
+            add(
+                {
+                    **record.model_dump(),
+                    "requests": 1,
+                    "cached_requests": int(record.cached),
+                }
+            )
+
+        for entry in totals.values():
+            entry["cost_usd"] = round(entry["cost_usd"], 6)
+        return sorted(totals.values(), key=lambda entry: -entry["cost_usd"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.USAGE_ACCOUNTING_ENABLED,
+            "persist": self.persist,
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "flush_failures": self.flush_failures,
+            "last_flush": self.last_flush,
+        }
+
+
+@lru_cache()
+def get_usage_accountant() -> UsageAccountant:
+    """Return the process-wide usage accountant."""
+    return UsageAccountant()
+
+
+def served_provider(model: str, requested: str) -> str:
+    """Provider of the model that produced a response; routing and hedging may answer from another provider."""
+    return MODELS[model].provider if model in MODELS else requested
+
+
+def record_usage(user, provider: str, model: str, usage: Optional[LLMUsage], kind: str = "generation", cached: bool = False):
+    """Record a call's usage for the authenticated user if accounting is enabled."""
+    if settings.USAGE_ACCOUNTING_ENABLED and usage is not None and user is not None:
+        get_usage_accountant().record(user.id, provider, model, usage, kind=kind, cached=cached)
@@ -1,24 +1,68 @@
-from supabase import create_client, Client
-from supabase.lib.client_options import ClientOptions  # Import this
+from functools import lru_cache
+
+import jwt
+from gotrue.errors import AuthApiError
 from app.core.config import settings
+from app.services.supabase.client import get_supabase_client
+from app.services.supabase.token_cache import VerifiedTokenCache
+from app.services.supabase.token_verifier import SupabaseJWTVerifier, TokenVerificationError, TokenVerifierUnavailable
+
+# Supabase Auth statuses that mean the token itself was rejected
+REJECTED_TOKEN_STATUSES = {401, 403}
 
 
 class SupabaseAuthService:
     """Service for handling Supabase authentication."""
 
     def __init__(self):
-        """Initialize the Supabase client."""
-        # Initialize with proper options structure
-        # The headers attribute is needed by the Supabase client
-        options = {"auto_refresh_token": True, "persist_session": True, "headers": {"X-Client-Info": "backend-api"}}
-
-        # Create the client with the properly structured options
-        self.supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+        """Initialize the token verifier and cache; the async Supabase client is shared and created on first use."""
+        self.verifier = SupabaseJWTVerifier() if settings.SUPABASE_AUTH_MODE == "local" else None
+        self.token_cache = VerifiedTokenCache(
+            max_size=settings.AUTH_TOKEN_CACHE_SIZE,
+            ttl_seconds=settings.AUTH_TOKEN_CACHE_TTL_SECONDS,
+            negative_ttl_seconds=settings.AUTH_NEGATIVE_CACHE_TTL_SECONDS,
+        )
 
     async def get_user(self, jwt_token: str):
         """Get user data from a JWT token."""
+        found, user, error = self.token_cache.get(jwt_token)
+        if found:
+            if error is not None:
+                raise TokenVerificationError(error)
+            return user
+
+        try:
+            user = await self._verify(jwt_token)
+        except (TokenVerificationError, AuthApiError) as e:
+            # Remember definitive rejections briefly so retry loops don't reach Supabase;
+            # transient failures (JWKS unreachable, Supabase Auth 5xx or outage) are not cached
+            if isinstance(e, TokenVerificationError) or e.status in REJECTED_TOKEN_STATUSES:
+                self.token_cache.set_rejected(jwt_token, str(e))
+            raise
+
+        if user is not None:
+            self.token_cache.set(jwt_token, user, token_exp=_token_expiry(jwt_token))
+        return user
+
+    async def _verify(self, jwt_token: str):
+        """Verify a token locally or remotely, depending on SUPABASE_AUTH_MODE."""
+        if self.verifier is not None:
+            try:
+                # Check the signature and claims locally, no round trip to Supabase Auth
+                return await self.verifier.get_user(jwt_token)
+            except TokenVerifierUnavailable:
+                # Only tokens we could not check at all may fall through to Supabase Auth;
+                # tokens that were checked and rejected are never retried remotely
+                if not settings.SUPABASE_AUTH_REMOTE_FALLBACK:
+                    raise
+
+        return await self._get_user_remote(jwt_token)
+
+    async def _get_user_remote(self, jwt_token: str):
+        """Get user data by asking Supabase Auth to validate the token."""
         # Use the Supabase client to get user information
-        response = self.supabase.auth.get_user(jwt_token)
+        supabase = await get_supabase_client()
+        response = await supabase.auth.get_user(jwt_token)
         return response.user
 
     async def sign_in_with_provider_token(self, provider: str, token: str) -> str:
@@ -26,7 +70,8 @@ class SupabaseAuthService:
         if provider not in ["google", "linkedin"]:
             raise ValueError(f"Unsupported provider: {provider}")
 
-        response = self.supabase.auth.sign_in_with_oauth_provider(provider=provider, access_token=token)
+        supabase = await get_supabase_client()
+        response = await supabase.auth.sign_in_with_oauth_provider(provider=provider, access_token=token)
 
         if not response.session or not response.session.access_token:
             raise ValueError(f"Failed to authenticate with {provider}")
@@ -34,7 +79,27 @@ class SupabaseAuthService:
         return response.session.access_token
 
 
+def is_admin(user) -> bool:
+    """
+    Whether a user may change shared settings.
+
+    True for the service role and for users whose app_metadata has role "admin";
+    app_metadata can only be written with the service key, so users can't grant it themselves.
+    """
+    app_metadata = getattr(user, "app_metadata", None) or {}
+    return getattr(user, "role", None) == "service_role" or app_metadata.get("role") == "admin"
+
+
+def _token_expiry(jwt_token: str):
+    """Read the "exp" claim of an already verified token."""
+    try:
+        return jwt.decode(jwt_token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        return None
+
+
 # Dependency to get the auth service
+@lru_cache()
 def get_auth_service() -> SupabaseAuthService:
-    """Return an instance of the Supabase auth service."""
+    """Return the process-wide Supabase auth service."""
     return SupabaseAuthService()
@@ -0,0 +1,26 @@
+import asyncio
+from typing import Optional
+
+from supabase import acreate_client, AsyncClient
+
+from app.core.config import settings
+
+_client: Optional[AsyncClient] = None
+_client_lock = asyncio.Lock()
+
+
+async def get_supabase_client() -> AsyncClient:
+    """
+    Return the process-wide async Supabase client.
+
+    The async client is created with a coroutine, so it is built lazily on first
+    use and then shared by the auth, database and storage services.
+    """
+    global _client
+
+    if _client is None:
+        async with _client_lock:
+            if _client is None:
+                _client = await acreate_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+
+    return _client
@@ -1,7 +1,6 @@
-from supabase import create_client, Client
 from typing import Dict, List, Any, Optional, TypeVar, Generic, Type
 
-from app.core.config import settings
+from app.services.supabase.client import get_supabase_client
 
 T = TypeVar("T")
 
@@ -17,25 +16,26 @@ class SupabaseDatabaseService(Generic[T]):
             table_name: The name of the table in Supabase
             model_class: The Pydantic model class for data validation
         """
-        self.supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
         self.table_name = table_name
         self.model_class = model_class
 
     async def list(self, filters: Optional[Dict[str, Any]] = None) -> List[T]:
         """List records with optional filtering."""
-        query = self.supabase.table(self.table_name).select("*")
+        supabase = await get_supabase_client()
+        query = supabase.table(self.table_name).select("*")
 
         if filters:
             for key, value in filters.items():
                 query = query.eq(key, value)
 
-        response = query.execute()
+        response = await query.execute()
 
         return [self.model_class(**item) for item in response.data]
 
     async def get(self, id: str) -> Optional[T]:
         """Get a single record by ID."""
-        response = self.supabase.table(self.table_name).select("*").eq("id", id).execute()
+        supabase = await get_supabase_client()
+        response = await supabase.table(self.table_name).select("*").eq("id", id).execute()
 
         if not response.data:
             return None
@@ -44,7 +44,8 @@ class SupabaseDatabaseService(Generic[T]):
 
     async def create(self, data: Dict[str, Any]) -> T:
         """Create a new record."""
-        response = self.supabase.table(self.table_name).insert(data).execute()
+        supabase = await get_supabase_client()
+        response = await supabase.table(self.table_name).insert(data).execute()
 
         if not response.data:
             raise ValueError("Failed to create record")
@@ -53,7 +54,8 @@ class SupabaseDatabaseService(Generic[T]):
 
     async def update(self, id: str, data: Dict[str, Any]) -> T:
         """Update an existing record."""
-        response = self.supabase.table(self.table_name).update(data).eq("id", id).execute()
+        supabase = await get_supabase_client()
+        response = await supabase.table(self.table_name).update(data).eq("id", id).execute()
 
         if not response.data:
             raise ValueError(f"Failed to update record with ID: {id}")
@@ -62,7 +64,8 @@ class SupabaseDatabaseService(Generic[T]):
 
     async def delete(self, id: str) -> bool:
         """Delete a record by ID."""
-        response = self.supabase.table(self.table_name).delete().eq("id", id).execute()
+        supabase = await get_supabase_client()
+        response = await supabase.table(self.table_name).delete().eq("id", id).execute()
 
         if not response.data:
             return False
@@ -1,9 +1,8 @@
-from supabase import create_client, Client
 from fastapi import UploadFile
 from typing import List, Optional
 import uuid
 
-from app.core.config import settings
+from app.services.supabase.client import get_supabase_client
 
 
 class SupabaseStorageService:
@@ -16,18 +15,26 @@ class SupabaseStorageService:
         Args:
             bucket_name: The name of the storage bucket (default: "default")
         """
-        self.supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
         self.bucket_name = bucket_name
+        self._bucket_checked = False
 
-        # Ensure the bucket exists
-        self._ensure_bucket_exists()
+    async def _bucket(self):
+        """Return the async bucket proxy, ensuring the bucket exists on first use."""
+        supabase = await get_supabase_client()
 
-    def _ensure_bucket_exists(self):
+        if not self._bucket_checked:
+            await self._ensure_bucket_exists()
+
+        return supabase.storage.from_(self.bucket_name)
+
+    async def _ensure_bucket_exists(self):
         """Ensure the bucket exists, creating it if necessary."""
+        supabase = await get_supabase_client()
         try:
-            self.supabase.storage.get_bucket(self.bucket_name)
+            await supabase.storage.get_bucket(self.bucket_name)
         except Exception:
-            self.supabase.storage.create_bucket(self.bucket_name)
+            await supabase.storage.create_bucket(self.bucket_name)
+        self._bucket_checked = True
 
     async def upload_file(self, file: UploadFile, path: Optional[str] = None) -> str:
         """
@@ -50,26 +57,30 @@ class SupabaseStorageService:
         file_content = await file.read()
 
         # Upload to Supabase Storage
-        self.supabase.storage.from_(self.bucket_name).upload(path=full_path, file=file_content, file_options={"content-type": file.content_type})
+        bucket = await self._bucket()
+        await bucket.upload(path=full_path, file=file_content, file_options={"content-type": file.content_type})
 
         # Return the public URL
-        public_url = self.supabase.storage.from_(self.bucket_name).get_public_url(full_path)
+        public_url = await bucket.get_public_url(full_path)
 
         return public_url
 
-    def get_public_url(self, path: str) -> str:
+    async def get_public_url(self, path: str) -> str:
         """Get the public URL for a file."""
-        return self.supabase.storage.from_(self.bucket_name).get_public_url(path)
+        bucket = await self._bucket()
+        return await bucket.get_public_url(path)
 
-    def delete_file(self, path: str) -> bool:
+    async def delete_file(self, path: str) -> bool:
         """Delete a file from storage."""
         try:
-            self.supabase.storage.from_(self.bucket_name).remove([path])
+            bucket = await self._bucket()
+            await bucket.remove([path])
             return True
         except Exception:
             return False
 
-    def list_files(self, path: Optional[str] = None) -> List[dict]:
+    async def list_files(self, path: Optional[str] = None) -> List[dict]:
         """List files in a directory."""
-        response = self.supabase.storage.from_(self.bucket_name).list(path or "")
+        bucket = await self._bucket()
+        response = await bucket.list(path or "")
         return response
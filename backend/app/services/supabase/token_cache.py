@@ -0,0 +1,99 @@
+"""
+In-process cache of verified (and recently rejected) access tokens.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class VerifiedTokenCache:
+    """Bounded LRU cache of token verification results keyed by token hash."""
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: int = 300, negative_ttl_seconds: int = 10):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of tokens kept (accepted and rejected combined)
+            ttl_seconds: Longest time an accepted token is trusted without re-verifying
+            negative_ttl_seconds: How long a rejected token is rejected without re-verifying
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # token hash -> (expires_at, user, error message)
+        self._entries: "OrderedDict[str, Tuple[float, Any, Optional[str]]]" = OrderedDict()
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Never keep raw bearer tokens in memory longer than needed
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Tuple[bool, Any, Optional[str]]:
+        """
+        Look up a token.
+
+        Returns:
+            (found, user, error) - error is set when the token was recently rejected
+        """
+        key = self._key(token)
+        entry = self._entries.get(key)
+
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None, None
+
+        self._entries.move_to_end(key)
+        expires_at, user, error = entry
+        if error is not None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return True, user, error
+
+    def set(self, token: str, user: Any, token_exp: Optional[float] = None):
+        """Cache an accepted token until its own expiry or the cache TTL, whichever comes first."""
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        self._put(self._key(token), (expires_at, user, None))
+
+    def set_rejected(self, token: str, error: str):
+        """Cache a rejected token for the (short) negative TTL."""
+        self._put(self._key(token), (time.time() + self.negative_ttl_seconds, None, error))
+
+    def _put(self, key: str, entry: Tuple[float, Any, Optional[str]]):
+        if entry[0] <= time.time():
+            return
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop all cached tokens."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring."""
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,167 @@
+"""
+Local verification of Supabase-issued access tokens.
+
+Supabase Auth signs access tokens either with the project's shared HS256 secret
+or with an asymmetric key published at the project's JWKS endpoint. Verifying
+them in-process avoids an HTTP round trip to Supabase Auth on every request.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import httpx
+import jwt
+from gotrue.types import User
+
+from app.core.config import settings
+from app.core.http_clients import http_clients
+
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256", "EdDSA"]
+
+# Never hit the JWKS endpoint more often than this, even for unknown key IDs
+JWKS_MIN_REFRESH_SECONDS = 30
+
+
+class TokenVerificationError(ValueError):
+    """The token was checked locally and rejected (bad signature, expired, wrong audience...)."""
+
+
+class TokenVerifierUnavailable(RuntimeError):
+    """The token could not be checked locally (no key configured, JWKS unreachable...)."""
+
+
+class JWKSCache:
+    """Caches the signing keys published at a JWKS endpoint, refetching on rotation."""
+
+    def __init__(self, url: str, cache_seconds: int = 600):
+        self.url = url
+        self.cache_seconds = cache_seconds
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        # None until the first successful fetch (monotonic time can start near zero)
+        self._fetched_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def get_key(self, kid: Optional[str]) -> jwt.PyJWK:
+        """Return the signing key for a key ID, refreshing the key set if it is stale or unknown."""
+        stale = self._fetched_at is None or time.monotonic() - self._fetched_at > self.cache_seconds
+        if stale or not self._keys or (kid is not None and kid not in self._keys):
+            await self._refresh()
+
+        if kid is None and len(self._keys) == 1:
+            return next(iter(self._keys.values()))
+
+        key = self._keys.get(kid)
+        if key is None:
+            raise TokenVerificationError(f"Unknown signing key: {kid}")
+        return key
+
+    async def _refresh(self):
+        async with self._lock:
+            # Another request may have refreshed while we were waiting
+            if self._fetched_at is not None and time.monotonic() - self._fetched_at < JWKS_MIN_REFRESH_SECONDS:
+                return
+
+            try:
+                response = await http_clients.get("supabase").get(self.url, timeout=5.0)
+                response.raise_for_status()
+                jwks = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                if self._keys:
+                    # Keep serving the keys we already have
+                    return
+                raise TokenVerifierUnavailable(f"Failed to fetch JWKS from {self.url}: {str(e)}")
+
+            keys = {}
+            for jwk in jwks.get("keys", []):
+                try:
+                    keys[jwk.get("kid")] = jwt.PyJWK(jwk)
+                except jwt.PyJWKError:
+                    # Skip keys we can't use (unsupported algorithm, missing crypto backend)
+                    continue
+
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+
+
+class SupabaseJWTVerifier:
+    """Verifies Supabase access tokens without calling Supabase Auth."""
+
+    def __init__(
+        self,
+        jwt_secret: str = settings.SUPABASE_JWT_SECRET,
+        audience: str = settings.SUPABASE_JWT_AUDIENCE,
+        issuer: str = settings.SUPABASE_JWT_ISSUER,
+        jwks_url: str = settings.SUPABASE_JWKS_URL,
+        jwks_cache_seconds: int = settings.SUPABASE_JWKS_CACHE_SECONDS,
+        leeway: int = settings.SUPABASE_JWT_LEEWAY_SECONDS,
+    ):
+        """
+        Initialize the verifier.
+
+        Args:
+            jwt_secret: Shared HS256 secret of the Supabase project
+            audience: Expected "aud" claim
+            issuer: Expected "iss" claim (defaults to the project's auth URL)
+            jwks_url: JWKS endpoint for asymmetric keys (defaults to the project's well-known URL)
+            jwks_cache_seconds: How long fetched signing keys are trusted before refetching
+            leeway: Clock skew tolerated when checking "exp", "nbf" and "iat"
+        """
+        auth_url = f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1"
+
+        self.jwt_secret = jwt_secret
+        self.audience = audience or None
+        self.issuer = issuer or auth_url
+        self.leeway = leeway
+        self.jwks = JWKSCache(jwks_url or f"{auth_url}/.well-known/jwks.json", cache_seconds=jwks_cache_seconds)
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Verify a token's signature, expiry, audience and issuer and return its claims."""
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError as e:
+            raise TokenVerificationError(f"Malformed token: {str(e)}")
+
+        algorithm = header.get("alg")
+        if algorithm == "HS256":
+            if not self.jwt_secret:
+                raise TokenVerifierUnavailable("SUPABASE_JWT_SECRET is not configured")
+            key = self.jwt_secret
+        elif algorithm in ASYMMETRIC_ALGORITHMS:
+            key = (await self.jwks.get_key(header.get("kid"))).key
+        else:
+            raise TokenVerificationError(f"Unsupported token algorithm: {algorithm}")
+
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=[algorithm],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={"require": ["exp", "sub"]},
+            )
+        except jwt.InvalidTokenError as e:
+            raise TokenVerificationError(str(e))
+
+    async def get_user(self, token: str) -> User:
+        """Verify a token and build the same user object Supabase Auth would return."""
+        return user_from_claims(await self.verify(token))
+
+
+def user_from_claims(claims: Dict[str, Any]) -> User:
+    """Build a Supabase user object from access token claims."""
+    issued_at = claims.get("iat") or time.time()
+
+    return User(
+        id=claims["sub"],
+        aud=claims.get("aud") if isinstance(claims.get("aud"), str) else settings.SUPABASE_JWT_AUDIENCE,
+        role=claims.get("role"),
+        email=claims.get("email") or None,
+        phone=claims.get("phone") or None,
+        app_metadata=claims.get("app_metadata") or {},
+        user_metadata=claims.get("user_metadata") or {},
+        created_at=datetime.fromtimestamp(issued_at, tz=timezone.utc),
+    )
@@ -1,3 +1,3 @@
-from app.services.vectordb.qdrant_service import QdrantService, get_vector_db_service
+from app.services.vectordb.qdrant_service import CollectionNotFoundError, QdrantService, get_vector_db_service
 
-__all__ = ["QdrantService", "get_vector_db_service"]
+__all__ = ["CollectionNotFoundError", "QdrantService", "get_vector_db_service"]
@@ -2,17 +2,56 @@ from typing import List, Dict, Any, Optional, Union
 import uuid
 from functools import lru_cache
 
-from qdrant_client import QdrantClient
+import numpy as np
+from qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models
 from qdrant_client.http.models import Distance, VectorParams
 
 from app.core.config import settings
+from app.models.vectordb import CollectionInfo, VectorCompression
+
+
+def truncate_vectors(vectors: List[List[float]], dimensions: Optional[int]) -> List[List[float]]:
+    """Keep the first `dimensions` of each vector and re-normalize (Matryoshka truncation)."""
+    if not dimensions or all(len(vector) <= dimensions for vector in vectors):
+        return vectors
+    matrix = np.asarray(vectors, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0).tolist()
+
+
+def quantization_config(compression: VectorCompression):
+    """Qdrant quantization config for a compression setting (None when unquantized)."""
+    if compression.quantization == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=compression.always_ram)
+        )
+    if compression.quantization == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=compression.always_ram))
+    return None
+
+
+def ram_bytes_per_vector(vector_size: int, compression: VectorCompression) -> float:
+    """Approximate RAM per stored vector (excluding the HNSW graph and payloads)."""
+    original = 0 if compression.quantization != "none" and compression.on_disk is not False else vector_size * 4
+    quantized = {"none": 0, "scalar": vector_size, "binary": vector_size / 8}[compression.quantization]
+    return original + (quantized if compression.always_ram else 0)
+
+
+class CollectionNotFoundError(LookupError):
+    """The collection doesn't exist yet and the operation can't create it."""
 
 
 class QdrantService:
     """Service for interacting with Qdrant vector database."""
 
-    def __init__(self, url: str = settings.QDRANT_URL, api_key: str = settings.QDRANT_API_KEY, collection_name: str = settings.QDRANT_COLLECTION_NAME):
+    def __init__(
+        self,
+        url: str = settings.QDRANT_URL,
+        api_key: str = settings.QDRANT_API_KEY,
+        collection_name: str = settings.QDRANT_COLLECTION_NAME,
+        compression: Optional[VectorCompression] = None,
+    ):
         """
         Initialize the Qdrant service.
 
@@ -20,27 +59,149 @@ class QdrantService:
             url: URL of the Qdrant server
             api_key: API key for Qdrant
             collection_name: Name of the collection to use
+            compression: Quantization/truncation for a new collection (defaults to QDRANT_COMPRESSION);
+                an existing collection keeps the settings it was created with
         """
         if not url:
             # Use local in-memory Qdrant instance if no URL provided
-            self.client = QdrantClient(":memory:")
+            self.client = AsyncQdrantClient(":memory:")
         else:
-            self.client = QdrantClient(url=url, api_key=api_key)
+            self.client = AsyncQdrantClient(url=url, api_key=api_key)
 
         self.collection_name = collection_name
+        self.compression = compression or VectorCompression(**settings.QDRANT_COMPRESSION.get(collection_name, {}))
+        self.vector_size: Optional[int] = None
+        self._collection_ready = False
 
-    def ensure_collection_exists(self, vector_size: int = 1536):
+    async def ensure_collection_exists(self, vector_size: Optional[int] = None):
         """
         Ensure that the collection exists, creating it if necessary.
 
         Args:
-            vector_size: Size of the embedding vectors
+            vector_size: Size of the embedding vectors (1536 when unknown); an existing
+                collection that stores fewer dimensions is treated as truncating
         """
-        collections = self.client.get_collections().collections
+        # Only ask Qdrant once per process, not on every add/search
+        if self._collection_ready:
+            self._infer_truncation(vector_size)
+            return
+
+        collections = (await self.client.get_collections()).collections
         collection_names = [collection.name for collection in collections]
 
         if self.collection_name not in collection_names:
-            self.client.create_collection(collection_name=self.collection_name, vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE))
+            compression = self.compression
+            vector_size = vector_size or 1536
+            size = min(vector_size, compression.dimensions) if compression.dimensions else vector_size
+            # With quantization the originals are only read for rescoring, so they can live on disk
+            on_disk = compression.on_disk if compression.on_disk is not None else compression.quantization != "none"
+            await self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=size, distance=Distance.COSINE, on_disk=on_disk),
+                quantization_config=quantization_config(compression),
+            )
+            self.vector_size = size
+        else:
+            await self._load_collection_config()
+            self._infer_truncation(vector_size)
+
+        self._collection_ready = True
+
+    def _infer_truncation(self, vector_size: Optional[int]):
+        """A collection smaller than the model's vectors was created truncating, even if the setting that did it is gone."""
+        if vector_size and self.vector_size and not self.compression.dimensions and self.vector_size < vector_size:
+            self.compression = self.compression.model_copy(update={"dimensions": self.vector_size})
+
+    async def _load_collection_config(self):
+        """Adopt the vector size and quantization the existing collection was created with."""
+        info = await self.client.get_collection(self.collection_name)
+        params = info.config.params.vectors
+        self.vector_size = params.size
+        quantization = info.config.quantization_config
+        kind = "scalar" if isinstance(quantization, models.ScalarQuantization) else "binary" if isinstance(quantization, models.BinaryQuantization) else "none"
+        always_ram = getattr(getattr(quantization, kind, None), "always_ram", None) if kind != "none" else None
+        self.compression = self.compression.model_copy(
+            update={
+                "quantization": kind,
+                "always_ram": always_ram if always_ram is not None else self.compression.always_ram,
+                "on_disk": params.on_disk,
+                # A truncating collection keeps truncating to the size it was created with
+                "dimensions": params.size if self.compression.dimensions else None,
+            }
+        )
+
+    async def collection_exists(self) -> bool:
+        if self._collection_ready:
+            return True
+        collections = (await self.client.get_collections()).collections
+        return self.collection_name in [collection.name for collection in collections]
+
+    async def set_compression(self, compression: VectorCompression):
+        """
+        Change the collection's compression.
+
+        A collection that doesn't exist yet is created right away, so the setting is
+        stored in Qdrant and seen by every worker; that needs the truncated size
+        (dimensions). For an existing one Qdrant rebuilds the quantized vectors in the
+        background; its vector size is fixed, so truncation can't change.
+
+        Raises:
+            CollectionNotFoundError: The collection doesn't exist and no dimensions were given
+        """
+        if not await self.collection_exists():
+            if not compression.dimensions:
+                raise CollectionNotFoundError(
+                    f"Collection {self.collection_name} doesn't exist yet; set dimensions to create it, "
+                    "or configure it in QDRANT_COMPRESSION or add documents first"
+                )
+            self.compression = compression
+            await self.ensure_collection_exists(compression.dimensions)
+            return
+
+        await self.ensure_collection_exists()
+        if compression.dimensions is None:
+            # Leaving dimensions out keeps the collection's truncation
+            compression = compression.model_copy(update={"dimensions": self.compression.dimensions})
+        elif compression.dimensions != self.compression.dimensions:
+            raise ValueError(f"Collection {self.collection_name} stores {self.vector_size}-dimensional vectors; truncation can't change after creation")
+        await self.client.update_collection(
+            collection_name=self.collection_name, quantization_config=quantization_config(compression) or models.Disabled.DISABLED
+        )
+        # Original vectors stay where they were created (RAM or disk)
+        self.compression = compression.model_copy(update={"on_disk": self.compression.on_disk})
+
+    async def collection_info(self) -> CollectionInfo:
+        """Points, vector size, compression and estimated vector RAM of the collection."""
+        if not await self.collection_exists():
+            size = self.compression.dimensions or 0
+            return CollectionInfo(
+                name=self.collection_name, points=0, vector_size=size, compression=self.compression,
+                ram_bytes_per_vector=ram_bytes_per_vector(size, self.compression), estimated_ram_bytes=0,
+            )
+
+        await self.ensure_collection_exists()
+        info = await self.client.get_collection(self.collection_name)
+        points = info.points_count or 0
+        per_vector = ram_bytes_per_vector(self.vector_size, self.compression)
+        return CollectionInfo(
+            name=self.collection_name,
+            points=points,
+            vector_size=self.vector_size,
+            compression=self.compression,
+            ram_bytes_per_vector=per_vector,
+            estimated_ram_bytes=int(points * per_vector),
+        )
+
+    def _search_params(self, oversampling: Optional[float] = None, rescore: Optional[bool] = None) -> Optional[models.SearchParams]:
+        if self.compression.quantization == "none":
+            return None
+        return models.SearchParams(
+            quantization=models.QuantizationSearchParams(
+                ignore=False,
+                rescore=self.compression.rescore if rescore is None else rescore,
+                oversampling=oversampling or self.compression.oversampling,
+            )
+        )
 
     async def add_documents(self, documents: List[Dict[str, Any]], embeddings: List[List[float]], metadata: Optional[List[Dict[str, Any]]] = None) -> List[str]:
         """
@@ -63,16 +224,36 @@ class QdrantService:
         ids = [str(uuid.uuid4()) for _ in documents]
 
         # Ensure collection exists
-        self.ensure_collection_exists(len(embeddings[0]))
+        await self.ensure_collection_exists(len(embeddings[0]))
+        embeddings = truncate_vectors(embeddings, self.compression.dimensions)
 
         # Add points to collection
         points = [models.PointStruct(id=ids[i], vector=embeddings[i], payload={"document": documents[i], **metadata[i]}) for i in range(len(documents))]
 
-        self.client.upsert(collection_name=self.collection_name, points=points)
+        await self.client.upsert(collection_name=self.collection_name, points=points)
 
         return ids
 
-    async def search(self, query_embedding: List[float], limit: int = 10, filter_params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _build_filter(filter_params: Optional[Dict[str, Any]] = None, range_params: Optional[Dict[str, Dict[str, float]]] = None) -> Optional[models.Filter]:
+        """Build a Qdrant filter from exact-match and range conditions."""
+        conditions = []
+        if filter_params:
+            conditions += [models.FieldCondition(key=key, match=models.MatchValue(value=value)) for key, value in filter_params.items()]
+        if range_params:
+            conditions += [models.FieldCondition(key=key, range=models.Range(**bounds)) for key, bounds in range_params.items()]
+
+        return models.Filter(must=conditions) if conditions else None
+
+    async def search(
+        self,
+        query_embedding: List[float],
+        limit: int = 10,
+        filter_params: Optional[Dict[str, Any]] = None,
+        range_params: Optional[Dict[str, Dict[str, float]]] = None,
+        oversampling: Optional[float] = None,
+        rescore: Optional[bool] = None,
+    ) -> List[Dict[str, Any]]:
         """
         Search for documents similar to the query embedding.
 
@@ -80,22 +261,28 @@ class QdrantService:
             query_embedding: Embedding vector of the query
             limit: Maximum number of results to return
             filter_params: Optional filter parameters
+            range_params: Optional range conditions, e.g. {"expires_at": {"gt": 1700000000}}
+            oversampling: Quantized candidates per result, overriding the collection's setting
+            rescore: Whether to re-rank candidates with original vectors, overriding the collection's setting
 
         Returns:
             List of matching documents with scores
         """
         # Ensure collection exists
-        self.ensure_collection_exists(len(query_embedding))
+        await self.ensure_collection_exists(len(query_embedding))
+        query_embedding = truncate_vectors([query_embedding], self.compression.dimensions)[0]
 
         # Create filter if provided
-        filter_condition = None
-        if filter_params:
-            filter_condition = models.Filter(
-                must=[models.FieldCondition(key=key, match=models.MatchValue(value=value)) for key, value in filter_params.items()]
-            )
+        filter_condition = self._build_filter(filter_params, range_params)
 
         # Perform search
-        search_result = self.client.search(collection_name=self.collection_name, query_vector=query_embedding, limit=limit, query_filter=filter_condition)
+        search_result = await self.client.search(
+            collection_name=self.collection_name,
+            query_vector=query_embedding,
+            limit=limit,
+            query_filter=filter_condition,
+            search_params=self._search_params(oversampling, rescore),
+        )
 
         # Format results
         results = []
@@ -121,7 +308,28 @@ class QdrantService:
             ids = [ids]
 
         try:
-            self.client.delete(collection_name=self.collection_name, points_selector=models.PointIdsList(points=ids))
+            await self.client.delete(collection_name=self.collection_name, points_selector=models.PointIdsList(points=ids))
+            return True
+        except Exception:
+            return False
+
+    async def delete_by_filter(self, filter_params: Optional[Dict[str, Any]] = None, range_params: Optional[Dict[str, Dict[str, float]]] = None) -> bool:
+        """
+        Delete all documents matching a filter.
+
+        Args:
+            filter_params: Exact-match conditions
+            range_params: Range conditions, e.g. {"expires_at": {"lte": 1700000000}}
+
+        Returns:
+            True if deletion was successful
+        """
+        filter_condition = self._build_filter(filter_params, range_params)
+        if filter_condition is None:
+            raise ValueError("Refusing to delete without a filter")
+
+        try:
+            await self.client.delete(collection_name=self.collection_name, points_selector=models.FilterSelector(filter=filter_condition))
             return True
         except Exception:
             return False
@@ -0,0 +1,96 @@
+"""
+Hedged routing against stub providers with injected latency.
+
+The primary provider answers quickly most of the time but has a slow tail (and
+optionally fails outright); the other providers are steady. Compares latency
+percentiles of direct calls with hedged routing.
+
+Usage (from backend/):
+    python -m benchmarks.hedging_benchmark --requests 300 --slow-rate 0.1 --fail-rate 0.02
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("SUPABASE_URL", "demo")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "demo")
+
+from app.models.llm import LLMUsage  # noqa: E402
+from app.services.llm.hedging import HedgedRouter, LatencyWindow  # noqa: E402
+from app.services.llm.llm_service import LLMResponse, LLMService  # noqa: E402
+
+
+class StubLLMService(LLMService):
+    """Provider stand-in with a latency distribution and failure rate."""
+
+    def __init__(self, latency: float, slow_latency: float = 0.0, slow_rate: float = 0.0, fail_rate: float = 0.0):
+        self.latency = latency
+        self.slow_latency = slow_latency
+        self.slow_rate = slow_rate
+        self.fail_rate = fail_rate
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
+        self.calls += 1
+        if random.random() < self.fail_rate:
+            raise RuntimeError("injected provider failure")
+        delay = self.slow_latency if random.random() < self.slow_rate else self.latency
+        try:
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        usage = LLMUsage(prompt_tokens=1, completion_tokens=1, total_tokens=2)
+        return LLMResponse(text="ok", model=model, usage=usage)
+
+    async def stream_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs):
+        yield await self.generate_text(prompt, model, max_tokens, temperature, **kwargs)
+
+
+def summarize(label: str, durations, failures: int):
+    window = LatencyWindow(size=len(durations) or 1)
+    for seconds in durations:
+        window.record(seconds)
+    p50, p95, p99 = (window.percentile(q) or 0.0 for q in (50, 95, 99))
+    print(f"  {label:8s} p50={p50 * 1000:7.1f} ms  p95={p95 * 1000:7.1f} ms  p99={p99 * 1000:7.1f} ms  failures={failures}")
+
+
+async def main(requests: int, slow_rate: float, fail_rate: float):
+    providers = {
+        "openai": StubLLMService(latency=0.05, slow_latency=1.0, slow_rate=slow_rate, fail_rate=fail_rate),
+        "anthropic": StubLLMService(latency=0.08),
+        "gemini": StubLLMService(latency=0.08),
+    }
+    router = HedgedRouter(get_service=lambda provider: providers[provider], min_samples=10, default_deadline=0.2, min_deadline=0.05)
+
+    for label in ("direct", "hedged"):
+        durations, failures = [], 0
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                if label == "direct":
+                    await providers["openai"].generate_text("hi", model="o4-mini")
+                else:
+                    await router.generate_text("hi", model="o4-mini", provider="openai")
+                durations.append(time.perf_counter() - started)
+            except Exception:
+                failures += 1
+        summarize(label, durations, failures)
+
+    print(f"  router: {router.stats()}")
+    print(f"  cancelled losers: {sum(service.cancelled for service in providers.values())}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--slow-rate", type=float, default=0.1, help="Fraction of primary calls that hit the slow tail")
+    parser.add_argument("--fail-rate", type=float, default=0.02, help="Fraction of primary calls that fail outright")
+    args = parser.parse_args()
+
+    print(f"{args.requests} sequential requests, primary slow-rate={args.slow_rate}, fail-rate={args.fail_rate}")
+    asyncio.run(main(args.requests, args.slow_rate, args.fail_rate))
@@ -0,0 +1,149 @@
+"""
+Recall, memory and latency of vector compression settings.
+
+Brute-force search over synthetic embeddings (clustered, with variance decaying
+across dimensions the way Matryoshka-trained models concentrate it in the
+leading ones), or over real embeddings from a .npy file. Each setting mirrors
+what Qdrant does: scalar int8 with a 0.99 quantile, binary (sign bits scored by
+Hamming distance) and truncation to the leading dimensions, optionally
+re-scoring `oversampling * k` candidates with the uncompressed vectors.
+
+Recall@k is measured against exact search over the full vectors. RAM per
+vector is the same estimate /api/vectordb/collection reports. Latency is a
+NumPy scan, so compare settings with each other rather than with Qdrant.
+
+Usage (from backend/):
+    python -m benchmarks.quantization_benchmark --points 20000 --dimensions 1536 --k 10
+    python -m benchmarks.quantization_benchmark --vectors embeddings.npy --truncate 512 256
+"""
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("SUPABASE_URL", "demo")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "demo")
+
+from app.models.vectordb import VectorCompression  # noqa: E402
+from app.services.vectordb.qdrant_service import ram_bytes_per_vector  # noqa: E402
+
+# Set bits per byte value, for Hamming distances over packed sign bits
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint16)
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def synthetic_vectors(points: int, queries: int, dimensions: int, clusters: int, seed: int):
+    """Clustered unit vectors; queries are perturbed copies of random points."""
+    rng = np.random.default_rng(seed)
+    scale = 1 / np.sqrt(1 + np.arange(dimensions) / 32)
+    centers = rng.normal(size=(clusters, dimensions))
+    data = centers[rng.integers(clusters, size=points)] + rng.normal(scale=0.8, size=(points, dimensions))
+    data = normalize((data * scale).astype(np.float32))
+    picked = data[rng.integers(points, size=queries)]
+    queries = normalize(picked + rng.normal(scale=0.3 / np.sqrt(dimensions), size=picked.shape).astype(np.float32))
+    return data, queries
+
+
+class Index:
+    """One compression setting over a fixed set of vectors."""
+
+    def __init__(self, data: np.ndarray, quantization: str, dimensions: int):
+        self.quantization = quantization
+        self.vectors = normalize(data[:, :dimensions]) if dimensions < data.shape[1] else data
+        if quantization == "scalar":
+            low, high = np.quantile(self.vectors, [0.005, 0.995])
+            # x ~ low + (code + 128) * step, so x.q ranks like code.q
+            self.step = (high - low) / 255
+            self.low = low
+            self.codes = np.clip(np.round((self.vectors - low) / self.step) - 128, -128, 127).astype(np.int8)
+            # Scored in float32 since NumPy has no int8 BLAS kernel
+            self.scores_from = self.codes.astype(np.float32)
+        elif quantization == "binary":
+            self.bits = np.packbits(self.vectors > 0, axis=1)
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        if self.quantization == "scalar":
+            return self.scores_from @ query
+        if self.quantization == "binary":
+            # Fewer differing signs means a higher score
+            query_bits = np.packbits(query > 0)
+            return -POPCOUNT[np.bitwise_xor(self.bits, query_bits)].sum(axis=1, dtype=np.int32)
+        return self.vectors @ query
+
+    def search(self, query: np.ndarray, k: int, oversampling: float, rescore: bool) -> np.ndarray:
+        query = query[: self.vectors.shape[1]]
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = self.approximate_scores(query)
+        if self.quantization == "none" or not rescore:
+            return top_k(scores, k)
+        candidates = top_k(scores, min(len(scores), math.ceil(k * oversampling)))
+        exact = self.vectors[candidates] @ query
+        return candidates[np.argsort(-exact)[:k]]
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def run(data: np.ndarray, queries: np.ndarray, settings, k: int):
+    truth = [top_k(data @ query, k) for query in queries]
+    print(f"  {'setting':28s} {'recall@' + str(k):>10s} {'RAM/vector':>12s} {'vs float32':>10s} {'p50':>9s} {'p95':>9s}")
+    full_bytes = ram_bytes_per_vector(data.shape[1], VectorCompression())
+    for label, quantization, dimensions, oversampling, rescore in settings:
+        index = Index(data, quantization, dimensions)
+        durations, hits = [], 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            found = index.search(query, k, oversampling, rescore)
+            durations.append(time.perf_counter() - started)
+            hits += len(np.intersect1d(found, expected))
+        p50, p95 = np.percentile(durations, [50, 95]) * 1000
+        ram = ram_bytes_per_vector(dimensions, VectorCompression(quantization=quantization, dimensions=dimensions))
+        recall = hits / (len(queries) * k)
+        print(f"  {label:28s} {recall:10.3f} {ram:10.0f} B {full_bytes / ram:9.1f}x {p50:6.2f} ms {p95:6.2f} ms")
+
+
+def build_settings(dimensions: int, truncate, oversampling: float):
+    settings = [("float32", "none", dimensions, 1.0, False)]
+    for quantization in ("scalar", "binary"):
+        settings.append((f"{quantization}", quantization, dimensions, 1.0, False))
+        settings.append((f"{quantization} +rescore x{oversampling:g}", quantization, dimensions, oversampling, True))
+    for size in truncate:
+        if size >= dimensions:
+            continue
+        settings.append((f"truncate {size}", "none", size, 1.0, False))
+        settings.append((f"truncate {size} scalar +rescore", "scalar", size, oversampling, True))
+        settings.append((f"truncate {size} binary +rescore", "binary", size, oversampling, True))
+    return settings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--vectors", help="Real embeddings as a (points, dimensions) .npy file; queries are held out from it")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversampling", type=float, default=3.0, help="Candidates re-scored per result")
+    parser.add_argument("--truncate", type=int, nargs="*", default=[512, 256], help="Truncated dimensions to try")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.vectors:
+        loaded = normalize(np.load(args.vectors).astype(np.float32))
+        order = np.random.default_rng(args.seed).permutation(len(loaded))
+        data, queries = loaded[order[args.queries :]], loaded[order[: args.queries]]
+    else:
+        data, queries = synthetic_vectors(args.points, args.queries, args.dimensions, args.clusters, args.seed)
+
+    print(f"{len(data)} points x {data.shape[1]} dimensions, {len(queries)} queries, k={args.k}")
+    run(data, queries, build_settings(data.shape[1], args.truncate, args.oversampling), args.k)
@@ -0,0 +1,69 @@
+"""
+Concurrency benchmark for single-flight request coalescing.
+
+Fires bursts of concurrent requests (a mix of identical and distinct prompts)
+at a stub provider with fixed latency, with and without single-flight, and
+reports upstream calls and wall time.
+
+Usage (from backend/):
+    python -m benchmarks.single_flight_benchmark --concurrency 200 --distinct 5
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("SUPABASE_URL", "demo")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "demo")
+
+from app.models.llm import LLMUsage  # noqa: E402
+from app.services.llm.llm_service import LLMResponse, LLMService  # noqa: E402
+from app.services.llm.single_flight import SingleFlight, SingleFlightLLMService  # noqa: E402
+
+
+class StubLLMService(LLMService):
+    """Provider stand-in that counts calls and sleeps for a fixed latency."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def generate_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        usage = LLMUsage(prompt_tokens=len(prompt), completion_tokens=10, total_tokens=len(prompt) + 10)
+        return LLMResponse(text=f"echo: {prompt}", model=model or "stub", usage=usage)
+
+    async def stream_text(self, prompt: str, model: str = None, max_tokens: int = 500, temperature: float = 0.7, **kwargs):
+        yield await self.generate_text(prompt, model, max_tokens, temperature, **kwargs)
+
+
+async def run(service: LLMService, concurrency: int, distinct: int) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(service.generate_text(prompt=f"prompt {i % distinct}", model="stub", temperature=0.0) for i in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def main(concurrency: int, distinct: int, latency: float):
+    baseline = StubLLMService(latency)
+    baseline_seconds = await run(baseline, concurrency, distinct)
+
+    stub = StubLLMService(latency)
+    flight = SingleFlight()
+    coalesced_seconds = await run(SingleFlightLLMService(stub, provider="stub", flight=flight), concurrency, distinct)
+
+    print(f"{concurrency} concurrent requests, {distinct} distinct prompts, {latency * 1000:.0f} ms provider latency")
+    print(f"  without single-flight: {baseline.calls:5d} upstream calls in {baseline_seconds * 1000:.1f} ms")
+    print(f"  with single-flight:    {stub.calls:5d} upstream calls in {coalesced_seconds * 1000:.1f} ms")
+    print(f"  coalesced: {flight.stats()['coalesced']} ({flight.stats()['coalesced_rate']:.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub provider latency in seconds")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.concurrency, args.distinct, args.latency))
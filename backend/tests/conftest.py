@@ -0,0 +1,5 @@
+import os
+
+# Settings require Supabase credentials; tests never talk to a real project
+os.environ.setdefault("SUPABASE_URL", "demo")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "demo")
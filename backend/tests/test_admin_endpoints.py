@@ -0,0 +1,51 @@
+"""
+Internal counters are only served to admins.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.supabase.auth import get_auth_service
+from app.services.supabase.token_cache import VerifiedTokenCache
+
+STATS_PATHS = ["/api/auth/cache-stats", "/api/llm/cache/stats", "/api/llm/usage/stats", "/api/llm/jobs/stats"]
+USERS = {
+    "admin": SimpleNamespace(id="1", email="admin@example.com", role="authenticated", app_metadata={"role": "admin"}),
+    "service": SimpleNamespace(id="2", email=None, role="service_role", app_metadata={}),
+    "user": SimpleNamespace(id="3", email="user@example.com", role="authenticated", app_metadata={}),
+}
+
+
+class StubAuthService:
+    token_cache = VerifiedTokenCache()
+
+    async def get_user(self, token: str):
+        return USERS[token]
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_auth_service] = StubAuthService
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_auth_service, None)
+
+
+@pytest.mark.parametrize("path", STATS_PATHS)
+def test_stats_need_a_token(client, path):
+    assert client.get(path).status_code in (401, 403)
+
+
+@pytest.mark.parametrize("path", STATS_PATHS)
+def test_stats_are_forbidden_to_regular_users(client, path):
+    assert client.get(path, headers={"Authorization": "Bearer user"}).status_code == 403
+
+
+@pytest.mark.parametrize("path", STATS_PATHS)
+@pytest.mark.parametrize("token", ["admin", "service"])
+def test_stats_are_served_to_admins(client, path, token):
+    assert client.get(path, headers={"Authorization": f"Bearer {token}"}).status_code == 200
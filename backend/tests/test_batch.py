@@ -0,0 +1,108 @@
+"""
+Batch items are generated the way /generate handles a single request.
+
+Providers, the model router and the semantic cache are stubs, so the test
+only checks which of them each item goes through.
+"""
+
+import pytest
+
+from app.core.config import settings
+from app.models.llm import LLMUsage, TextGenerationRequest
+from app.services.llm import jobs
+from app.services.llm.batch import generate_batch
+from app.services.llm.llm_service import LLMResponse
+
+USER = "user-1"
+ROUTED_MODEL = "claude-3-haiku-20240307"
+
+
+class StubLLMService:
+    def __init__(self, provider: str, calls: list):
+        self.provider = provider
+        self.calls = calls
+
+    async def generate_text(self, prompt, model=None, max_tokens=500, temperature=0.7, **kwargs):
+        self.calls.append((self.provider, model, prompt))
+        return LLMResponse(text=f"{model}: {prompt}", model=model, usage=LLMUsage(prompt_tokens=1, completion_tokens=1, total_tokens=2))
+
+
+class StubRouter:
+    def select_model(self, task=None, budget_level="balanced"):
+        return ROUTED_MODEL, {"reason": "stub"}
+
+
+class StubSemanticCache:
+    def __init__(self):
+        self.lookups = []
+        self.stored = []
+
+    def applies_to(self, temperature):
+        return True
+
+    async def lookup(self, prompt, model, user_id, max_tokens, system_prompt):
+        self.lookups.append((prompt, user_id))
+        if prompt == "seen before":
+            return LLMResponse(text="from cache", model=model, usage=LLMUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0)), [0.0]
+        return None, [0.0]
+
+    def record_provider_latency(self, model, seconds):
+        pass
+
+    def store_in_background(self, prompt, embedding, response, model, user_id, max_tokens, system_prompt):
+        self.stored.append((prompt, user_id))
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(jobs, "get_llm_service", lambda provider: StubLLMService(provider, calls))
+    monkeypatch.setattr(jobs, "model_router", StubRouter())
+    return calls
+
+
+@pytest.fixture
+def semantic_cache(monkeypatch):
+    cache = StubSemanticCache()
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(jobs, "get_semantic_cache", lambda: cache)
+    return cache
+
+
+async def run_batch(items, user_id=USER):
+    return dict([outcome async for outcome in generate_batch(items, user_id)])
+
+
+@pytest.mark.asyncio
+async def test_budget_item_runs_on_the_routed_model(calls):
+    results = await run_batch([TextGenerationRequest(prompt="hi", provider="openai", model="o4-mini", budget="budget")])
+
+    assert calls == [("anthropic", ROUTED_MODEL, "hi")]
+    assert results[0].model == ROUTED_MODEL
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_answers_batch_items(calls, semantic_cache):
+    results = await run_batch([TextGenerationRequest(prompt="seen before"), TextGenerationRequest(prompt="new")])
+
+    assert results[0].cached and results[0].text == "from cache"
+    assert not results[1].cached
+    assert [prompt for _, _, prompt in calls] == ["new"]
+    assert semantic_cache.stored == [("new", USER)]
+
+
+@pytest.mark.asyncio
+async def test_bypass_cache_skips_the_semantic_cache(calls, semantic_cache):
+    results = await run_batch([TextGenerationRequest(prompt="seen before", bypass_cache=True)])
+
+    assert not results[0].cached
+    assert semantic_cache.lookups == []
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_item_is_reported_without_stopping_the_batch(calls):
+    results = await run_batch([TextGenerationRequest(prompt="hi", prompt_template="no-such-template"), TextGenerationRequest(prompt="ok")])
+
+    assert isinstance(results[0], Exception)
+    assert results[1].text.endswith("ok")
@@ -0,0 +1,223 @@
+"""
+Circuit breaker state machine and adaptive timeouts.
+
+Breakers are built with small thresholds and zero cooldowns so each state
+change can be driven directly, without waiting on the clock.
+"""
+
+import asyncio
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from app.services.llm.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    AdaptiveTimeout,
+    CircuitBreaker,
+    CircuitOpenError,
+    _guarded,
+    is_provider_failure,
+    latency_key,
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def make_breaker(**kwargs) -> CircuitBreaker:
+    options = {"failure_threshold": 3, "failure_rate": 1.0, "window": 10, "min_calls": 10, "open_seconds": 30, "max_open_seconds": 120}
+    options.update(kwargs)
+    return CircuitBreaker("test", **options)
+
+
+def test_consecutive_failures_open_the_circuit():
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.rejected == 1
+
+
+def test_success_resets_the_consecutive_count():
+    breaker = make_breaker()
+    for outcome in (False, False, True, False, False):
+        breaker.before_call()
+        breaker.record_success() if outcome else breaker.record_failure()
+
+    assert breaker.state == CLOSED
+
+
+def test_failure_rate_opens_the_circuit():
+    breaker = make_breaker(failure_threshold=100, failure_rate=0.5, min_calls=4)
+    for outcome in (True, False, False):
+        breaker.before_call()
+        breaker.record_failure() if outcome else breaker.record_success()
+    assert breaker.state == CLOSED
+
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = make_breaker(failure_threshold=1, open_seconds=0)
+    breaker.before_call()
+    breaker.record_failure()
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_successful_probe_closes_the_circuit():
+    breaker = make_breaker(failure_threshold=1, open_seconds=0)
+    breaker.before_call()
+    breaker.record_failure()
+
+    breaker.before_call()
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    assert not breaker.outcomes
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_with_a_longer_cooldown():
+    breaker = make_breaker(failure_threshold=1, open_seconds=0, max_open_seconds=120)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.cooldown = 0
+
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+
+
+def test_cooldown_doubles_up_to_the_maximum():
+    breaker = make_breaker(failure_threshold=1, open_seconds=40, max_open_seconds=100)
+    breaker.before_call()
+    breaker.record_failure()
+    cooldowns = []
+    for _ in range(3):
+        # Skip the wait for the next probe
+        breaker.opened_at -= breaker.cooldown
+        breaker.before_call()
+        breaker.record_failure()
+        cooldowns.append(breaker.cooldown)
+
+    assert cooldowns == [80, 100, 100]
+
+
+def test_ignored_outcome_frees_the_probe_slot():
+    breaker = make_breaker(failure_threshold=1, open_seconds=0)
+    breaker.before_call()
+    breaker.record_failure()
+
+    breaker.before_call()
+    breaker.record_ignored()
+
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+
+
+@pytest.mark.parametrize(
+    "error, failure",
+    [
+        (asyncio.TimeoutError(), True),
+        (ConnectionError("reset"), True),
+        (StatusError(503), True),
+        (StatusError(429), True),
+        (StatusError(400), False),
+        (StatusError(408), False),
+        (ValueError("prompt too long"), False),
+        (google_exceptions.InvalidArgument("bad"), False),
+        (google_exceptions.BadRequest("bad"), False),
+        (google_exceptions.ServiceUnavailable("down"), True),
+        (google_exceptions.TooManyRequests("slow down"), True),
+    ],
+)
+def test_only_provider_errors_count_as_failures(error, failure):
+    assert is_provider_failure(error) is failure
+
+
+def test_adaptive_timeout_uses_the_ceiling_until_enough_samples():
+    timeouts = AdaptiveTimeout(percentile=50, multiplier=2.0, min_seconds=1.0, max_seconds=60.0, min_samples=3)
+    key = latency_key("model", 500)
+    timeouts.record(key, 2.0)
+    assert timeouts.timeout_for(key) == 60.0
+
+    timeouts.record(key, 2.0)
+    timeouts.record(key, 2.0)
+    assert timeouts.timeout_for(key) == 4.0
+
+
+def test_adaptive_timeout_is_clamped():
+    timeouts = AdaptiveTimeout(percentile=50, multiplier=2.0, min_seconds=1.0, max_seconds=10.0, min_samples=1)
+    timeouts.record("fast", 0.01)
+    timeouts.record("slow", 100.0)
+
+    assert timeouts.timeout_for("fast") == 1.0
+    assert timeouts.timeout_for("slow") == 10.0
+
+
+def test_size_classes_keep_short_calls_from_setting_long_timeouts():
+    assert latency_key("model", 100) == latency_key("model", 128)
+    assert latency_key("model", 128) != latency_key("model", 129)
+    assert latency_key("model", 1) != latency_key("model", 4096)
+
+
+@pytest.mark.asyncio
+async def test_short_adaptive_timeout_widens_instead_of_failing():
+    breaker = make_breaker(failure_threshold=1)
+    timeouts = AdaptiveTimeout(percentile=100, multiplier=2.0, min_seconds=0.01, max_seconds=60.0, min_samples=1, failure_seconds=30.0)
+    timeouts.record("key", 0.01)
+    timeout = timeouts.timeout_for("key")
+
+    with pytest.raises(asyncio.TimeoutError):
+        await _guarded(breaker, timeouts, "key", lambda: asyncio.sleep(1))
+
+    assert breaker.state == CLOSED
+    assert timeouts.timeout_for("key") > timeout
+
+
+@pytest.mark.asyncio
+async def test_timeout_at_the_failure_threshold_counts_against_the_provider():
+    breaker = make_breaker(failure_threshold=1)
+    timeouts = AdaptiveTimeout(percentile=50, multiplier=1.0, min_seconds=0.01, max_seconds=0.05, min_samples=1, failure_seconds=0.05)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await _guarded(breaker, timeouts, "key", lambda: asyncio.sleep(1))
+
+    assert breaker.state == OPEN
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_says_nothing_about_the_provider():
+    breaker = make_breaker(failure_threshold=1)
+    timeouts = AdaptiveTimeout(max_seconds=60.0)
+    task = asyncio.ensure_future(_guarded(breaker, timeouts, "key", lambda: asyncio.sleep(1)))
+    await asyncio.sleep(0)
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert breaker.state == CLOSED
+    assert not breaker.outcomes
@@ -0,0 +1,74 @@
+"""
+The event loop must stay responsive while Supabase and Qdrant calls are in flight.
+
+Each test starts a slow backend call and checks that a trivial coroutine scheduled
+alongside it still finishes promptly, i.e. the call is awaited rather than blocking.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.supabase import database
+from app.services.supabase.database import SupabaseDatabaseService
+from app.services.vectordb.qdrant_service import QdrantService
+
+BACKEND_SECONDS = 0.5
+PROMPT_SECONDS = 0.1
+
+
+class SlowQuery:
+    """Stand-in for a postgrest query builder whose execute() takes a while."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        await asyncio.sleep(BACKEND_SECONDS)
+        return type("Response", (), {"data": [{"id": "1"}]})()
+
+
+class SlowSupabaseClient:
+    def table(self, name):
+        return SlowQuery()
+
+
+class SlowQdrantClient:
+    async def search(self, **kwargs):
+        await asyncio.sleep(BACKEND_SECONDS)
+        return []
+
+
+async def assert_loop_responsive(call):
+    """Run call() and check a concurrent trivial coroutine isn't held up by it."""
+    task = asyncio.create_task(call())
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    assert not task.done(), "backend call should still be in flight"
+    assert elapsed < PROMPT_SECONDS, f"event loop was blocked for {elapsed:.3f}s"
+    return await task
+
+
+@pytest.mark.asyncio
+async def test_supabase_query_does_not_block_event_loop(monkeypatch):
+    async def get_client():
+        return SlowSupabaseClient()
+
+    monkeypatch.setattr(database, "get_supabase_client", get_client)
+    service = SupabaseDatabaseService("items", dict)
+
+    assert await assert_loop_responsive(lambda: service.get("1")) == {"id": "1"}
+
+
+@pytest.mark.asyncio
+async def test_qdrant_search_does_not_block_event_loop():
+    service = QdrantService(url="")
+    service.client = SlowQdrantClient()
+    service._collection_ready = True
+
+    assert await assert_loop_responsive(lambda: service.search(query_embedding=[0.1, 0.2, 0.3])) == []
@@ -0,0 +1,43 @@
+"""
+Hedged routing keeps the slow tail in its latency window.
+
+A primary that loses to a hedge is cancelled before it finishes; its elapsed
+time must still count, or the percentile deadline keeps shrinking.
+"""
+
+import asyncio
+
+import pytest
+
+from app.models.llm import LLMUsage
+from app.services.llm.hedging import HedgedRouter
+from app.services.llm.llm_service import LLMResponse
+
+PRIMARY = "o4-mini"
+
+
+class StubService:
+    """Answers after a fixed delay per provider."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def generate_text(self, prompt, model, max_tokens, temperature, **kwargs):
+        await asyncio.sleep(self.delay)
+        return LLMResponse(text=model, model=model, usage=LLMUsage(prompt_tokens=1, completion_tokens=1, total_tokens=2))
+
+
+@pytest.mark.asyncio
+async def test_cancelled_hedge_loser_is_recorded_as_a_lower_bound():
+    services = {"openai": StubService(5.0), "anthropic": StubService(0.0), "gemini": StubService(0.0)}
+    router = HedgedRouter(get_service=services.__getitem__, min_samples=1, default_deadline=0.05, min_deadline=0.0)
+
+    response = await router.generate_text(prompt="hi", model=PRIMARY, provider="openai")
+    # Let the cancelled primary run its cleanup
+    await asyncio.sleep(0)
+
+    assert response.model != PRIMARY
+    samples = router._latency[PRIMARY].samples
+    assert len(samples) == 1
+    assert samples[0] >= 0.05
+    assert router.hedge_deadline(PRIMARY) >= 0.05
@@ -0,0 +1,197 @@
+"""
+Job queue ordering, retries and cancellation with the in-memory backend.
+
+run_generation is replaced by a stub, so attempts succeed, fail or hang on
+demand without any provider.
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.models.llm import JobCreateRequest, LLMUsage, TextGenerationResponse
+from app.services.llm import jobs
+from app.services.llm.jobs import JobWorkerPool, MemoryJobQueue, NonRetryableJobError, TooManyJobsError
+
+USER = "user-1"
+
+
+def response(text: str = "done") -> TextGenerationResponse:
+    return TextGenerationResponse(text=text, model="o4-mini", usage=LLMUsage(prompt_tokens=1, completion_tokens=1, total_tokens=2))
+
+
+class StubGeneration:
+    """Plays back outcomes in order: an exception is raised, anything else returned."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def __call__(self, request):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else response()
+        if outcome == "hang":
+            await asyncio.Event().wait()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def no_usage_accounting(monkeypatch):
+    monkeypatch.setattr(settings, "USAGE_ACCOUNTING_ENABLED", False)
+
+
+def make_pool(max_outstanding_per_user: int = 20) -> JobWorkerPool:
+    return JobWorkerPool(
+        MemoryJobQueue(), workers=1, poll_interval=0.01, timeout=5.0, retry_base=0.0, retry_max=0.0, max_outstanding_per_user=max_outstanding_per_user
+    )
+
+
+async def wait_for_status(pool: JobWorkerPool, job_id: str, *statuses: str):
+    for _ in range(500):
+        job = await pool.backend.get(job_id)
+        if job.status in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} stayed {job.status}")
+
+
+@pytest.mark.asyncio
+async def test_higher_priority_jobs_are_claimed_first():
+    pool = make_pool()
+    low = await pool.submit(USER, JobCreateRequest(prompt="low", priority=1))
+    high = await pool.submit(USER, JobCreateRequest(prompt="high", priority=9))
+
+    assert (await pool.backend.claim(0)).id == high.id
+    assert (await pool.backend.claim(0)).id == low.id
+    assert await pool.backend.claim(0) is None
+
+
+@pytest.mark.asyncio
+async def test_failed_attempt_is_retried_until_it_succeeds(monkeypatch):
+    monkeypatch.setattr(jobs, "run_generation", StubGeneration(RuntimeError("upstream 503"), response("second try")))
+    pool = make_pool()
+    submitted = await pool.submit(USER, JobCreateRequest(prompt="hi", max_attempts=3))
+
+    await pool._attempt(await pool.backend.claim(0))
+    job = await pool.backend.get(submitted.id)
+    assert job.status == "queued"
+    assert "upstream 503" in job.error
+
+    await pool._attempt(await pool.backend.claim(0))
+    job = await pool.backend.get(submitted.id)
+    assert job.status == "succeeded"
+    assert job.attempts == 2
+    assert job.result.text == "second try"
+    assert job.error is None
+    assert pool.retries == 1
+
+
+@pytest.mark.asyncio
+async def test_job_fails_after_its_last_attempt(monkeypatch):
+    monkeypatch.setattr(jobs, "run_generation", StubGeneration(RuntimeError("first"), RuntimeError("second")))
+    pool = make_pool()
+    submitted = await pool.submit(USER, JobCreateRequest(prompt="hi", max_attempts=2))
+
+    for _ in range(2):
+        await pool._attempt(await pool.backend.claim(0))
+
+    job = await pool.backend.get(submitted.id)
+    assert job.status == "failed"
+    assert job.finished_at is not None
+    assert "Attempt 2" in job.error
+    assert await pool.backend.claim(0) is None
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_error_fails_at_once(monkeypatch):
+    generation = StubGeneration(NonRetryableJobError("unknown prompt template"))
+    monkeypatch.setattr(jobs, "run_generation", generation)
+    pool = make_pool()
+    submitted = await pool.submit(USER, JobCreateRequest(prompt="hi", max_attempts=5))
+
+    await pool._attempt(await pool.backend.claim(0))
+
+    job = await pool.backend.get(submitted.id)
+    assert job.status == "failed"
+    assert job.attempts == 1
+    assert pool.retries == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_waits_for_an_open_circuit(monkeypatch):
+    monkeypatch.setattr(jobs, "run_generation", StubGeneration(jobs.CircuitOpenError("openai", retry_after=60)))
+    pool = make_pool()
+    submitted = await pool.submit(USER, JobCreateRequest(prompt="hi"))
+
+    await pool._attempt(await pool.backend.claim(0))
+
+    job = await pool.backend.get(submitted.id)
+    assert job.status == "queued"
+    assert (job.available_at - job.started_at).total_seconds() >= 59
+    assert await pool.backend.claim(0) is None
+
+
+@pytest.mark.asyncio
+async def test_cancelled_queued_job_is_never_run(monkeypatch):
+    generation = StubGeneration()
+    monkeypatch.setattr(jobs, "run_generation", generation)
+    pool = make_pool()
+    submitted = await pool.submit(USER, JobCreateRequest(prompt="hi"))
+
+    assert (await pool.cancel(submitted.id)).status == "cancelled"
+
+    assert await pool.backend.claim(0) is None
+    assert generation.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_running_job_stops_it(monkeypatch):
+    monkeypatch.setattr(jobs, "run_generation", StubGeneration("hang"))
+    pool = make_pool()
+    submitted = await pool.submit(USER, JobCreateRequest(prompt="hi"))
+    pool.start()
+    try:
+        await wait_for_status(pool, submitted.id, "running")
+        await pool.cancel(submitted.id)
+        # The worker moves on once the attempt is cancelled
+        for _ in range(100):
+            if not pool._running:
+                break
+            await asyncio.sleep(0.01)
+
+        assert not pool._running
+        job = await pool.backend.get(submitted.id)
+        assert job.status == "cancelled"
+        assert job.result is None
+    finally:
+        await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_late_result_of_a_cancelled_job_is_dropped(monkeypatch):
+    monkeypatch.setattr(jobs, "run_generation", StubGeneration(response("too late")))
+    pool = make_pool()
+    submitted = await pool.submit(USER, JobCreateRequest(prompt="hi"))
+    job = await pool.backend.claim(0)
+    await pool.backend.cancel(submitted.id)
+
+    await pool._attempt(job)
+
+    assert (await pool.backend.get(submitted.id)).status == "cancelled"
+
+
+@pytest.mark.asyncio
+async def test_outstanding_jobs_are_capped_per_user():
+    pool = make_pool(max_outstanding_per_user=2)
+    first = await pool.submit(USER, JobCreateRequest(prompt="1"))
+    await pool.submit(USER, JobCreateRequest(prompt="2"))
+
+    with pytest.raises(TooManyJobsError):
+        await pool.submit(USER, JobCreateRequest(prompt="3"))
+    await pool.submit("someone-else", JobCreateRequest(prompt="3"))
+
+    await pool.cancel(first.id)
+    await pool.submit(USER, JobCreateRequest(prompt="3"))
@@ -0,0 +1,55 @@
+"""
+Latency-aware routing must let a model recover from a bad patch.
+
+The router only calls models it selects, so stats that never faded would keep
+an avoided model avoided forever.
+"""
+
+import time
+
+from app.services.llm.model_router import ModelRouter
+from app.services.llm.model_stats import ModelStatsRegistry
+
+TASK = "transcript_processing"
+RECOMMENDED = "claude-3-haiku-20240307"
+
+
+def make_router(half_life: float = 60.0):
+    registry = ModelStatsRegistry(alpha=0.2, half_life=half_life)
+    return ModelRouter(registry=registry, is_configured=lambda provider: True), registry
+
+
+def test_recent_errors_steer_away_from_a_model():
+    router, registry = make_router()
+    for _ in range(2):
+        registry.record_error(RECOMMENDED)
+
+    chosen, _ = router.select_model(task=TASK, budget_level="budget")
+
+    assert chosen != RECOMMENDED
+
+
+def test_idle_stats_fade_back_to_the_prior():
+    router, registry = make_router()
+    for _ in range(2):
+        registry.record_error(RECOMMENDED)
+    registry.record_success(RECOMMENDED, latency=60.0)
+    # Ten half-lives without calls
+    registry.get(RECOMMENDED).last_updated = time.time() - 600
+
+    chosen, decision = router.select_model(task=TASK, budget_level="budget")
+
+    assert chosen == RECOMMENDED
+    candidate = next(c for c in decision["candidates"] if c["model"] == RECOMMENDED)
+    assert candidate["error_rate"] < 0.01
+    assert candidate["expected_latency_seconds"] < 2.0
+
+
+def test_a_new_sample_outweighs_stale_averages():
+    _, registry = make_router()
+    registry.record_success(RECOMMENDED, latency=60.0)
+    registry.get(RECOMMENDED).last_updated = time.time() - 600
+
+    registry.record_success(RECOMMENDED, latency=1.0)
+
+    assert registry.get(RECOMMENDED).latency < 1.5
@@ -0,0 +1,150 @@
+"""
+Token buckets and the per-model rate limiter.
+
+The scheduler's clock and sleep are replaced by a fake clock, so minutes of
+refill happen instantly and waits can be asserted exactly.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.config.models import RateLimit
+from app.models.llm import LLMUsage
+from app.services.llm import rate_scheduler
+from app.services.llm.llm_service import LLMResponse
+from app.services.llm.rate_scheduler import ModelRateLimiter, RateLimitedLLMService, RateScheduler, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_scheduler, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(rate_scheduler, "asyncio", SimpleNamespace(Lock=asyncio.Lock, sleep=clock.sleep))
+    return clock
+
+
+def test_bucket_starts_full_and_refills_up_to_capacity(clock):
+    bucket = TokenBucket(capacity=60, refill_per_second=1)
+    bucket.take(60)
+    assert bucket.wait_time(10) == 10
+
+    clock.now += 10
+    assert bucket.wait_time(10) == 0
+
+    clock.now += 1000
+    bucket.take(0)
+    assert bucket.level == 60
+
+
+def test_oversized_request_waits_for_a_full_bucket_only(clock):
+    bucket = TokenBucket(capacity=100, refill_per_second=10)
+    bucket.take(50)
+
+    assert bucket.wait_time(1000) == 5
+    bucket.take(1000)
+    assert bucket.level == -50
+
+
+def test_negative_correction_puts_the_bucket_into_debt(clock):
+    bucket = TokenBucket(capacity=100, refill_per_second=10)
+    bucket.take(100)
+    bucket.give_back(-50)
+
+    assert bucket.wait_time(10) == 6
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_the_request_bucket(clock):
+    limiter = ModelRateLimiter(RateLimit(requests_per_minute=60, tokens_per_minute=1_000_000))
+    limiter.requests.take(60)
+
+    await limiter.acquire(10)
+
+    assert clock.slept == [1]
+    assert limiter.admitted == 1
+    assert limiter.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_the_token_bucket(clock):
+    limiter = ModelRateLimiter(RateLimit(requests_per_minute=1000, tokens_per_minute=600))
+
+    await limiter.acquire(600)
+    await limiter.acquire(300)
+
+    assert clock.slept == [30]
+
+
+@pytest.mark.asyncio
+async def test_waiting_requests_are_admitted_in_order(clock):
+    limiter = ModelRateLimiter(RateLimit(requests_per_minute=1, tokens_per_minute=1_000_000))
+    admitted = []
+
+    async def request(index):
+        await limiter.acquire(1)
+        admitted.append(index)
+
+    await asyncio.gather(*(request(index) for index in range(4)))
+
+    assert admitted == [0, 1, 2, 3]
+    assert sum(clock.slept) == 180
+
+
+def test_settle_replaces_the_estimate_with_actual_usage(clock):
+    limiter = ModelRateLimiter(RateLimit(requests_per_minute=10, tokens_per_minute=1000))
+    limiter.tokens.take(800)
+
+    limiter.settle(estimated_tokens=800, actual_tokens=300)
+
+    assert limiter.tokens.level == 700
+
+
+class StubLLMService:
+    def __init__(self, error: Exception = None):
+        self.error = error
+
+    async def generate_text(self, prompt, model=None, max_tokens=500, temperature=0.7, **kwargs):
+        if self.error is not None:
+            raise self.error
+        return LLMResponse(text="ok", model=model, usage=LLMUsage(prompt_tokens=5, completion_tokens=5, total_tokens=10))
+
+
+@pytest.mark.asyncio
+async def test_service_trues_up_to_actual_usage(clock):
+    scheduler = RateScheduler()
+    service = RateLimitedLLMService(StubLLMService(), provider="openai", scheduler=scheduler)
+
+    await service.generate_text(prompt="hello", model="o4-mini", max_tokens=500)
+
+    limiter = scheduler.limiter_for("openai", "o4-mini")
+    assert limiter.tokens.level == limiter.limit.tokens_per_minute - 10
+    assert limiter.requests.level == limiter.limit.requests_per_minute - 1
+
+
+@pytest.mark.asyncio
+async def test_failed_request_returns_its_tokens_but_keeps_the_request_slot(clock):
+    scheduler = RateScheduler()
+    service = RateLimitedLLMService(StubLLMService(RuntimeError("boom")), provider="openai", scheduler=scheduler)
+
+    with pytest.raises(RuntimeError):
+        await service.generate_text(prompt="hello", model="o4-mini", max_tokens=500)
+
+    limiter = scheduler.limiter_for("openai", "o4-mini")
+    assert limiter.tokens.level == limiter.limit.tokens_per_minute
+    assert limiter.requests.level == limiter.limit.requests_per_minute - 1
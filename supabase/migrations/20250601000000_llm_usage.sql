@@ -0,0 +1,53 @@
+-- Per-user LLM and embedding usage, written in batches by the backend's usage accountant
+
+create table if not exists public.llm_usage (
+  id bigserial primary key,
+  user_id uuid not null references auth.users on delete cascade,
+  kind text not null,
+  provider text not null,
+  model text not null,
+  prompt_tokens integer not null default 0,
+  completion_tokens integer not null default 0,
+  total_tokens integer not null default 0,
+  cost_usd numeric(14, 8) not null default 0,
+  cached boolean not null default false,
+  created_at timestamptz default now() not null
+);
+
+create index if not exists llm_usage_user_created_at_idx on public.llm_usage (user_id, created_at);
+
+-- Rows are inserted with the service key; users can only read their own usage
+alter table public.llm_usage enable row level security;
+
+create policy "Users can view their own usage"
+  on llm_usage for select
+  using (auth.uid() = user_id);
+
+-- Aggregate usage per user, provider and model
+create or replace function public.llm_usage_summary(p_user_id uuid default null, p_since timestamptz default null)
+returns table (
+  user_id uuid,
+  provider text,
+  model text,
+  requests bigint,
+  cached_requests bigint,
+  prompt_tokens bigint,
+  completion_tokens bigint,
+  total_tokens bigint,
+  cost_usd numeric
+) as $$
+  select
+    u.user_id,
+    u.provider,
+    u.model,
+    count(*) as requests,
+    count(*) filter (where u.cached) as cached_requests,
+    coalesce(sum(u.prompt_tokens), 0) as prompt_tokens,
+    coalesce(sum(u.completion_tokens), 0) as completion_tokens,
+    coalesce(sum(u.total_tokens), 0) as total_tokens,
+    coalesce(sum(u.cost_usd), 0) as cost_usd
+  from public.llm_usage u
+  where (p_user_id is null or u.user_id = p_user_id)
+    and (p_since is null or u.created_at >= p_since)
+  group by u.user_id, u.provider, u.model
+$$ language sql stable;
@@ -0,0 +1,17 @@
+-- Conversation sessions persisted by the backend when CONVERSATION_PERSIST_ENABLED is set
+
+create table if not exists public.llm_conversations (
+  id uuid primary key,
+  user_id uuid not null references auth.users on delete cascade,
+  data jsonb not null,
+  updated_at timestamptz default now() not null
+);
+
+create index if not exists llm_conversations_user_id_idx on public.llm_conversations (user_id);
+
+-- Written with the service key; users can only read their own conversations
+alter table public.llm_conversations enable row level security;
+
+create policy "Users can view their own conversations"
+  on llm_conversations for select
+  using (auth.uid() = user_id);
@@ -0,0 +1,48 @@
+-- Background generation jobs, shared by all backend instances when JOBS_BACKEND=supabase
+
+create table if not exists public.llm_jobs (
+  id uuid primary key,
+  user_id uuid not null references auth.users on delete cascade,
+  status text not null default 'queued',
+  priority integer not null default 0,
+  request jsonb not null,
+  result jsonb,
+  error text,
+  callback_url text,
+  attempts integer not null default 0,
+  max_attempts integer not null default 3,
+  created_at timestamptz default now() not null,
+  available_at timestamptz default now() not null,
+  started_at timestamptz,
+  finished_at timestamptz
+);
+
+-- Workers look for the highest-priority ready job
+create index if not exists llm_jobs_queued_idx on public.llm_jobs (priority desc, created_at) where status = 'queued';
+create index if not exists llm_jobs_user_id_idx on public.llm_jobs (user_id);
+
+-- Written with the service key; users can only read their own jobs
+alter table public.llm_jobs enable row level security;
+
+create policy "Users can view their own jobs"
+  on llm_jobs for select
+  using (auth.uid() = user_id);
+
+-- Claim the next job for a worker. SKIP LOCKED lets many workers poll at once
+-- without blocking on or double-claiming the same row. Jobs left running longer
+-- than p_stale_seconds (their instance died) are claimed again.
+create or replace function public.claim_llm_job(p_stale_seconds integer default 1800)
+returns setof public.llm_jobs as $$
+  update public.llm_jobs
+  set status = 'running', attempts = attempts + 1, started_at = now()
+  where id = (
+    select id
+    from public.llm_jobs
+    where (status = 'queued' and available_at <= now())
+       or (status = 'running' and started_at < now() - make_interval(secs => p_stale_seconds))
+    order by priority desc, created_at
+    limit 1
+    for update skip locked
+  )
+  returning *;
+$$ language sql volatile;